@@ -2,34 +2,337 @@ import azure.functions as func
 import json
 import logging
 import os
-from openai import AzureOpenAI
-from azure.cosmos import CosmosClient
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+from shared_code.clients import get_openai_client, get_cosmos_client
+from shared_code.embeddings import try_embed_text, grant_embedding_text, get_embedding_deployment
+from shared_code.grant_scoring import compute_match_features, stored_match_features
+from shared_code.model_router import get_route
+from shared_code.rate_limiter import RateLimiter
+from shared_code.settings import get_float_setting, get_int_setting
+from shared_code.structured_output import StructuredOutputError, structured_completion
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import hashlib
+import re
+import time
+import unicodedata
 
-def get_openai_client():
-    """Initialize Azure OpenAI client with SDK v2"""
-    endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
-    api_key = os.environ.get("AZURE_OPENAI_KEY")
+# Bulk ingestion: parallel grants in flight, OpenAI request budget and batch cap
+DEFAULT_BULK_CONCURRENCY = 4
+DEFAULT_BULK_REQUESTS_PER_MINUTE = 120
+DEFAULT_MAX_BULK_ITEMS = 500
+
+# Bump whenever SYSTEM_PROMPT or the analysis parameters change: stored grants
+# analyzed with another version are re-analyzed on their next submission
+ANALYSIS_PROMPT_VERSION = "1"
+
+SYSTEM_PROMPT = """You are a grant analysis expert. Analyze the following grant opportunity and provide comprehensive assessment. 
+        Return a JSON response with:
+        - eligibilityRequirements: Array of key eligibility criteria
+        - fundingDetails: Object with amount, duration, matching requirements
+        - applicationRequirements: Array of required documents/information
+        - evaluationCriteria: Array of evaluation criteria
+        - strategicAlignment: Array of research/project areas supported
+        - competitiveness: Assessment (low/medium/high)
+        - recommendedApplicantProfile: Description of ideal applicant
+        - keyDeadlines: Important dates and milestones
+        - riskFactors: Potential challenges or risks
+        - successFactors: What makes applications successful
+        - applicationTips: Specific tips for strong application"""
+
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+# Only eligibilityRequirements is required: it feeds matching and embeddings,
+# and the other fields are shown as returned (invalid ones are dropped)
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "eligibilityRequirements": _STRING_LIST,
+        "fundingDetails": {},
+        "applicationRequirements": _STRING_LIST,
+        "evaluationCriteria": _STRING_LIST,
+        "strategicAlignment": _STRING_LIST,
+        "competitiveness": {"type": "string", "enum": ["low", "medium", "high"]},
+        "recommendedApplicantProfile": {"type": "string"},
+        "keyDeadlines": {},
+        "riskFactors": {"type": "array"},
+        "successFactors": {"type": "array"},
+        "applicationTips": {"type": "array"}
+    },
+    "required": ["eligibilityRequirements"]
+}
+
+
+def grant_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Grant fields of a request body or bulk item, with the usual defaults
+    """
+    return {
+        "grantDescription": item.get('grantDescription'),
+        "organizationType": item.get('organizationType', 'Not specified'),
+        "fundingAmount": item.get('fundingAmount', 'Not specified'),
+        "deadline": item.get('deadline', 'Not specified')
+    }
+
+
+def analyze_grant(openai_client, grant: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Run the grant analysis prompt; raises ValueError if no valid analysis comes back
+    """
+    route = get_route("grant_analysis")
     
-    if not endpoint or not api_key:
-        raise ValueError("Azure OpenAI configuration missing")
+    user_prompt = f"""Grant Description: {grant['grantDescription']}
+        
+Organization Type: {grant['organizationType']}
+Funding Amount: {grant['fundingAmount']}
+Deadline: {grant['deadline']}"""
     
-    return AzureOpenAI(
-        azure_endpoint=endpoint,
-        api_key=api_key,
-        api_version="2024-02-01"
-    )
+    # Call Azure OpenAI (identical grant text is served from the completion cache)
+    try:
+        return structured_completion(
+            openai_client,
+            model=route.deployment,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            schema=ANALYSIS_SCHEMA,
+            temperature=0.3,
+            max_tokens=route.max_tokens,
+            use_cache=use_cache,
+            route=route.name
+        )
+    except StructuredOutputError as e:
+        raise ValueError(f"Failed to parse grant analysis from OpenAI: {str(e)}")
+
+
+def grant_content_hash(grant: Dict[str, Any]) -> str:
+    """
+    SHA-256 of the normalized grant content (Unicode form, case and whitespace are ignored)
+    """
+    parts = []
+    for field in ("grantDescription", "organizationType", "fundingAmount", "deadline"):
+        text = unicodedata.normalize("NFKC", str(grant.get(field) or ""))
+        parts.append(re.sub(r"\s+", " ", text).strip().casefold())
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def grant_id_for(content_hash: str) -> str:
+    return f"grant_{content_hash[:32]}"
+
+
+def build_grant_record(openai_client, grant: Dict[str, Any], analysis: Dict[str, Any],
+                       content_hash: Optional[str] = None, limiter: Optional[RateLimiter] = None) -> Dict[str, Any]:
+    """
+    GrantOpportunities record for an analyzed grant, with its embedding when available
+
+    The embedding request takes a token from limiter like the analysis does.
+    """
+    grant_description = grant['grantDescription']
+    content_hash = content_hash or grant_content_hash(grant)
+    
+    grant_record = {
+        "id": grant_id_for(content_hash),
+        "contentHash": content_hash,
+        "promptVersion": ANALYSIS_PROMPT_VERSION,
+        "originalDescription": grant_description,
+        "organizationType": grant['organizationType'],
+        "fundingAmount": grant['fundingAmount'],
+        "deadline": grant['deadline'],
+        "analysis": analysis,
+        "analyzedAt": datetime.now().isoformat(),
+        "status": "active"
+    }
+    # Parsed once here so matching never re-parses the free-text fields
+    grant_record["matchFeatures"] = compute_match_features(grant_record)
+    
+    # Store an embedding so GetMatches can retrieve this grant by similarity
+    if limiter is not None:
+        limiter.acquire()
+    embedding = try_embed_text(openai_client, grant_embedding_text(grant_record))
+    if embedding:
+        grant_record["embedding"] = embedding
+        grant_record["embeddingModel"] = get_embedding_deployment()
+    return grant_record
+
+
+def read_grant(container, grant_id: str) -> Optional[Dict[str, Any]]:
+    """Stored grant record, or None if there is none"""
+    try:
+        return container.read_item(item=grant_id, partition_key=grant_id)
+    except CosmosResourceNotFoundError:
+        return None
+
+
+def upsert_grant(openai_client, container, grant: Dict[str, Any], use_cache: bool = True,
+                 limiter: Optional[RateLimiter] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Store a grant under its content-derived id; returns (record, reanalyzed)
+
+    If a record with the same content hash and prompt version exists, it is
+    returned without calling the model (and reactivated if needed). Otherwise
+    the grant is analyzed and the record upserted, so resubmissions never
+    create duplicates. use_cache=False forces a fresh analysis. Stored
+    records without current match features get them without re-analysis.
+    """
+    content_hash = grant_content_hash(grant)
+    existing = read_grant(container, grant_id_for(content_hash))
+    if (existing is not None and use_cache and existing.get("contentHash") == content_hash
+            and existing.get("promptVersion") == ANALYSIS_PROMPT_VERSION and "analysis" in existing):
+        stale_features = stored_match_features(existing) is None
+        if existing.get("status") != "active" or stale_features:
+            existing["status"] = "active"
+            if stale_features:
+                existing["matchFeatures"] = compute_match_features(existing)
+            container.upsert_item(existing)
+        return existing, False
+    
+    if limiter is not None:
+        limiter.acquire()
+    analysis = analyze_grant(openai_client, grant, use_cache)
+    grant_record = build_grant_record(openai_client, grant, analysis, content_hash, limiter)
+    container.upsert_item(grant_record)
+    return grant_record, True
+
+
+def get_grants_container():
+    """Cosmos container holding grant opportunities"""
+    database_name = os.environ.get("COSMOS_DATABASE_NAME", "GrantAnalysis")
+    database = get_cosmos_client().get_database_client(database_name)
+    return database.get_container_client("GrantOpportunities")
+
+
+def iter_bulk_items(req: func.HttpRequest) -> Iterator[Any]:
+    """
+    Grants of a bulk request: a JSON body {"grants": [...]} or an NDJSON body, one grant per line
 
-def get_cosmos_client():
-    """Initialize Cosmos DB client"""
-    endpoint = os.environ.get("COSMOS_ENDPOINT")
-    key = os.environ.get("COSMOS_KEY")
+    NDJSON lines are parsed lazily; a malformed line is yielded as a
+    ValueError so it fails only its own item.
+    """
+    content_type = (req.headers.get('content-type') or '').lower()
+    if content_type.startswith('application/x-ndjson') or content_type.startswith('application/jsonl'):
+        for line in req.get_body().decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"Invalid JSON line: {str(e)}")
+        return
+    
+    req_body = req.get_json()
+    grants = req_body.get('grants') if isinstance(req_body, dict) else req_body
+    if not isinstance(grants, list):
+        raise ValueError("grants must be an array")
+    yield from grants
+
+
+def ingest_grant(openai_client, container, item: Any, use_cache: bool,
+                 limiter: Optional[RateLimiter]) -> Dict[str, Any]:
+    """
+    Analyze and store one bulk item; returns its per-item result
+    """
+    if isinstance(item, Exception):
+        raise item
+    if not isinstance(item, dict) or not item.get('grantDescription'):
+        raise ValueError("grantDescription is required")
+    
+    grant_record, reanalyzed = upsert_grant(openai_client, container, grant_fields(item),
+                                            item.get('useCache', use_cache), limiter)
+    return {"grantId": grant_record["id"], "reanalyzed": reanalyzed}
+
+
+def ingest_grants(openai_client, container, items: Iterable[Any], use_cache: bool = True,
+                  max_concurrency: Optional[int] = None, limiter: Optional[RateLimiter] = None,
+                  max_items: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Analyze and store many grants with bounded concurrency
+
+    At most max_concurrency grants are in flight, so items are pulled from
+    the input only as workers free up. Results come back in input order, each
+    with its own success/error.
+    """
+    if max_concurrency is None:
+        max_concurrency = get_int_setting("ANALYZE_GRANT_BULK_CONCURRENCY", DEFAULT_BULK_CONCURRENCY)
+    workers = max(1, max_concurrency)
+    
+    started = time.perf_counter()
+    results: Dict[int, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-grant") as executor:
+        in_flight = {}
+        
+        def collect(done):
+            for future in done:
+                index = in_flight.pop(future)
+                try:
+                    results[index] = {"index": index, "success": True, **future.result()}
+                except Exception as e:
+                    logging.warning(f"Bulk grant {index} failed: {str(e)}")
+                    results[index] = {"index": index, "success": False, "error": str(e)}
+        
+        for index, item in enumerate(items):
+            if max_items is not None and index >= max_items:
+                results[index] = {"index": index, "success": False,
+                                  "error": f"Bulk requests are limited to {max_items} grants"}
+                continue
+            if len(in_flight) >= workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[executor.submit(ingest_grant, openai_client, container, item, use_cache, limiter)] = index
+        collect(wait(in_flight)[0])
     
-    if not endpoint or not key:
-        raise ValueError("Cosmos DB configuration missing")
+    elapsed = time.perf_counter() - started
+    items_out = [results[i] for i in sorted(results)]
+    succeeded = sum(1 for r in items_out if r["success"])
+    return {
+        "success": True,
+        "items": items_out,
+        "itemCount": len(items_out),
+        "failedItems": len(items_out) - succeeded,
+        "elapsedMs": round(elapsed * 1000, 1),
+        "grantsPerMinute": round(succeeded / elapsed * 60, 1) if elapsed > 0 else None
+    }
+
+
+def bulk_ingest_request(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Handle POST ?bulk=true: analyze and store an array or NDJSON stream of grants
+    """
+    try:
+        items = iter_bulk_items(req)
+        first = next(items, None)
+    except ValueError as e:
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid bulk request: {str(e)}"}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    if first is None:
+        return func.HttpResponse(
+            json.dumps({"error": "At least one grant is required"}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    requests_per_minute = get_float_setting("ANALYZE_GRANT_REQUESTS_PER_MINUTE", DEFAULT_BULK_REQUESTS_PER_MINUTE)
+    limiter = RateLimiter(requests_per_minute / 60.0, burst=1) if requests_per_minute > 0 else None
+    use_cache = req.params.get('useCache', 'true').lower() != 'false'
     
-    return CosmosClient(endpoint, key)
+    def all_items():
+        yield first
+        yield from items
+    
+    result = ingest_grants(get_openai_client(), get_grants_container(), all_items(), use_cache,
+                           limiter=limiter,
+                           max_items=get_int_setting("ANALYZE_GRANT_MAX_BULK_ITEMS", DEFAULT_MAX_BULK_ITEMS))
+    logging.info(f"Bulk grant ingestion: {result['itemCount']} grants, {result['failedItems']} failed")
+    return func.HttpResponse(
+        json.dumps(result),
+        status_code=200,
+        mimetype="application/json"
+    )
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -38,6 +341,9 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('AnalyzeGrant function triggered')
     
     try:
+        if req.params.get('bulk', '').lower() in ('1', 'true'):
+            return bulk_ingest_request(req)
+        
         # Parse request
         try:
             req_body = req.get_json()
@@ -55,12 +361,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
-        grant_description = req_body.get('grantDescription')
-        organization_type = req_body.get('organizationType', 'Not specified')
-        funding_amount = req_body.get('fundingAmount', 'Not specified')
-        deadline = req_body.get('deadline', 'Not specified')
+        grant = grant_fields(req_body)
+        use_cache = req_body.get('useCache', True)
         
-        if not grant_description:
+        if not grant['grantDescription']:
             return func.HttpResponse(
                 json.dumps({"error": "grantDescription is required"}),
                 status_code=400,
@@ -69,84 +373,26 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         
         # Initialize Azure services
         openai_client = get_openai_client()
-        cosmos_client = get_cosmos_client()
-        
-        # Analyze grant with Azure OpenAI
-        deployment_name = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-35-turbo")
-        
-        system_prompt = """You are a grant analysis expert. Analyze the following grant opportunity and provide comprehensive assessment. 
-        Return a JSON response with:
-        - eligibilityRequirements: Array of key eligibility criteria
-        - fundingDetails: Object with amount, duration, matching requirements
-        - applicationRequirements: Array of required documents/information
-        - evaluationCriteria: Array of evaluation criteria
-        - strategicAlignment: Array of research/project areas supported
-        - competitiveness: Assessment (low/medium/high)
-        - recommendedApplicantProfile: Description of ideal applicant
-        - keyDeadlines: Important dates and milestones
-        - riskFactors: Potential challenges or risks
-        - successFactors: What makes applications successful
-        - applicationTips: Specific tips for strong application"""
         
-        user_prompt = f"""Grant Description: {grant_description}
-        
-Organization Type: {organization_type}
-Funding Amount: {funding_amount}
-Deadline: {deadline}"""
-        
-        # Call Azure OpenAI
-        response = openai_client.chat.completions.create(
-            model=deployment_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1500
-        )
-        
-        analysis_text = response.choices[0].message.content
-        
-        # Parse JSON response
+        # Analyze with Azure OpenAI unless this exact grant is already stored
         try:
-            analysis = json.loads(analysis_text)
-        except json.JSONDecodeError:
+            grant_record, reanalyzed = upsert_grant(openai_client, get_grants_container(), grant, use_cache)
+        except ValueError as e:
             return func.HttpResponse(
-                json.dumps({"error": "Failed to parse grant analysis from OpenAI"}),
+                json.dumps({"error": str(e)}),
                 status_code=500,
                 mimetype="application/json"
             )
+        grant_id = grant_record["id"]
         
-        # Generate unique grant ID
-        grant_id = f"grant_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hashlib.md5(grant_description.encode()).hexdigest()[:8]}"
-        
-        # Store in Cosmos DB
-        database_name = os.environ.get("COSMOS_DATABASE_NAME", "GrantAnalysis")
-        container_name = "GrantOpportunities"
-        
-        database = cosmos_client.get_database_client(database_name)
-        container = database.get_container_client(container_name)
-        
-        grant_record = {
-            "id": grant_id,
-            "originalDescription": grant_description,
-            "organizationType": organization_type,
-            "fundingAmount": funding_amount,
-            "deadline": deadline,
-            "analysis": analysis,
-            "analyzedAt": datetime.now().isoformat(),
-            "status": "active"
-        }
-        
-        container.create_item(grant_record)
-        
-        logging.info(f"Grant analyzed successfully: {grant_id}")
+        logging.info(f"Grant {'analyzed' if reanalyzed else 'unchanged'}: {grant_id}")
         
         return func.HttpResponse(
             json.dumps({
                 "success": True,
                 "grantId": grant_id,
-                "analysis": analysis
+                "analysis": grant_record["analysis"],
+                "reanalyzed": reanalyzed
             }),
             status_code=200,
             mimetype="application/json"
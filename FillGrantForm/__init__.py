@@ -7,16 +7,66 @@ import azure.functions as func
 # Remove problematic Azure imports that cause GLIBC issues
 # from azure.storage.blob import BlobServiceClient  
 # from azure.cosmos import CosmosClient
-import PyPDF2
 import io
 import base64
+import re
+import uuid
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # For LLM integration
-from openai import AzureOpenAI
+from shared_code import clients as shared_clients
+from shared_code.job_queue import get_job_queue, new_job_id, read_job_record, write_job_record
+from shared_code.llm_cache import cached_chat_completion
+from shared_code.model_router import get_route
+from shared_code.settings import get_int_setting, get_float_setting
+from shared_code.structured_output import StructuredOutputError, extract_json, structured_completion
+from shared_code.multipart import parse_multipart_form
 
 # PDF utilities
-from .pdf_utils import PDFFormFiller, PDFFormAnalyzer
+from .pdf_utils import PDFFormFiller, PDFFormAnalyzer, ParsedPDF, as_parsed_pdf
+
+# Concurrency limits for per-field LLM generation
+DEFAULT_FIELD_CONCURRENCY = 8
+DEFAULT_FIELD_TIMEOUT = 60.0  # seconds per field
+MAX_BATCH_TOKENS = 4000  # completion budget for one batched category
+
+FILL_MODES = ("parallel", "batched")
+
+# Fields answered with prose go to the long-field route; everything else
+# (names, titles, amounts, durations) to the cheaper short-field route
+LONG_FIELD_TYPES = ("textarea",)
+LONG_FIELD_KEYWORDS = ("description", "narrative", "statement", "outcome", "summary", "approach",
+                       "methodology", "justification", "plan", "population", "need")
+
+_TEXT_OR_LIST = {"type": ["string", "array"]}
+
+# Every field is optional: whatever the document yields is kept
+NGO_PROFILE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "mission": {"type": "string"},
+        "years_active": {"type": "integer", "minimum": 0},
+        "focus_areas": {"type": "array", "items": {"type": "string"}},
+        "annual_budget": {"type": "number", "minimum": 0},
+        "recent_projects": _TEXT_OR_LIST,
+        "target_population": _TEXT_OR_LIST,
+        "geographic_scope": _TEXT_OR_LIST,
+        "key_achievements": _TEXT_OR_LIST
+    }
+}
+
+# Async mode: queue watched by FillGrantFormWorker, and the blob container
+# holding each job's input and its progress record
+FORM_JOBS_QUEUE = "form-jobs"
+DEFAULT_FORM_JOBS_CONTAINER = "form-jobs"
+
+# How the filled PDF is returned: base64 in JSON, raw PDF body, or a blob reference in JSON
+RESPONSE_FORMATS = ("json", "pdf", "blob")
+DEFAULT_FILLED_FORMS_CONTAINER = "filled-forms"
+
+# Options sent as JSON text in multipart fields or query parameters
+JSON_OPTION_FIELDS = ("ngo_profile", "grant_context", "data_sources", "extracted_data")
 
 def enhance_ngo_profile(base_profile: Dict, data_sources: Dict, ngo_profile_pdf: str = None) -> Dict:
     """
@@ -189,16 +239,15 @@ startxref
     
     return base64.b64encode(pdf_content.encode('utf-8')).decode('utf-8')
 
-def analyze_pdf_simple(pdf_data: str) -> Dict:
+def analyze_pdf_simple(pdf_data) -> Dict:
     """
     Simple PDF analysis without complex dependencies
     """
     try:
-        pdf_bytes = base64.b64decode(pdf_data)
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        pdf = as_parsed_pdf(pdf_data)
         
         return {
-            "total_pages": len(pdf_reader.pages),
+            "total_pages": pdf.page_count,
             "has_form_fields": False,  # Simplified - not checking form fields
             "form_fields": []
         }
@@ -215,15 +264,8 @@ def extract_ngo_data_from_pdf(pdf_data: str) -> Dict:
     Extract NGO information from uploaded profile PDF
     """
     try:
-        # Decode base64 PDF
-        pdf_bytes = base64.b64decode(pdf_data)
-        
         # Extract text using PyPDF2
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-        text_content = ""
-        
-        for page in pdf_reader.pages:
-            text_content += page.extract_text() + "\n"
+        text_content = as_parsed_pdf(pdf_data).full_text
         
         # Use LLM to extract structured data from text
         client = get_openai_client()
@@ -279,19 +321,19 @@ def extract_structured_data_with_llm(text_content: str, data_type: str) -> Dict:
             Return only valid JSON format.
             """
             
-            response = client.chat.completions.create(
-                model="gpt-35-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0.1
-            )
-            
-            result_text = response.choices[0].message.content.strip()
-            # Try to parse as JSON
+            route = get_route("profile_extraction")
             try:
-                return json.loads(result_text)
-            except json.JSONDecodeError:
-                logging.warning("LLM response was not valid JSON")
+                return structured_completion(
+                    client,
+                    model=route.deployment,
+                    messages=[{"role": "user", "content": prompt}],
+                    schema=NGO_PROFILE_SCHEMA,
+                    max_tokens=route.max_tokens,
+                    temperature=0.1,
+                    route=route.name
+                )
+            except StructuredOutputError as e:
+                logging.warning(f"LLM response was not valid JSON: {str(e)}")
                 return {}
                 
     except Exception as e:
@@ -355,14 +397,42 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             "website_url": null
         },
         "ngo_profile_pdf": "base64_encoded_pdf_content",  # Optional
-        "extracted_data": {}  # Optional - from PDF/website processing
+        "extracted_data": {},  # Optional - from PDF/website processing
+        "fill_mode": "parallel",  # Optional - "parallel" (one call per field) or "batched" (one call per category)
+        "use_cache": true,  # Optional - false bypasses the LLM completion cache
+        "async": true,  # Optional - queue the form and return a statusUrl to poll for per-field progress
+        "response_format": "json"  # Optional - "json" (base64 PDF), "pdf" (raw PDF body) or "blob" (blob reference)
     }
+
+    The PDFs can also be uploaded without base64: as multipart/form-data with
+    "pdf_data" (and optionally "ngo_profile_pdf") file parts and the other keys
+    as form fields, or as a raw application/pdf body with the other keys in the
+    query string. Object-valued keys are JSON-encoded in both cases.
+
+    GET ?jobId=... returns the progress of an async job.
     """
     logging.info('Grant form filling request received')
     
     try:
+        if req.method == "GET":
+            job_id = req.params.get('jobId')
+            if not job_id:
+                return func.HttpResponse(
+                    json.dumps({"error": "jobId query parameter is required"}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
+            return get_form_job_status(job_id)
+        
         # Parse request
-        req_body = req.get_json()
+        try:
+            req_body = read_form_request(req)
+        except ValueError as e:
+            return func.HttpResponse(
+                json.dumps({"error": str(e)}),
+                status_code=400,
+                mimetype="application/json"
+            )
         
         if not req_body:
             return func.HttpResponse(
@@ -376,6 +446,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         grant_context = req_body.get('grant_context', {})
         data_sources = req_body.get('data_sources', {})
         ngo_profile_pdf = req_body.get('ngo_profile_pdf')
+        fill_mode = req_body.get('fill_mode', 'parallel')
+        use_cache = req_body.get('use_cache', True)
+        async_mode = req_body.get('async') is True or req.params.get('async', '').lower() in ('1', 'true')
+        response_format = resolve_response_format(req_body.get('response_format'), req.headers.get('Accept', ''))
         
         if not pdf_data:
             return func.HttpResponse(
@@ -384,18 +458,43 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
-        # Enhance NGO profile with additional data sources
-        try:
-            logging.info(f"Enhancing NGO profile with data sources: {data_sources}")
-            enhanced_ngo_profile = enhance_ngo_profile(ngo_profile, data_sources, ngo_profile_pdf)
-            logging.info("NGO profile enhancement completed")
-        except Exception as e:
-            logging.error(f"Error enhancing NGO profile: {str(e)}")
-            # Fallback to original profile if enhancement fails
-            enhanced_ngo_profile = ngo_profile
+        if fill_mode not in FILL_MODES:
+            return func.HttpResponse(
+                json.dumps({"error": f"fill_mode must be one of: {', '.join(FILL_MODES)}"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        if response_format not in RESPONSE_FORMATS:
+            return func.HttpResponse(
+                json.dumps({"error": f"response_format must be one of: {', '.join(RESPONSE_FORMATS)}"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        if async_mode and response_format != "json":
+            return func.HttpResponse(
+                json.dumps({"error": "response_format cannot be combined with async"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        if async_mode:
+            # Profile enhancement may call the LLM too, so it runs in the job
+            record = enqueue_form_job(pdf_data, ngo_profile, grant_context, data_sources, ngo_profile_pdf,
+                                      fill_mode, use_cache)
+            logging.info(f"Grant form queued as job {record['jobId']}")
+            return func.HttpResponse(json.dumps(record), status_code=202, mimetype="application/json")
+        
+        enhanced_ngo_profile = resolve_ngo_profile(ngo_profile, data_sources, ngo_profile_pdf)
         
         # Process the grant form filling
-        result = process_grant_form(pdf_data, enhanced_ngo_profile, grant_context)
+        if response_format != "json":
+            result = process_grant_form(pdf_data, enhanced_ngo_profile, grant_context, fill_mode, use_cache,
+                                        pdf_encoding="binary")
+            return create_binary_form_response(result, response_format)
+        
+        result = process_grant_form(pdf_data, enhanced_ngo_profile, grant_context, fill_mode, use_cache)
         
         return func.HttpResponse(
             json.dumps(result),
@@ -411,72 +510,279 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json"
         )
 
-def process_grant_form(pdf_data: str, enhanced_ngo_profile: Dict, grant_context: Dict) -> Dict:
+def read_form_request(req: func.HttpRequest) -> Optional[Dict]:
+    """
+    Read the request into the JSON body shape, whatever the upload format
+
+    PDFs uploaded as multipart parts or a raw application/pdf body are returned
+    as bytes. Raises ValueError for malformed multipart bodies or JSON options.
+    """
+    content_type = req.headers.get('Content-Type') or ''
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    
+    if media_type == 'multipart/form-data':
+        return decode_form_options(parse_multipart_form(req.get_body(), content_type))
+    
+    if media_type == 'application/pdf':
+        options = decode_form_options(dict(req.params))
+        options['pdf_data'] = req.get_body()
+        return options
+    
+    return req.get_json()
+
+def decode_form_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert text form fields / query parameters to the JSON body's value types
+    """
+    decoded = dict(options)
+    for key in JSON_OPTION_FIELDS:
+        value = decoded.get(key)
+        if isinstance(value, (str, bytes)):
+            try:
+                decoded[key] = json.loads(value) if value else {}
+            except ValueError:
+                raise ValueError(f"{key} must be a JSON object")
+    
+    use_cache = decoded.get('use_cache')
+    if isinstance(use_cache, str):
+        decoded['use_cache'] = use_cache.strip().lower() not in ('false', '0', 'no')
+    
+    async_mode = decoded.get('async')
+    if isinstance(async_mode, str):
+        decoded['async'] = async_mode.strip().lower() in ('1', 'true')
+    
+    for key in ('pdf_data', 'ngo_profile_pdf'):
+        # A file part sent as a text field still carries base64 text
+        if isinstance(decoded.get(key), str) and not decoded[key]:
+            decoded.pop(key)
+    return decoded
+
+def resolve_response_format(response_format, accept_header: str = "") -> str:
+    """
+    Pick how the filled PDF is returned from the option or the Accept header
+    """
+    if response_format:
+        return str(response_format).lower()
+    if "application/pdf" in (accept_header or ""):
+        return "pdf"
+    return "json"
+
+def create_binary_form_response(result: Dict, response_format: str) -> func.HttpResponse:
+    """
+    Return the filled PDF as the raw response body or as a blob reference
+
+    result comes from process_grant_form with pdf_encoding="binary".
+    """
+    filled_pdf = result.get("filled_pdf")
+    if not filled_pdf:
+        return func.HttpResponse(
+            json.dumps({"error": "Filled PDF could not be generated", "processing_summary": result["processing_summary"]}),
+            status_code=500,
+            mimetype="application/json"
+        )
+    
+    if response_format == "pdf":
+        return func.HttpResponse(
+            filled_pdf["data"],
+            status_code=200,
+            mimetype="application/pdf",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filled_pdf["filename"]}"',
+                "X-Processing-Summary": json.dumps(result["processing_summary"])
+            }
+        )
+    
+    result["filled_pdf"] = upload_filled_pdf(filled_pdf["data"], filled_pdf["filename"])
+    return func.HttpResponse(
+        json.dumps(result),
+        status_code=200,
+        mimetype="application/json"
+    )
+
+def upload_filled_pdf(pdf_bytes: bytes, filename: str) -> Dict:
+    """
+    Upload a filled PDF to blob storage and describe where it is
+    """
+    from azure.storage.blob import ContentSettings
+    
+    container_name = os.environ.get("FILLED_FORMS_CONTAINER", DEFAULT_FILLED_FORMS_CONTAINER)
+    blob_name = f"{datetime.utcnow().strftime('%Y%m%d')}/{uuid.uuid4().hex}.pdf"
+    
+    container_client = shared_clients.get_blob_container_client(container_name)
+    blob_client = container_client.get_blob_client(blob_name)
+    blob_client.upload_blob(pdf_bytes, overwrite=True, content_settings=ContentSettings(content_type="application/pdf"))
+    
+    return {
+        "blob_url": blob_client.url,
+        "container": container_name,
+        "blob_name": blob_name,
+        "filename": filename,
+        "content_type": "application/pdf",
+        "size": len(pdf_bytes),
+        "encoding": "blob"
+    }
+
+def resolve_ngo_profile(ngo_profile: Dict, data_sources: Dict, ngo_profile_pdf=None) -> Dict:
+    """
+    Enhance the NGO profile, falling back to the profile as sent if that fails
+    """
+    try:
+        logging.info(f"Enhancing NGO profile with data sources: {data_sources}")
+        enhanced_ngo_profile = enhance_ngo_profile(ngo_profile, data_sources, ngo_profile_pdf)
+        logging.info("NGO profile enhancement completed")
+        return enhanced_ngo_profile
+    except Exception as e:
+        logging.error(f"Error enhancing NGO profile: {str(e)}")
+        return ngo_profile
+
+def get_form_jobs_container():
+    """Blob container holding form job inputs and progress records"""
+    return shared_clients.get_blob_container_client(
+        os.environ.get("FORM_JOBS_CONTAINER", DEFAULT_FORM_JOBS_CONTAINER))
+
+def enqueue_form_job(pdf_data, ngo_profile: Dict, grant_context: Dict, data_sources: Dict, ngo_profile_pdf,
+                     fill_mode: str, use_cache: bool) -> Dict:
+    """
+    Store the form and its options, record a queued job and send it to the worker queue; returns the job record
+    """
+    job_id = new_job_id()
+    container = get_form_jobs_container()
+    # Raw uploads are stored as base64 like JSON uploads, so the job input is one JSON blob
+    if isinstance(pdf_data, bytes):
+        pdf_data = base64.b64encode(pdf_data).decode("ascii")
+    if isinstance(ngo_profile_pdf, bytes):
+        ngo_profile_pdf = base64.b64encode(ngo_profile_pdf).decode("ascii")
+    container.get_blob_client(f"{job_id}/input.json").upload_blob(json.dumps({
+        "pdf_data": pdf_data,
+        "ngo_profile": ngo_profile,
+        "grant_context": grant_context,
+        "data_sources": data_sources,
+        "ngo_profile_pdf": ngo_profile_pdf,
+        "fill_mode": fill_mode,
+        "use_cache": use_cache
+    }), overwrite=True)
+    
+    record = write_job_record(container, {
+        "jobId": job_id,
+        "status": "queued",
+        "statusUrl": f"/api/FillGrantForm?jobId={job_id}",
+        "createdAt": datetime.utcnow().isoformat(),
+        "completed_fields": 0,
+        "total_fields": None,
+        "filled_responses": {}
+    })
+    get_job_queue(FORM_JOBS_QUEUE, run_form_job).send({"jobId": job_id})
+    return record
+
+def apply_progress_event(record: Dict, event: Dict):
+    """
+    Fold one progress event from iter_grant_form_progress into a job record
+    """
+    kind = event["event"]
+    if kind == "fields":
+        record.update({
+            "original_fields": event["original_fields"],
+            "classified_fields": event["classified_fields"],
+            "total_fields": event["total_fields"]
+        })
+    elif kind == "field":
+        record["filled_responses"][event["name"]] = event["response"]
+        record["completed_fields"] = event["completed"]
+    elif kind in ("pdf_analysis", "filled_pdf"):
+        record[kind] = event[kind]
+    elif kind == "complete":
+        record.update({key: value for key, value in event.items() if key != "event"})
+        record["status"] = "completed"
+    elif kind == "error":
+        record.update({"status": "failed", "error": event["error"]})
+
+def run_form_job(job: Dict[str, Any]):
+    """
+    Fill a queued form (called by FillGrantFormWorker or the in-process queue)
+
+    The progress record is rewritten after every event, so a poll sees each
+    field answer as soon as it is generated. A failed job is recorded as
+    failed and the error re-raised so the queue can retry.
+    """
+    job_id = job["jobId"]
+    container = get_form_jobs_container()
+    record = read_job_record(container, job_id) or {"jobId": job_id}
+    if record.get("status") == "completed":
+        logging.info(f"Form job {job_id} already completed, skipping")
+        return
+    
+    record.update({"status": "processing", "completed_fields": 0, "filled_responses": {}})
+    record.pop("error", None)
+    write_job_record(container, record)
+    
+    try:
+        options = json.loads(container.get_blob_client(f"{job_id}/input.json").download_blob().readall())
+        enhanced_ngo_profile = resolve_ngo_profile(options.get("ngo_profile") or {}, options.get("data_sources") or {},
+                                                   options.get("ngo_profile_pdf"))
+        for event in iter_grant_form_progress(options["pdf_data"], enhanced_ngo_profile,
+                                              options.get("grant_context") or {},
+                                              options.get("fill_mode", "parallel"), options.get("use_cache", True)):
+            apply_progress_event(record, event)
+            write_job_record(container, record)
+    except Exception as e:
+        logging.error(f"Form job {job_id} failed: {str(e)}")
+        record.update({"status": "failed", "error": str(e)})
+        write_job_record(container, record)
+        raise
+    
+    if record["status"] == "failed":
+        raise RuntimeError(record["error"])
+    logging.info(f"Form job {job_id} completed")
+
+def get_form_job_status(job_id: str) -> func.HttpResponse:
+    """
+    Handle GET ?jobId=...: progress of an async job, with the answers generated so far
+    """
+    record = read_job_record(get_form_jobs_container(), job_id)
+    if record is None:
+        return func.HttpResponse(
+            json.dumps({"error": f"Job {job_id} not found"}),
+            status_code=404,
+            mimetype="application/json"
+        )
+    return func.HttpResponse(json.dumps(record), status_code=200, mimetype="application/json")
+
+def process_grant_form(pdf_data, enhanced_ngo_profile: Dict, grant_context: Dict, fill_mode: str = "parallel",
+                       use_cache: bool = True, pdf_encoding: str = "base64") -> Dict:
     """
     Process grant form filling workflow
+
+    The PDF (base64 text or raw bytes) is decoded and parsed once; every stage
+    shares the same ParsedPDF. With pdf_encoding="binary" the filled PDF is
+    returned as bytes instead of base64 text.
     """
     try:
+        pdf = as_parsed_pdf(pdf_data)
+        
         # Step 1: Parse PDF form fields
-        form_fields = parse_pdf_form_fields(pdf_data)
+        form_fields = parse_pdf_form_fields(pdf)
         
         # Step 2: Classify and analyze fields
         classified_fields = classify_form_fields(form_fields)
         
         # Step 3: Generate responses using LLM
         try:
-            filled_responses = generate_field_responses(classified_fields, enhanced_ngo_profile, grant_context)
+            if fill_mode == "batched":
+                filled_responses = generate_batched_field_responses(classified_fields, enhanced_ngo_profile, grant_context,
+                                                                    use_cache=use_cache)
+            else:
+                filled_responses = generate_field_responses(classified_fields, enhanced_ngo_profile, grant_context,
+                                                            use_cache=use_cache)
         except Exception as e:
             logging.warning(f"LLM response generation failed: {str(e)}")
             # Fallback to demo responses if LLM fails
             filled_responses = generate_demo_responses(classified_fields, enhanced_ngo_profile)
         
         # Step 4: Generate filled PDF using proper PDF generation
-        try:
-            logging.info("Attempting to import and use PDFFormFiller...")
-            pdf_filler = PDFFormFiller()
-            logging.info("PDFFormFiller created successfully")
-            pdf_success, filled_pdf_data, fill_method = pdf_filler.fill_pdf_form(pdf_data, filled_responses)
-            logging.info(f"PDF generation result: success={pdf_success}, method={fill_method}")
-            
-            if not pdf_success:
-                logging.warning(f"PDF generation failed: {fill_method}")
-                # Fallback to simple text-based PDF
-                logging.info("Falling back to create_simple_pdf_response")
-                filled_pdf_data = create_simple_pdf_response(filled_responses)
-                pdf_success = True
-                fill_method = "Simple_PDF_Fallback"
-                logging.info("Simple PDF fallback completed")
-                
-        except Exception as e:
-            logging.error(f"Error generating PDF: {str(e)}")
-            # Fallback to simple text-based representation
-            try:
-                logging.info("Main PDF generation failed, trying simple PDF fallback")
-                filled_pdf_data = create_simple_pdf_response(filled_responses)
-                pdf_success = True
-                fill_method = "Error_Fallback"
-                logging.info("Error fallback PDF generation completed")
-            except Exception as fallback_error:
-                logging.error(f"Even fallback PDF generation failed: {str(fallback_error)}")
-                pdf_success = False
-                filled_pdf_data = None
-                fill_method = "Complete_Failure"
+        pdf_success, filled_pdf_data, fill_method = build_filled_pdf(pdf, filled_responses, pdf_encoding)
         
         # Step 5: Analyze original PDF structure
-        try:
-            pdf_analysis = PDFFormAnalyzer.analyze_pdf_structure(pdf_data)
-        except Exception as e:
-            logging.warning(f"PDF analysis failed: {str(e)}")
-            # Fallback to simple analysis
-            try:
-                pdf_analysis = analyze_pdf_simple(pdf_data)
-            except Exception as fallback_error:
-                logging.warning(f"Simple PDF analysis also failed: {str(fallback_error)}")
-                pdf_analysis = {
-                    "total_pages": 1,
-                    "has_form_fields": False,
-                    "form_fields": []
-                }
+        pdf_analysis = analyze_original_pdf(pdf)
         
         # Step 6: Create response structure
         filled_form_data = create_filled_form_structure(filled_responses)
@@ -489,25 +795,13 @@ def process_grant_form(pdf_data: str, enhanced_ngo_profile: Dict, grant_context:
             "filled_form_structure": filled_form_data,
             "pdf_analysis": pdf_analysis,
             "timestamp": datetime.utcnow().isoformat(),
-            "processing_summary": {
-                "total_fields": sum(len(fields) for fields in classified_fields.values()) if classified_fields else len(filled_responses),  # Count all fields across categories
-                "filled_fields": len(filled_responses),
-                "fill_rate": round((len(filled_responses) / max(sum(len(fields) for fields in classified_fields.values()) if classified_fields else len(filled_responses), 1)) * 100, 1),
-                "pdf_generation": {
-                    "success": pdf_success,
-                    "method": fill_method
-                }
-            }
+            "processing_summary": build_processing_summary(classified_fields, filled_responses, fill_mode,
+                                                           pdf_success, fill_method)
         }
         
         # Add filled PDF if successful
         if pdf_success and filled_pdf_data:
-            result["filled_pdf"] = {
-                "data": filled_pdf_data,
-                "filename": "filled_grant_application.pdf",
-                "content_type": "application/pdf",
-                "encoding": "base64"
-            }
+            result["filled_pdf"] = create_filled_pdf_entry(filled_pdf_data, pdf_encoding)
         
         return result
         
@@ -515,41 +809,220 @@ def process_grant_form(pdf_data: str, enhanced_ngo_profile: Dict, grant_context:
         logging.error(f"Error processing grant form: {str(e)}")
         raise
 
-def parse_pdf_form_fields(pdf_data: str) -> List[Dict]:
+def iter_grant_form_progress(pdf_data, enhanced_ngo_profile: Dict, grant_context: Dict, fill_mode: str = "parallel",
+                             use_cache: bool = True):
     """
-    Extract form fields from PDF using PyPDF2
+    Run the grant form workflow as a sequence of progress events
+
+    Yields dicts with an "event" key: "fields" once the form is parsed, one
+    "field" per generated answer in completion order, then "pdf_analysis",
+    "filled_pdf" and finally "complete". The LLM, PDF and analysis work is the
+    same as process_grant_form. A failure ends the sequence with an "error" event.
     """
     try:
-        # Decode base64 PDF data
-        pdf_bytes = base64.b64decode(pdf_data)
+        pdf = as_parsed_pdf(pdf_data)
+        form_fields = parse_pdf_form_fields(pdf)
+        classified_fields = classify_form_fields(form_fields)
+        total_fields = sum(len(fields) for fields in classified_fields.values())
+        yield {
+            "event": "fields",
+            "original_fields": form_fields,
+            "classified_fields": classified_fields,
+            "total_fields": total_fields
+        }
+        
+        filled_responses = {}
+        for category, field_name, response in iter_generated_responses(classified_fields, enhanced_ngo_profile,
+                                                                        grant_context, fill_mode, use_cache):
+            filled_responses[field_name] = response
+            yield {
+                "event": "field",
+                "name": field_name,
+                "category": category,
+                "response": response,
+                "completed": len(filled_responses),
+                "total_fields": total_fields
+            }
+        
+        # Present responses in category/field order, as process_grant_form does
+        ordered = [field["name"] for fields in classified_fields.values() for field in fields]
+        filled_responses = {name: filled_responses[name] for name in ordered if name in filled_responses}
+        
+        yield {"event": "pdf_analysis", "pdf_analysis": analyze_original_pdf(pdf)}
+        
+        pdf_success, filled_pdf_data, fill_method = build_filled_pdf(pdf, filled_responses)
+        if pdf_success and filled_pdf_data:
+            yield {"event": "filled_pdf", "filled_pdf": create_filled_pdf_entry(filled_pdf_data)}
         
-        # Create PDF reader
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        yield {
+            "event": "complete",
+            "success": True,
+            "filled_responses": filled_responses,
+            "filled_form_structure": create_filled_form_structure(filled_responses),
+            "timestamp": datetime.utcnow().isoformat(),
+            "processing_summary": build_processing_summary(classified_fields, filled_responses, fill_mode,
+                                                           pdf_success, fill_method)
+        }
+        
+    except Exception as e:
+        logging.error(f"Error filling grant form: {str(e)}", exc_info=True)
+        yield {"event": "error", "error": f"Internal server error: {str(e)}", "type": type(e).__name__}
+
+def iter_generated_responses(classified_fields: Dict, enhanced_ngo_profile: Dict, grant_context: Dict,
+                             fill_mode: str = "parallel", use_cache: bool = True):
+    """
+    Yield (category, field_name, response) in completion order for the chosen fill mode
+
+    Without an OpenAI client, or if generation fails before any field is
+    produced, the demo responses are yielded instead.
+    """
+    tasks = [(category, field) for category, fields in classified_fields.items() for field in fields]
+    client = get_openai_client()
+    produced = 0
+    try:
+        if client:
+            max_concurrency, field_timeout = resolve_generation_limits(None, None)
+            if fill_mode == "batched":
+                responses = iter_batched_field_responses(client, classified_fields, enhanced_ngo_profile, grant_context,
+                                                         max_concurrency, field_timeout, use_cache)
+            else:
+                responses = iter_field_responses(client, tasks, enhanced_ngo_profile, grant_context,
+                                                 max_concurrency, field_timeout, use_cache)
+            for item in responses:
+                produced += 1
+                yield item
+            return
+    except Exception as e:
+        logging.warning(f"LLM response generation failed: {str(e)}")
+        if produced:
+            raise
+    
+    demo_responses = generate_demo_responses(classified_fields, enhanced_ngo_profile)
+    for category, field in tasks:
+        if field["name"] in demo_responses:
+            yield category, field["name"], demo_responses[field["name"]]
+
+def build_filled_pdf(pdf_data, filled_responses: Dict[str, str], pdf_encoding: str = "base64"):
+    """
+    Fill the original PDF, falling back to a generated text PDF
+
+    Returns (success, PDF data or None, fill method). The data is base64 text,
+    or raw bytes when pdf_encoding is "binary".
+    """
+    try:
+        logging.info("Attempting to import and use PDFFormFiller...")
+        pdf_filler = PDFFormFiller()
+        logging.info("PDFFormFiller created successfully")
+        pdf_success, filled_pdf_bytes, fill_method = pdf_filler.fill_pdf_form_bytes(pdf_data, filled_responses)
+        logging.info(f"PDF generation result: success={pdf_success}, method={fill_method}")
+        
+        if not pdf_success:
+            logging.warning(f"PDF generation failed: {fill_method}")
+            # Fallback to simple text-based PDF
+            logging.info("Falling back to create_simple_pdf_response")
+            filled_pdf_bytes = base64.b64decode(create_simple_pdf_response(filled_responses))
+            pdf_success = True
+            fill_method = "Simple_PDF_Fallback"
+            logging.info("Simple PDF fallback completed")
+            
+    except Exception as e:
+        logging.error(f"Error generating PDF: {str(e)}")
+        # Fallback to simple text-based representation
+        try:
+            logging.info("Main PDF generation failed, trying simple PDF fallback")
+            filled_pdf_bytes = base64.b64decode(create_simple_pdf_response(filled_responses))
+            pdf_success = True
+            fill_method = "Error_Fallback"
+            logging.info("Error fallback PDF generation completed")
+        except Exception as fallback_error:
+            logging.error(f"Even fallback PDF generation failed: {str(fallback_error)}")
+            pdf_success = False
+            filled_pdf_bytes = None
+            fill_method = "Complete_Failure"
+    
+    if filled_pdf_bytes is not None and pdf_encoding != "binary":
+        return pdf_success, base64.b64encode(filled_pdf_bytes).decode('utf-8'), fill_method
+    return pdf_success, filled_pdf_bytes, fill_method
+
+def analyze_original_pdf(pdf_data) -> Dict:
+    """
+    Analyze the original PDF structure, falling back to the simple analysis
+    """
+    try:
+        return PDFFormAnalyzer.analyze_pdf_structure(pdf_data)
+    except Exception as e:
+        logging.warning(f"PDF analysis failed: {str(e)}")
+        # Fallback to simple analysis
+        try:
+            return analyze_pdf_simple(pdf_data)
+        except Exception as fallback_error:
+            logging.warning(f"Simple PDF analysis also failed: {str(fallback_error)}")
+            return {
+                "total_pages": 1,
+                "has_form_fields": False,
+                "form_fields": []
+            }
+
+def build_processing_summary(classified_fields: Dict, filled_responses: Dict[str, str], fill_mode: str,
+                             pdf_success: bool, fill_method: str) -> Dict:
+    """
+    Summarize field coverage and PDF generation for the response
+    """
+    total_fields = sum(len(fields) for fields in classified_fields.values()) if classified_fields else len(filled_responses)  # Count all fields across categories
+    return {
+        "total_fields": total_fields,
+        "filled_fields": len(filled_responses),
+        "fill_mode": fill_mode,
+        "fill_rate": round((len(filled_responses) / max(total_fields, 1)) * 100, 1),
+        "pdf_generation": {
+            "success": pdf_success,
+            "method": fill_method
+        }
+    }
+
+def create_filled_pdf_entry(filled_pdf_data, pdf_encoding: str = "base64") -> Dict:
+    """
+    Describe the filled PDF attachment in the response
+    """
+    return {
+        "data": filled_pdf_data,
+        "filename": "filled_grant_application.pdf",
+        "content_type": "application/pdf",
+        "encoding": pdf_encoding
+    }
+
+def parse_pdf_form_fields(pdf_data) -> List[Dict]:
+    """
+    Extract form fields from PDF using PyPDF2
+
+    Accepts base64 data or a ParsedPDF shared with the later stages.
+    """
+    try:
+        pdf = as_parsed_pdf(pdf_data)
         
         form_fields = []
         
         # Check if PDF has form fields
-        if pdf_reader.is_encrypted:
+        if pdf.is_encrypted:
             logging.warning("PDF is encrypted, cannot extract form fields")
             return []
         
         # Try to get form fields
         try:
-            if hasattr(pdf_reader, 'get_form_text_fields'):
-                text_fields = pdf_reader.get_form_text_fields() or {}
-                for field_name, field_value in text_fields.items():
-                    form_fields.append({
-                        "name": field_name,
-                        "type": "text",
-                        "current_value": field_value or "",
-                        "required": True  # Assume required for demo
-                    })
+            text_fields = pdf.form_text_fields
+            for field_name, field_value in text_fields.items():
+                form_fields.append({
+                    "name": field_name,
+                    "type": "text",
+                    "current_value": field_value or "",
+                    "required": True  # Assume required for demo
+                })
         except Exception as e:
             logging.warning(f"Could not extract form fields with PyPDF2: {str(e)}")
         
         # If no form fields found, extract text and infer fields
         if not form_fields:
-            form_fields = infer_fields_from_text(pdf_reader)
+            form_fields = infer_fields_from_text(pdf)
         
         return form_fields
         
@@ -558,15 +1031,20 @@ def parse_pdf_form_fields(pdf_data: str) -> List[Dict]:
         # Return demo fields if parsing fails
         return get_demo_grant_fields()
 
-def infer_fields_from_text(pdf_reader) -> List[Dict]:
+def infer_fields_from_text(pdf) -> List[Dict]:
     """
     Infer form fields from PDF text content when no form fields are present
+
+    Accepts a ParsedPDF (whose page text is cached for later stages) or a PyPDF2 reader.
     """
     try:
         # Extract all text from PDF
-        full_text = ""
-        for page in pdf_reader.pages:
-            full_text += page.extract_text() + "\n"
+        if isinstance(pdf, ParsedPDF):
+            full_text = pdf.full_text
+        else:
+            full_text = ""
+            for page in pdf.pages:
+                full_text += page.extract_text() + "\n"
         
         # Common grant form field patterns
         field_patterns = [
@@ -648,12 +1126,16 @@ def classify_form_fields(form_fields: List[Dict]) -> Dict[str, List[Dict]]:
     
     return categories
 
-def generate_field_responses(classified_fields: Dict, enhanced_ngo_profile: Dict, grant_context: Dict) -> Dict[str, str]:
+def generate_field_responses(classified_fields: Dict, enhanced_ngo_profile: Dict, grant_context: Dict,
+                             max_concurrency: Optional[int] = None, field_timeout: Optional[float] = None,
+                             use_cache: bool = True) -> Dict[str, str]:
     """
     Generate appropriate responses for each field using LLM
+
+    Field prompts are sent concurrently through a bounded thread pool. Responses
+    are always returned in category/field order, and any field whose LLM call
+    fails or times out falls back to generate_fallback_response.
     """
-    responses = {}
-    
     try:
         # Get OpenAI client (if configured)
         client = get_openai_client()
@@ -661,42 +1143,267 @@ def generate_field_responses(classified_fields: Dict, enhanced_ngo_profile: Dict
             # Return demo responses if OpenAI not configured
             return generate_demo_responses(classified_fields, enhanced_ngo_profile)
         
-        # Process each category
-        for category, fields in classified_fields.items():
-            for field in fields:
-                field_name = field["name"]
-                field_type = field["type"]
-                
-                # Generate contextual prompt
-                prompt = create_field_prompt(field_name, field_type, category, enhanced_ngo_profile, grant_context)
-                
-                # Get LLM response
-                try:
-                    response = client.chat.completions.create(
-                        model="gpt-35-turbo",  # or gpt-4 if available
-                        messages=[
-                            {"role": "system", "content": "You are an expert grant writer helping fill out grant applications."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        max_tokens=500,
-                        temperature=0.7
-                    )
-                    
-                    responses[field_name] = response.choices[0].message.content.strip()
-                    
-                except Exception as e:
-                    logging.warning(f"LLM call failed for field {field_name}: {str(e)}")
-                    responses[field_name] = generate_fallback_response(field_name, field_type, enhanced_ngo_profile)
-        
-        return responses
+        max_concurrency, field_timeout = resolve_generation_limits(max_concurrency, field_timeout)
+        
+        # Flatten fields in a fixed order so the output order never depends on completion order
+        tasks = [(category, field) for category, fields in classified_fields.items() for field in fields]
+        return generate_fields_concurrently(client, tasks, enhanced_ngo_profile, grant_context,
+                                            max_concurrency, field_timeout, use_cache)
         
     except Exception as e:
         logging.error(f"Error generating field responses: {str(e)}")
         return generate_demo_responses(classified_fields, enhanced_ngo_profile)
 
-def create_field_prompt(field_name: str, field_type: str, category: str, enhanced_ngo_profile: Dict, grant_context: Dict) -> str:
+def resolve_generation_limits(max_concurrency: Optional[int], field_timeout: Optional[float]):
     """
-    Create contextual prompt for each field type using enhanced NGO profile
+    Fill in concurrency limit and per-call timeout from app settings when not given
+    """
+    if max_concurrency is None:
+        max_concurrency = get_int_setting("FILL_FORM_MAX_CONCURRENCY", DEFAULT_FIELD_CONCURRENCY)
+    if field_timeout is None:
+        field_timeout = get_float_setting("FILL_FORM_FIELD_TIMEOUT", DEFAULT_FIELD_TIMEOUT)
+    return max(1, max_concurrency), field_timeout
+
+def generate_fields_concurrently(client, tasks: List, enhanced_ngo_profile: Dict, grant_context: Dict,
+                                 max_concurrency: int, field_timeout: float, use_cache: bool = True) -> Dict[str, str]:
+    """
+    Run one LLM call per (category, field) task and collect responses in task order
+    """
+    completed = {
+        field_name: response
+        for _, field_name, response in iter_field_responses(client, tasks, enhanced_ngo_profile, grant_context,
+                                                            max_concurrency, field_timeout, use_cache)
+    }
+    return {field["name"]: completed[field["name"]] for _, field in tasks}
+
+def iter_field_responses(client, tasks: List, enhanced_ngo_profile: Dict, grant_context: Dict,
+                         max_concurrency: int, field_timeout: float, use_cache: bool = True):
+    """
+    Run one LLM call per (category, field) task, yielding (category, field_name, response) as each completes
+    """
+    if not tasks:
+        return
+    
+    workers = min(max_concurrency, len(tasks))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fill-field") as executor:
+        futures = {
+            executor.submit(generate_single_field_response, client, field, category,
+                            enhanced_ngo_profile, grant_context, field_timeout, use_cache): (category, field)
+            for category, field in tasks
+        }
+        
+        for future in as_completed(futures):
+            category, field = futures[future]
+            field_name = field["name"]
+            try:
+                response = future.result()
+            except Exception as e:
+                logging.warning(f"LLM call failed for field {field_name}: {str(e)}")
+                response = generate_fallback_response(field_name, field["type"], enhanced_ngo_profile)
+            yield category, field_name, response
+
+def generate_batched_field_responses(classified_fields: Dict, enhanced_ngo_profile: Dict, grant_context: Dict,
+                                     max_concurrency: Optional[int] = None, field_timeout: Optional[float] = None,
+                                     use_cache: bool = True) -> Dict[str, str]:
+    """
+    Generate responses with one structured-JSON LLM call per field category
+
+    Categories are requested concurrently. If a category's batch response is
+    malformed, only that category falls back to per-field calls; fields missing
+    from an otherwise valid batch are also generated individually.
+    """
+    try:
+        client = get_openai_client()
+        if not client:
+            return generate_demo_responses(classified_fields, enhanced_ngo_profile)
+        
+        max_concurrency, field_timeout = resolve_generation_limits(max_concurrency, field_timeout)
+        
+        completed = {
+            field_name: response
+            for _, field_name, response in iter_batched_field_responses(client, classified_fields, enhanced_ngo_profile,
+                                                                        grant_context, max_concurrency, field_timeout,
+                                                                        use_cache)
+        }
+        
+        # Assemble in category/field order
+        return {field["name"]: completed[field["name"]] for fields in classified_fields.values() for field in fields}
+        
+    except Exception as e:
+        logging.error(f"Error generating batched field responses: {str(e)}")
+        return generate_demo_responses(classified_fields, enhanced_ngo_profile)
+
+def iter_batched_field_responses(client, classified_fields: Dict, enhanced_ngo_profile: Dict, grant_context: Dict,
+                                 max_concurrency: int, field_timeout: float, use_cache: bool = True):
+    """
+    Yield (category, field_name, response) as each category batch completes
+
+    Fields a batch did not answer are generated individually afterwards.
+    """
+    categories = [(category, fields) for category, fields in classified_fields.items() if fields]
+    if not categories:
+        return
+    
+    answered = set()
+    workers = min(max_concurrency, len(categories))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fill-batch") as executor:
+        futures = {
+            executor.submit(generate_category_responses, client, category, fields,
+                            enhanced_ngo_profile, grant_context, field_timeout, use_cache): category
+            for category, fields in categories
+        }
+        for future in as_completed(futures):
+            category = futures[future]
+            try:
+                batch = future.result()
+            except Exception as e:
+                logging.warning(f"Batch generation failed for category {category}, falling back to per-field calls: {str(e)}")
+                batch = {}
+            for field in classified_fields[category]:
+                if field["name"] in batch:
+                    answered.add(field["name"])
+                    yield category, field["name"], batch[field["name"]]
+    
+    # Anything the batches did not answer goes through the per-field path
+    retry_tasks = [
+        (category, field) for category, fields in categories for field in fields
+        if field["name"] not in answered
+    ]
+    yield from iter_field_responses(client, retry_tasks, enhanced_ngo_profile, grant_context,
+                                    max_concurrency, field_timeout, use_cache)
+
+def field_route_name(field: Dict) -> str:
+    """
+    Model route for one form field: "long_field" for narrative answers, else "short_field"
+    """
+    name = field["name"].lower()
+    if field.get("type") in LONG_FIELD_TYPES or any(keyword in name for keyword in LONG_FIELD_KEYWORDS):
+        return "long_field"
+    return "short_field"
+
+def category_route(fields: List[Dict]):
+    """
+    Route and completion budget for a category batch
+
+    The batch runs on the long-field route if any of its fields does, with
+    the per-field budgets summed (capped at MAX_BATCH_TOKENS).
+    """
+    field_routes = [get_route(field_route_name(field)) for field in fields]
+    route = next((r for r in field_routes if r.name == "long_field"), field_routes[0])
+    return route, min(sum(r.max_tokens for r in field_routes), MAX_BATCH_TOKENS)
+
+def generate_category_responses(client, category: str, fields: List[Dict], enhanced_ngo_profile: Dict,
+                                grant_context: Dict, field_timeout: float, use_cache: bool = True) -> Dict[str, str]:
+    """
+    Ask for every field of one category in a single completion
+    """
+    prompt = create_category_prompt(category, fields, enhanced_ngo_profile, grant_context)
+    route, max_tokens = category_route(fields)
+    
+    content = cached_chat_completion(
+        client,
+        model=route.deployment,
+        messages=[
+            {"role": "system", "content": "You are an expert grant writer helping fill out grant applications. Respond with valid JSON only."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        temperature=0.7,
+        use_cache=use_cache,
+        validate=is_category_response,
+        route=route.name,
+        timeout=field_timeout
+    )
+    
+    return parse_category_response(content, [field["name"] for field in fields])
+
+def is_category_response(content: str) -> bool:
+    """
+    Cache validator: only well-formed batch responses are worth replaying
+    """
+    try:
+        parse_category_response(content, [])
+        return True
+    except ValueError:
+        return False
+
+def parse_category_response(content: str, field_names: List[str]) -> Dict[str, str]:
+    """
+    Parse a category batch response into {field_name: response}
+
+    Raises ValueError if no JSON object can be recovered. Code fences and
+    surrounding text are stripped and a truncated reply keeps its complete
+    fields; unknown keys and empty values are dropped so those fields are
+    retried individually.
+    """
+    parsed, _ = extract_json(content)
+    if not isinstance(parsed, dict):
+        raise ValueError("Batch response is not a JSON object")
+    
+    results = {}
+    for field_name in field_names:
+        value = parsed.get(field_name)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+        value = value.strip()
+        if value:
+            results[field_name] = value
+    return results
+
+def generate_single_field_response(client, field: Dict, category: str, enhanced_ngo_profile: Dict,
+                                   grant_context: Dict, field_timeout: float, use_cache: bool = True) -> str:
+    """
+    Generate the LLM response for a single form field
+    """
+    prompt = create_field_prompt(field["name"], field["type"], category, enhanced_ngo_profile, grant_context)
+    route = get_route(field_route_name(field))
+    
+    content = cached_chat_completion(
+        client,
+        model=route.deployment,
+        messages=[
+            {"role": "system", "content": "You are an expert grant writer helping fill out grant applications."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=route.max_tokens,
+        temperature=0.7,
+        use_cache=use_cache,
+        route=route.name,
+        timeout=field_timeout
+    )
+    
+    return content.strip()
+
+# Field-specific instructions appended to the shared NGO/grant context
+FIELD_INSTRUCTIONS = {
+    "organization_name": "Provide the exact legal name of the organization.",
+    
+    "project_title": "Create a compelling project title (8-12 words) that aligns with both the NGO's mission and the funder's focus area. Make it specific and action-oriented.",
+    
+    "mission_statement": "Write a concise mission statement (under 200 words) that clearly describes the organization's core purpose and demonstrates alignment with the grant focus area.",
+    
+    "project_description": "Write a detailed project description (300-500 words) that includes:\n1. The problem being addressed\n2. Your proposed solution\n3. Specific activities and methodology\n4. Timeline and milestones\n5. How it aligns with funder priorities",
+    
+    "requested_amount": "Determine an appropriate funding request amount considering:\n1. The maximum grant amount\n2. Project scope and needs\n3. Organizational capacity\nProvide only the dollar amount (no $ symbol).",
+    
+    "project_duration": "Specify an appropriate project duration (e.g., '12 months', '18 months') based on the project scope and typical grant periods.",
+    
+    "target_population": "Describe the target population this project will serve, including demographics, size, and why they need this intervention.",
+    
+    "expected_outcomes": "List 3-5 specific, measurable outcomes this project will achieve, including quantitative targets where possible."
+}
+
+def get_field_instruction(field_name: str, field_type: str) -> str:
+    """
+    Get the instruction for a single field
+    """
+    return FIELD_INSTRUCTIONS.get(field_name, f"Provide an appropriate response for the field '{field_name}' ({field_type}).")
+
+def build_prompt_context(enhanced_ngo_profile: Dict, grant_context: Dict) -> str:
+    """
+    Build the NGO profile and grant context shared by every field prompt
     """
     # Build comprehensive NGO context
     ngo_context = f"""
@@ -733,7 +1440,7 @@ def create_field_prompt(field_name: str, field_type: str, category: str, enhance
     if enhanced_ngo_profile.get('data_sources_used'):
         ngo_context += f"\n    - Data Sources: {', '.join(enhanced_ngo_profile.get('data_sources_used'))}"
     
-    base_context = f"""
+    return f"""
     {ngo_context}
     
     Grant Context:
@@ -742,27 +1449,31 @@ def create_field_prompt(field_name: str, field_type: str, category: str, enhance
     - Max Amount: ${grant_context.get('max_amount', 50000):,}
     - Requirements: {grant_context.get('requirements', 'N/A')}
     """
-    
-    # Field-specific prompts
-    field_prompts = {
-        "organization_name": f"{base_context}\nProvide the exact legal name of the organization.",
-        
-        "project_title": f"{base_context}\nCreate a compelling project title (8-12 words) that aligns with both the NGO's mission and the funder's focus area. Make it specific and action-oriented.",
-        
-        "mission_statement": f"{base_context}\nWrite a concise mission statement (under 200 words) that clearly describes the organization's core purpose and demonstrates alignment with the grant focus area.",
-        
-        "project_description": f"{base_context}\nWrite a detailed project description (300-500 words) that includes:\n1. The problem being addressed\n2. Your proposed solution\n3. Specific activities and methodology\n4. Timeline and milestones\n5. How it aligns with funder priorities",
-        
-        "requested_amount": f"{base_context}\nDetermine an appropriate funding request amount considering:\n1. The maximum grant amount\n2. Project scope and needs\n3. Organizational capacity\nProvide only the dollar amount (no $ symbol).",
-        
-        "project_duration": f"{base_context}\nSpecify an appropriate project duration (e.g., '12 months', '18 months') based on the project scope and typical grant periods.",
-        
-        "target_population": f"{base_context}\nDescribe the target population this project will serve, including demographics, size, and why they need this intervention.",
-        
-        "expected_outcomes": f"{base_context}\nList 3-5 specific, measurable outcomes this project will achieve, including quantitative targets where possible."
-    }
-    
-    return field_prompts.get(field_name, f"{base_context}\nProvide an appropriate response for the field '{field_name}' ({field_type}).")
+
+def create_field_prompt(field_name: str, field_type: str, category: str, enhanced_ngo_profile: Dict, grant_context: Dict) -> str:
+    """
+    Create contextual prompt for each field type using enhanced NGO profile
+    """
+    base_context = build_prompt_context(enhanced_ngo_profile, grant_context)
+    return f"{base_context}\n{get_field_instruction(field_name, field_type)}"
+
+def create_category_prompt(category: str, fields: List[Dict], enhanced_ngo_profile: Dict, grant_context: Dict) -> str:
+    """
+    Create one prompt asking for every field of a category as a JSON object
+
+    The shared NGO/grant context is included once instead of once per field.
+    """
+    base_context = build_prompt_context(enhanced_ngo_profile, grant_context)
+    field_lines = "\n\n".join(
+        f"\"{field['name']}\" ({field['type']}):\n{get_field_instruction(field['name'], field['type'])}"
+        for field in fields
+    )
+    return f"""{base_context}
+Fill in the following {category} fields of the grant application.
+
+{field_lines}
+
+Return only a JSON object whose keys are exactly the field names above and whose values are the response text for each field."""
 
 def generate_demo_responses(classified_fields: Dict, enhanced_ngo_profile: Dict) -> Dict[str, str]:
     """
@@ -814,21 +1525,13 @@ def create_filled_form_structure(responses: Dict[str, str]) -> Dict:
 
 def get_openai_client():
     """
-    Get OpenAI client if configured
+    Get the shared OpenAI client if configured
     """
     try:
-        endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
-        api_key = os.environ.get("AZURE_OPENAI_KEY")
-        
-        if not endpoint or not api_key:
-            logging.warning("Azure OpenAI not configured")
-            return None
-            
-        return AzureOpenAI(
-            azure_endpoint=endpoint,
-            api_key=api_key,
-            api_version="2024-02-01"
-        )
+        return shared_clients.get_openai_client()
+    except ValueError:
+        logging.warning("Azure OpenAI not configured")
+        return None
     except Exception as e:
         logging.error(f"Error creating OpenAI client: {str(e)}")
         return None
\ No newline at end of file
@@ -5,7 +5,7 @@ Supports both fillable PDF forms and generating new PDFs from responses
 
 import io
 import base64
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Union
 import PyPDF2
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4
@@ -16,6 +16,72 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
 import logging
 
+class ParsedPDF:
+    """
+    A PDF decoded and parsed once and shared by every processing stage
+
+    The bytes, PyPDF2 reader, form text fields and per-page text are computed
+    lazily on first use and cached. Accessors raise the underlying decode or
+    parse error, so each caller keeps its own fallback handling.
+    """
+    
+    def __init__(self, pdf_data: Union[str, bytes]):
+        self._pdf_data = pdf_data
+        self._pdf_bytes = pdf_data if isinstance(pdf_data, (bytes, bytearray)) else None
+        self._reader = None
+        self._form_text_fields = None
+        self._page_text: Dict[int, str] = {}
+    
+    @property
+    def pdf_bytes(self) -> bytes:
+        if self._pdf_bytes is None:
+            self._pdf_bytes = base64.b64decode(self._pdf_data)
+            # Drop our reference to the base64 string once decoded
+            self._pdf_data = None
+        return self._pdf_bytes
+    
+    @property
+    def reader(self) -> PyPDF2.PdfReader:
+        if self._reader is None:
+            self._reader = PyPDF2.PdfReader(io.BytesIO(self.pdf_bytes))
+        return self._reader
+    
+    @property
+    def page_count(self) -> int:
+        return len(self.reader.pages)
+    
+    @property
+    def is_encrypted(self) -> bool:
+        return self.reader.is_encrypted
+    
+    @property
+    def form_text_fields(self) -> Dict[str, Any]:
+        """Text form fields by name (empty if the PDF has none)"""
+        if self._form_text_fields is None:
+            fields = None
+            if hasattr(self.reader, 'get_form_text_fields'):
+                fields = self.reader.get_form_text_fields()
+            self._form_text_fields = fields or {}
+        return self._form_text_fields
+    
+    def page_text(self, page_num: int) -> str:
+        """Extracted text of one page (0-based)"""
+        if page_num not in self._page_text:
+            self._page_text[page_num] = self.reader.pages[page_num].extract_text() or ""
+        return self._page_text[page_num]
+    
+    @property
+    def full_text(self) -> str:
+        """Text of every page, one page per line block"""
+        return "".join(self.page_text(page_num) + "\n" for page_num in range(self.page_count))
+
+
+def as_parsed_pdf(pdf_data: Union[str, bytes, ParsedPDF]) -> ParsedPDF:
+    """
+    Wrap raw PDF data in a ParsedPDF, passing an existing one through unchanged
+    """
+    return pdf_data if isinstance(pdf_data, ParsedPDF) else ParsedPDF(pdf_data)
+
 class PDFFormFiller:
     """
     Handles PDF form filling and generation
@@ -24,13 +90,26 @@ class PDFFormFiller:
     def __init__(self):
         self.styles = getSampleStyleSheet()
         
-    def fill_pdf_form(self, pdf_data: str, field_responses: Dict[str, str]) -> Tuple[bool, Optional[str], str]:
+    def fill_pdf_form(self, pdf_data: Union[str, bytes, ParsedPDF], field_responses: Dict[str, str]) -> Tuple[bool, Optional[str], str]:
         """
         Fill a PDF form with responses
         
         Returns:
             (success: bool, filled_pdf_base64: Optional[str], method_used: str)
         """
+        success, filled_pdf_bytes, method = self.fill_pdf_form_bytes(pdf_data, field_responses)
+        if not success:
+            return success, None, method
+        return success, base64.b64encode(filled_pdf_bytes).decode('utf-8'), method
+    
+    def fill_pdf_form_bytes(self, pdf_data: Union[str, bytes, ParsedPDF],
+                            field_responses: Dict[str, str]) -> Tuple[bool, Optional[bytes], str]:
+        """
+        Fill a PDF form with responses, returning the raw PDF bytes
+        
+        Returns:
+            (success: bool, filled_pdf_bytes: Optional[bytes], method_used: str)
+        """
         try:
             # Try to fill actual form fields first
             filled_pdf = self._fill_form_fields(pdf_data, field_responses)
@@ -45,19 +124,19 @@ class PDFFormFiller:
             logging.error(f"Error filling PDF form: {str(e)}")
             return False, None, f"error: {str(e)}"
     
-    def _fill_form_fields(self, pdf_data: str, field_responses: Dict[str, str]) -> Optional[str]:
+    def _fill_form_fields(self, pdf_data: Union[str, bytes, ParsedPDF], field_responses: Dict[str, str]) -> Optional[bytes]:
         """
         Fill actual PDF form fields if they exist
         """
         try:
-            # Decode PDF
-            pdf_bytes = base64.b64decode(pdf_data)
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+            pdf = as_parsed_pdf(pdf_data)
             
             # Check if PDF has fillable fields
-            if not self._has_fillable_fields(pdf_reader):
+            if not self._has_fillable_fields(pdf):
                 return None
             
+            pdf_reader = pdf.reader
+            
             # Create writer
             pdf_writer = PyPDF2.PdfWriter()
             
@@ -73,25 +152,22 @@ class PDFFormFiller:
             # Create output buffer
             output_buffer = io.BytesIO()
             pdf_writer.write(output_buffer)
-            
-            # Encode to base64
-            output_buffer.seek(0)
-            filled_pdf_bytes = output_buffer.read()
-            return base64.b64encode(filled_pdf_bytes).decode('utf-8')
+            return output_buffer.getvalue()
             
         except Exception as e:
             logging.warning(f"Form field filling failed: {str(e)}")
             return None
     
-    def _has_fillable_fields(self, pdf_reader) -> bool:
+    def _has_fillable_fields(self, pdf: ParsedPDF) -> bool:
         """
         Check if PDF has fillable form fields
         """
         try:
+            pdf_reader = pdf.reader
+            
             # Try different methods to detect form fields
             if hasattr(pdf_reader, 'get_form_text_fields'):
-                fields = pdf_reader.get_form_text_fields()
-                return fields is not None and len(fields) > 0
+                return len(pdf.form_text_fields) > 0
             
             # Check for interactive forms in document
             if hasattr(pdf_reader, 'trailer') and pdf_reader.trailer:
@@ -117,7 +193,7 @@ class PDFFormFiller:
         except Exception as e:
             logging.warning(f"Failed to update page fields: {str(e)}")
     
-    def _generate_filled_pdf(self, field_responses: Dict[str, str]) -> str:
+    def _generate_filled_pdf(self, field_responses: Dict[str, str]) -> bytes:
         """
         Generate a new PDF with the filled responses
         """
@@ -140,11 +216,7 @@ class PDFFormFiller:
             
             # Build PDF
             doc.build(content)
-            
-            # Get PDF bytes and encode to base64
-            buffer.seek(0)
-            pdf_bytes = buffer.read()
-            return base64.b64encode(pdf_bytes).decode('utf-8')
+            return buffer.getvalue()
             
         except Exception as e:
             logging.error(f"Error generating PDF: {str(e)}")
@@ -285,36 +357,34 @@ class PDFFormAnalyzer:
     """
     
     @staticmethod
-    def analyze_pdf_structure(pdf_data: str) -> Dict[str, Any]:
+    def analyze_pdf_structure(pdf_data: Union[str, bytes, ParsedPDF]) -> Dict[str, Any]:
         """
         Analyze PDF structure and return information about form fields
         """
         try:
-            pdf_bytes = base64.b64decode(pdf_data)
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+            pdf = as_parsed_pdf(pdf_data)
             
             analysis = {
-                "total_pages": len(pdf_reader.pages),
+                "total_pages": pdf.page_count,
                 "has_form_fields": False,
                 "form_fields": [],
                 "extracted_text_snippets": [],
-                "is_encrypted": pdf_reader.is_encrypted
+                "is_encrypted": pdf.is_encrypted
             }
             
             # Check for form fields
             try:
-                if hasattr(pdf_reader, 'get_form_text_fields'):
-                    form_fields = pdf_reader.get_form_text_fields()
-                    if form_fields:
-                        analysis["has_form_fields"] = True
-                        analysis["form_fields"] = list(form_fields.keys())
+                form_fields = pdf.form_text_fields
+                if form_fields:
+                    analysis["has_form_fields"] = True
+                    analysis["form_fields"] = list(form_fields.keys())
             except Exception:
                 pass
             
             # Extract text snippets for field inference
             try:
-                for page_num, page in enumerate(pdf_reader.pages[:3]):  # First 3 pages only
-                    text = page.extract_text()
+                for page_num in range(min(pdf.page_count, 3)):  # First 3 pages only
+                    text = pdf.page_text(page_num)
                     if text:
                         # Get first 500 characters as snippet
                         snippet = text[:500] + "..." if len(text) > 500 else text
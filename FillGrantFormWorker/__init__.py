@@ -0,0 +1,14 @@
+import azure.functions as func
+import json
+import logging
+
+from FillGrantForm import run_form_job
+
+
+def main(msg: func.QueueMessage) -> None:
+    """
+    Fill one grant form queued by FillGrantForm in async mode
+    """
+    job = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(f"FillGrantFormWorker picked up form job {job.get('jobId')} (attempt {msg.dequeue_count})")
+    run_form_job(job)
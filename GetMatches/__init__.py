@@ -2,36 +2,368 @@ import azure.functions as func
 import json
 import logging
 import os
-from openai import AzureOpenAI
-from azure.cosmos import CosmosClient
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from statistics import median
+from shared_code.chunking import get_token_counter
+from shared_code.clients import get_openai_client, get_cosmos_client
+from shared_code.embeddings import try_embed_text, document_embedding_text, get_embedding_deployment
+from shared_code.settings import get_int_setting
+from shared_code.model_router import get_route
+from shared_code.grant_catalog import get_grant_catalog, build_grant_index
+from shared_code.grant_scoring import (
+    GrantFeatures, rank_grants, build_fast_match, grant_eligibility_digest, profile_query_text
+)
+from shared_code.structured_output import structured_completion
+from typing import Dict, List, Optional, Tuple
 
-def get_openai_client():
-    """Initialize Azure OpenAI client with SDK v2"""
-    endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
-    api_key = os.environ.get("AZURE_OPENAI_KEY")
+# Number of grants sent to the LLM for scoring, and the most a request may ask for
+DEFAULT_CANDIDATE_COUNT = 10
+DEFAULT_MAX_CANDIDATES = 100
+
+# Sharded scoring: grants and prompt tokens per LLM call, and calls in flight
+DEFAULT_SHARD_MAX_GRANTS = 8
+DEFAULT_SHARD_PROMPT_TOKENS = 3000
+DEFAULT_SCORING_CONCURRENCY = 4
+
+# Largest correction applied to a shard's scores from its anchor grant
+MAX_CALIBRATION_OFFSET = 20
+
+# "full" scores candidates with the LLM, "fast" returns the rule-based ranking only
+MATCH_MODES = ("full", "fast")
+
+SYSTEM_PROMPT = """You are a grant matching expert. Analyze user profiles/documents against grant opportunities and provide match scores.
+        
+For each grant, provide a match score (0-100) and explanation. Score every grant on its own against this scale, not relative to the other grants listed:
+- 90-100: eligible and closely aligned with the grant's focus
+- 70-89: eligible with clear alignment and minor gaps
+- 40-69: eligible with partial alignment or notable gaps
+- 0-39: weak alignment or likely ineligible
+
+Return a JSON object {"matches": [...]} where each element contains:
+- grantId: The grant identifier
+- matchScore: Integer from 0-100 (higher = better match)
+- reasoning: Detailed explanation of the match
+- strengths: Array of alignment strengths
+- gaps: Array of potential gaps or weaknesses  
+- recommendations: Array of specific recommendations
+- priority: high/medium/low based on match quality
+
+Sort results by matchScore in descending order."""
+
+# Entries without a grant id or a usable score are dropped and their grants re-scored
+MATCHES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "matches": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "grantId": {"type": "string"},
+                    "matchScore": {"type": "number", "minimum": 0, "maximum": 100},
+                    "reasoning": {"type": "string"},
+                    "strengths": {"type": "array"},
+                    "gaps": {"type": "array"},
+                    "recommendations": {"type": "array"},
+                    "priority": {"type": "string", "enum": ["high", "medium", "low"]}
+                },
+                "required": ["grantId", "matchScore"]
+            }
+        }
+    },
+    "required": ["matches"]
+}
+
+def select_candidate_grants(grants: List[Dict], query_embedding: Optional[List[float]],
+                            k: int, index=None) -> Tuple[List[Dict], Dict[str, float]]:
+    """
+    Pick the k grants nearest to the query embedding
+
+    Grants without a stored embedding (or with a different dimension) are kept
+    in their original order after the retrieved ones, so older records remain
+    reachable. Without a query embedding the first k grants are used as before.
+    A prebuilt index over the same grants (e.g. the catalog's) can be passed in.
+    Returns the candidates and their similarity scores by grant id.
+    """
+    if not query_embedding:
+        return grants[:k], {}
+    
+    if index is None:
+        index = build_grant_index(grants, len(query_embedding))
+    if not len(index) or index.dimension != len(query_embedding):
+        return grants[:k], {}
+    
+    by_id = {g['id']: g for g in grants}
+    # The index may cover grants filtered out of this request; search deep enough to still find k
+    search_k = k + sum(1 for grant_id in index.ids if grant_id not in by_id)
+    hits = [(grant_id, score) for grant_id, score in index.search(query_embedding, search_k) if grant_id in by_id][:k]
+    candidates = [by_id[grant_id] for grant_id, _ in hits]
+    scores = {grant_id: round(score, 4) for grant_id, score in hits}
+    
+    if len(candidates) < k:
+        indexed_ids = set(index.ids)
+        candidates.extend([g for g in grants if g['id'] not in indexed_ids][:k - len(candidates)])
+    
+    return candidates, scores
+
+def document_query_embedding(openai_client, documents_container, user_document: Dict) -> Optional[List[float]]:
+    """
+    Embedding of a user document, as stored by ProcessDocument
+
+    Documents processed before embeddings were stored (or with another
+    embedding model) are embedded once here and the record is updated, so
+    later match requests reuse it.
+    """
+    embedding = user_document.get('embedding')
+    if embedding and user_document.get('embeddingModel', get_embedding_deployment()) == get_embedding_deployment():
+        return embedding
+    if openai_client is None:
+        return None
+    
+    embedding = try_embed_text(openai_client, document_embedding_text(user_document))
+    if embedding:
+        try:
+            documents_container.upsert_item({**user_document, "embedding": embedding,
+                                             "embeddingModel": get_embedding_deployment()})
+        except Exception as e:
+            logging.warning(f"Could not store embedding for document {user_document.get('id')}: {str(e)}")
+    return embedding
+
+def grant_prompt_text(grant: Dict) -> str:
+    """
+    Description of one grant in the scoring prompt
+    """
+    return f"""Grant ID: {grant['id']}
+Description: {grant.get('originalDescription', 'No description')}
+Funding Amount: {grant.get('fundingAmount', 'Not specified')}
+Deadline: {grant.get('deadline', 'Not specified')}
+Organization Type: {grant.get('organizationType', 'Not specified')}
+Requirements: {grant_eligibility_digest(grant) or 'Not specified'}"""
+
+def shard_candidates(candidates: List[Dict], max_grants: int, prompt_tokens: int,
+                     count_tokens=None) -> List[List[Dict]]:
+    """
+    Split candidates, in order, into shards of at most max_grants grants and
+    (unless a single grant is larger) prompt_tokens tokens of grant text
+    """
+    count_tokens = count_tokens or get_token_counter(None)
+    shards: List[List[Dict]] = []
+    current: List[Dict] = []
+    current_tokens = 0
+    for grant in candidates:
+        tokens = count_tokens(grant_prompt_text(grant))
+        if current and (len(current) >= max_grants or current_tokens + tokens > prompt_tokens):
+            shards.append(current)
+            current, current_tokens = [], 0
+        current.append(grant)
+        current_tokens += tokens
+    if current:
+        shards.append(current)
+    return shards
+
+def score_shards(openai_client, user_profile: str, shards: List[List[Dict]], use_cache: bool,
+                 max_concurrency: int) -> List[List[Dict]]:
+    """
+    Score shards concurrently; returns each shard's matches in shard order (empty if it failed)
+    """
+    results: List[List[Dict]] = [[] for _ in shards]
+    workers = max(1, min(max_concurrency, len(shards)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score-shard") as executor:
+        futures = {
+            executor.submit(score_candidates, openai_client, user_profile, shard, use_cache): i
+            for i, shard in enumerate(shards)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                logging.warning(f"LLM scoring of shard {i + 1}/{len(shards)} failed: {str(e)}")
+    return results
+
+def calibrate_shards(shard_matches: List[List[Dict]], anchor_id: Optional[str],
+                     target: Optional[float] = None) -> Tuple[Dict[str, Dict], Optional[float]]:
+    """
+    Merge per-shard matches, shifting each shard so its anchor grant scores the same
+
+    The anchor grant is scored in every shard. Its median score (or the given
+    target) is the reference; each shard's scores move by the difference
+    between that and its own anchor score, capped at MAX_CALIBRATION_OFFSET.
+    Returns matches by grant id and the reference score.
+    """
+    if anchor_id is None:
+        return {m['grantId']: m for matches in shard_matches for m in matches}, target
+    
+    anchor_matches = [m for matches in shard_matches for m in matches if m['grantId'] == anchor_id]
+    if target is None and anchor_matches:
+        target = float(median(m['matchScore'] for m in anchor_matches))
+    
+    merged: Dict[str, Dict] = {}
+    for matches in shard_matches:
+        shard_anchor = next((m['matchScore'] for m in matches if m['grantId'] == anchor_id), None)
+        offset = 0.0
+        if target is not None and shard_anchor is not None:
+            offset = max(-MAX_CALIBRATION_OFFSET, min(MAX_CALIBRATION_OFFSET, target - shard_anchor))
+        for match in matches:
+            if match['grantId'] != anchor_id:
+                score = int(round(max(0, min(100, match['matchScore'] + offset))))
+                merged[match['grantId']] = {**match, "matchScore": score}
+    
+    if anchor_matches and target is not None:
+        closest = min(anchor_matches, key=lambda m: abs(m['matchScore'] - target))
+        merged[anchor_id] = {**closest, "matchScore": int(round(target))}
+    return merged, target
+
+def score_candidates_sharded(openai_client, user_profile: str, candidates: List[Dict],
+                             use_cache: bool = True) -> Tuple[Dict[str, Dict], int]:
+    """
+    Score any number of candidates in token-budgeted shards, concurrently
+
+    With more than one shard, the first (best-ranked) candidate is added to
+    every shard as an anchor and scores are calibrated against it, so they
+    stay comparable across shards. Grants a shard's reply dropped are scored
+    once more in new shards. Returns matches by grant id and the number of
+    LLM scoring calls made.
+    """
+    max_grants = max(2, get_int_setting("MATCH_SHARD_MAX_GRANTS", DEFAULT_SHARD_MAX_GRANTS))
+    prompt_tokens = get_int_setting("MATCH_SHARD_PROMPT_TOKENS", DEFAULT_SHARD_PROMPT_TOKENS)
+    max_concurrency = get_int_setting("MATCH_SCORING_CONCURRENCY", DEFAULT_SCORING_CONCURRENCY)
+    count_tokens = get_token_counter(get_route("match_scoring").deployment)
+    
+    anchor = None
+    if len(shard_candidates(candidates, max_grants, prompt_tokens, count_tokens)) > 1:
+        anchor = candidates[0]
+    
+    matches: Dict[str, Dict] = {}
+    target = None
+    calls = 0
+    pending = list(candidates)
+    for _ in range(2):
+        if not pending:
+            break
+        # Anchor only while there is a reference score to calibrate against
+        use_anchor = anchor is not None and (not calls or target is not None)
+        members = [g for g in pending if not use_anchor or g['id'] != anchor['id']]
+        if use_anchor:
+            shards = [[anchor] + shard for shard in
+                      shard_candidates(members, max_grants - 1, prompt_tokens, count_tokens)]
+        else:
+            shards = shard_candidates(members, max_grants, prompt_tokens, count_tokens)
+        calls += len(shards)
+        
+        shard_matches = score_shards(openai_client, user_profile, shards, use_cache, max_concurrency)
+        round_matches, target = calibrate_shards(shard_matches, anchor['id'] if use_anchor else None, target)
+        for grant_id, match in round_matches.items():
+            matches.setdefault(grant_id, match)
+        pending = [g for g in candidates if g['id'] not in matches]
+    return matches, calls
+
+def score_candidates(openai_client, user_profile: str, candidates: List[Dict],
+                     use_cache: bool = True) -> List[Dict]:
+    """
+    Score candidate grants with the LLM; returns one validated match per scored grant
+
+    Matches for grants that were not asked about are ignored. Raises
+    StructuredOutputError if the reply holds no usable matches at all.
+    """
+    grants_description = "\n\n---\n\n".join(grant_prompt_text(grant) for grant in candidates)
     
-    if not endpoint or not api_key:
-        raise ValueError("Azure OpenAI configuration missing")
+    user_prompt = f"""User Profile:
+{user_profile}
+
+Grant Opportunities:
+{grants_description}"""
     
-    return AzureOpenAI(
-        azure_endpoint=endpoint,
-        api_key=api_key,
-        api_version="2024-02-01"
+    # Same profile against the same grants hits the completion cache
+    route = get_route("match_scoring")
+    result = structured_completion(
+        openai_client,
+        model=route.deployment,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        schema=MATCHES_SCHEMA,
+        temperature=0.0,
+        max_tokens=route.max_tokens,
+        use_cache=use_cache,
+        route=route.name
     )
+    
+    candidate_ids = {grant['id'] for grant in candidates}
+    matches = {}
+    for match in result["matches"]:
+        if match["grantId"] in candidate_ids and match["grantId"] not in matches:
+            matches[match["grantId"]] = {**match, "matchScore": int(round(match["matchScore"]))}
+    return list(matches.values())
+
+def build_rule_based_matches(features: GrantFeatures, candidates: List[Dict], relevance_scores: Dict[str, float],
+                             retrieval_scores: Dict[str, float], lexical_query: str,
+                             organization_type: Optional[str], budget: Optional[float]) -> List[Dict]:
+    """
+    Rule-based matches for candidate grants, best first
+    """
+    positions = {grant['id']: i for i, grant in enumerate(features.grants)}
+    matches = [
+        build_fast_match(features, positions[grant['id']], relevance_scores[grant['id']], lexical_query,
+                         organization_type, budget, retrieval_scores.get(grant['id']))
+        for grant in candidates
+    ]
+    matches.sort(key=lambda m: m['matchScore'], reverse=True)
+    return matches
 
-def get_cosmos_client():
-    """Initialize Cosmos DB client"""
-    endpoint = os.environ.get("COSMOS_ENDPOINT")
-    key = os.environ.get("COSMOS_KEY")
+def build_matches_response(matches: List[Dict], grants_by_id: Dict[str, Dict], grants: List[Dict],
+                           eligible_grants: List[Dict], candidates: List[Dict], retrieval_scores: Dict[str, float],
+                           relevance_scores: Dict[str, float], user_document: Optional[Dict],
+                           mode: str) -> func.HttpResponse:
+    """
+    Enrich matches with grant details and build the HTTP response
+    """
+    enriched_matches = []
+    for match in matches:
+        grant = grants_by_id.get(match.get('grantId'))
+        if grant:
+            enriched_match = {
+                **match,
+                "retrievalScore": retrieval_scores.get(grant['id']),
+                "relevanceScore": relevance_scores.get(grant['id']),
+                "grantDetails": {
+                    "description": grant.get('originalDescription', ''),
+                    "fundingAmount": grant.get('fundingAmount', ''),
+                    "deadline": grant.get('deadline', ''),
+                    "organizationType": grant.get('organizationType', ''),
+                    "analyzedAt": grant.get('analyzedAt', '')
+                }
+            }
+            enriched_matches.append(enriched_match)
     
-    if not endpoint or not key:
-        raise ValueError("Cosmos DB configuration missing")
+    logging.info(f"Found {len(enriched_matches)} grant matches")
     
-    return CosmosClient(endpoint, key)
+    return func.HttpResponse(
+        json.dumps({
+            "success": True,
+            "mode": mode,
+            "matches": enriched_matches,
+            "totalGrants": len(grants),
+            "eligibleGrants": len(eligible_grants),
+            "candidatesScored": len(candidates),
+            "userDocument": {
+                "id": user_document['id'],
+                "fileName": user_document['fileName'],
+                "analysis": user_document['analysis']
+            } if user_document else None
+        }),
+        status_code=200,
+        mimetype="application/json"
+    )
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
     Find matching grants for user documents/profiles
+
+    Grants are pre-filtered by deterministic eligibility rules and ranked by
+    lexical relevance before any LLM call. With mode=fast the rule-based
+    ranking is returned directly and the LLM is not called at all.
     """
     logging.info('GetMatches function triggered')
     
@@ -40,6 +372,18 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         document_id = req.params.get('documentId')
         organization_type = req.params.get('organizationType')
         research_area = req.params.get('researchArea')
+        mode = req.params.get('mode', 'full')
+        try:
+            top_k = int(req.params.get('topK') or get_int_setting("MATCH_CANDIDATE_COUNT", DEFAULT_CANDIDATE_COUNT))
+            top_k = min(top_k, get_int_setting("MATCH_MAX_CANDIDATES", DEFAULT_MAX_CANDIDATES))
+            budget = float(req.params['budget']) if req.params.get('budget') else None
+        except ValueError:
+            return func.HttpResponse(
+                json.dumps({"error": "topK and budget must be numbers"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        use_cache = req.params.get('useCache', 'true').lower() != 'false'
         
         if not document_id and not organization_type:
             return func.HttpResponse(
@@ -48,14 +392,22 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
-        # Initialize Azure services
-        openai_client = get_openai_client()
+        if mode not in MATCH_MODES:
+            return func.HttpResponse(
+                json.dumps({"error": f"mode must be one of: {', '.join(MATCH_MODES)}"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        # Initialize Azure services (fast mode never calls OpenAI)
+        openai_client = get_openai_client() if mode == 'full' else None
         cosmos_client = get_cosmos_client()
         
         database_name = os.environ.get("COSMOS_DATABASE_NAME", "GrantAnalysis")
         database = cosmos_client.get_database_client(database_name)
         
         user_document = None
+        documents_container = None
         
         # Fetch user document if provided
         if document_id:
@@ -70,15 +422,18 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                     mimetype="application/json"
                 )
         
-        # Fetch active grants
+        # Fetch active grants from the warm catalog (incremental refresh, not a full scan)
         grants_container = database.get_container_client("GrantOpportunities")
+        catalog = get_grant_catalog()
         
         try:
-            grants_query = "SELECT * FROM c WHERE c.status = 'active'"
-            grants = list(grants_container.query_items(query=grants_query, enable_cross_partition_query=True))
+            catalog.refresh(grants_container)
         except Exception as e:
-            logging.error(f"Error querying grants: {str(e)}")
-            grants = []
+            logging.error(f"Error refreshing grant catalog: {str(e)}")
+        
+        # Parsed deadlines/amounts/types are cached per catalog version
+        features = catalog.derived("match_features", GrantFeatures)
+        grants = features.grants
         
         if not grants:
             return func.HttpResponse(
@@ -96,106 +451,63 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             user_profile = f"""Document Analysis: {json.dumps(user_document.get('analysis', {}))}
 Document Type: {user_document.get('fileType', 'unknown')}
 Document Summary: {user_document.get('analysis', {}).get('summary', 'No summary available')}"""
+            analysis = user_document.get('analysis', {})
+            lexical_query = profile_query_text([
+                research_area, analysis.get('summary'), analysis.get('keyEntities'), analysis.get('grantRequirements')
+            ])
         else:
             user_profile = f"""Organization Type: {organization_type}
 Research Area: {research_area or 'Not specified'}"""
+            lexical_query = profile_query_text([research_area, organization_type])
         
-        # Prepare grants description for OpenAI
-        grants_description = "\n\n---\n\n".join([
-            f"""Grant ID: {grant['id']}
-Description: {grant.get('originalDescription', 'No description')}
-Funding Amount: {grant.get('fundingAmount', 'Not specified')}
-Deadline: {grant.get('deadline', 'Not specified')}
-Organization Type: {grant.get('organizationType', 'Not specified')}
-Requirements: {json.dumps(grant.get('analysis', {}).get('eligibilityRequirements', []))}"""
-            for grant in grants[:10]  # Limit to 10 grants to avoid token limits
-        ])
-        
-        # Call Azure OpenAI for matching
-        deployment_name = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-35-turbo")
-        
-        system_prompt = """You are a grant matching expert. Analyze user profiles/documents against grant opportunities and provide match scores.
-        
-For each grant, provide a match score (0-100) and explanation. Return a JSON array where each element contains:
-- grantId: The grant identifier
-- matchScore: Integer from 0-100 (higher = better match)
-- reasoning: Detailed explanation of the match
-- strengths: Array of alignment strengths
-- gaps: Array of potential gaps or weaknesses  
-- recommendations: Array of specific recommendations
-- priority: high/medium/low based on match quality
-
-Sort results by matchScore in descending order."""
-        
-        user_prompt = f"""User Profile:
-{user_profile}
-
-Grant Opportunities:
-{grants_description}"""
+        # Drop ineligible grants and rank the rest lexically before any model call
+        ranked = rank_grants(features, lexical_query, organization_type, budget)
+        if not ranked:
+            return func.HttpResponse(
+                json.dumps({
+                    "success": True,
+                    "matches": [],
+                    "totalGrants": len(grants),
+                    "eligibleGrants": 0,
+                    "message": "No eligible grants found"
+                }),
+                status_code=200,
+                mimetype="application/json"
+            )
+        eligible_grants = [grants[i] for i, _ in ranked]
+        relevance_scores = {grants[i]['id']: relevance for i, relevance in ranked}
         
-        # Call Azure OpenAI
-        response = openai_client.chat.completions.create(
-            model=deployment_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            max_tokens=2000
-        )
+        # Retrieve the grants nearest to the user profile so only the best candidates reach the LLM
+        if user_document:
+            query_embedding = document_query_embedding(openai_client, documents_container, user_document)
+        elif mode == 'fast':
+            query_embedding = None
+        else:
+            query_embedding = try_embed_text(openai_client, user_profile)
+        grant_index = catalog.vector_index(len(query_embedding)) if query_embedding else None
+        candidates, retrieval_scores = select_candidate_grants(eligible_grants, query_embedding, max(1, top_k), grant_index)
+        grants_by_id = {grant['id']: grant for grant in grants}
         
-        matching_results = response.choices[0].message.content
+        if mode == 'fast':
+            fast_matches = build_rule_based_matches(features, candidates, relevance_scores, retrieval_scores,
+                                                    lexical_query, organization_type, budget)
+            return build_matches_response(fast_matches, grants_by_id, grants, eligible_grants, candidates,
+                                          retrieval_scores, relevance_scores, user_document, mode)
         
-        # Parse matching results
-        try:
-            parsed_matches = json.loads(matching_results)
-        except json.JSONDecodeError:
-            # Fallback to basic scoring if JSON parsing fails
-            parsed_matches = []
-            for i, grant in enumerate(grants[:5]):
-                parsed_matches.append({
-                    "grantId": grant['id'],
-                    "matchScore": max(20, 80 - i * 15),  # Decreasing scores
-                    "reasoning": "Basic compatibility analysis",
-                    "strengths": ["Organization type alignment"],
-                    "gaps": ["Detailed analysis needed"],
-                    "recommendations": ["Review grant requirements thoroughly"],
-                    "priority": "medium"
-                })
-        
-        # Enrich matches with grant details
-        enriched_matches = []
-        for match in parsed_matches:
-            grant = next((g for g in grants if g['id'] == match['grantId']), None)
-            if grant:
-                enriched_match = {
-                    **match,
-                    "grantDetails": {
-                        "description": grant.get('originalDescription', ''),
-                        "fundingAmount": grant.get('fundingAmount', ''),
-                        "deadline": grant.get('deadline', ''),
-                        "organizationType": grant.get('organizationType', ''),
-                        "analyzedAt": grant.get('analyzedAt', '')
-                    }
-                }
-                enriched_matches.append(enriched_match)
+        # Score with the LLM in concurrent shards; grants a reply drops are asked about again once
+        scored, calls = score_candidates_sharded(openai_client, user_profile, candidates, use_cache)
+        logging.info(f"Scored {len(scored)}/{len(candidates)} candidate grants in {calls} LLM call(s)")
+        parsed_matches = sorted(scored.values(), key=lambda m: m['matchScore'], reverse=True)
+        remaining = [grant for grant in candidates if grant['id'] not in scored]
         
-        logging.info(f"Found {len(enriched_matches)} grant matches")
+        # Grants the LLM never scored keep their rule-based match rather than an invented score
+        if remaining:
+            logging.warning(f"{len(remaining)} candidate grant(s) not scored by the LLM, using rule-based matches")
+            parsed_matches += build_rule_based_matches(features, remaining, relevance_scores, retrieval_scores,
+                                                       lexical_query, organization_type, budget)
         
-        return func.HttpResponse(
-            json.dumps({
-                "success": True,
-                "matches": enriched_matches,
-                "totalGrants": len(grants),
-                "userDocument": {
-                    "id": user_document['id'],
-                    "fileName": user_document['fileName'],
-                    "analysis": user_document['analysis']
-                } if user_document else None
-            }),
-            status_code=200,
-            mimetype="application/json"
-        )
+        return build_matches_response(parsed_matches, grants_by_id, grants, eligible_grants, candidates,
+                                      retrieval_scores, relevance_scores, user_document, mode)
         
     except Exception as e:
         logging.error(f"Error getting matches: {str(e)}")
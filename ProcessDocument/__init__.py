@@ -2,44 +2,438 @@ import azure.functions as func
 import json
 import logging
 import os
-from openai import AzureOpenAI
-from azure.storage.blob import BlobServiceClient
-from azure.cosmos import CosmosClient
+from azure.core.exceptions import ResourceExistsError
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
 from azure.identity import DefaultAzureCredential
+from shared_code.chunking import chunk_text, get_token_counter
+from shared_code.clients import get_blob_container_client, get_openai_client, get_cosmos_client
+from shared_code.embeddings import try_embed_text, document_embedding_text, get_embedding_deployment
+from shared_code.job_queue import get_job_queue
+from shared_code.model_router import get_route
+from shared_code.settings import get_int_setting
+from shared_code.structured_output import structured_completion
 import hashlib
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 
-# Azure OpenAI configuration using SDK v2
-def get_openai_client():
-    """Initialize Azure OpenAI client with SDK v2"""
-    endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
-    api_key = os.environ.get("AZURE_OPENAI_KEY")
-    
-    if not endpoint or not api_key:
-        raise ValueError("Azure OpenAI configuration missing")
+# Token budget per analysis call and overlap between consecutive chunks
+DEFAULT_CHUNK_TOKENS = 3000
+DEFAULT_CHUNK_OVERLAP_TOKENS = 200
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Async mode: queue watched by ProcessDocumentWorker, and how long a queued or
+# running job may go without finishing before a new upload re-queues it
+DOCUMENT_JOBS_QUEUE = "document-jobs"
+DEFAULT_JOB_STALE_SECONDS = 3600
+DOCUMENTS_BLOB_CONTAINER = "documents"
+
+SYSTEM_PROMPT = """You are a document analyzer specializing in grant-related content. 
+        Analyze the following document and extract key information. Return a JSON response with:
+        - summary: Brief document summary
+        - documentType: Type (grant application, grant opportunity, research paper, etc.)
+        - keyEntities: Important organizations, amounts, dates mentioned
+        - isGrantRelated: boolean indicating if grant-related
+        - confidence: confidence score (0-1)
+        - grantRequirements: If grant opportunity, list key requirements
+        - fundingAmount: Any funding amounts mentioned
+        - deadlines: Important dates/deadlines found"""
+
+# Fields merged across chunks by union rather than by vote or average
+UNION_FIELDS = ("keyEntities", "grantRequirements", "fundingAmount", "deadlines")
+
+
+# A chunk analysis without a usable summary is re-asked for it and otherwise
+# counted as a failed chunk; the other fields fall back to these defaults
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "documentType": {"type": "string", "default": "unknown"},
+        "keyEntities": {"default": []},
+        "isGrantRelated": {"type": "boolean", "default": False},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        "grantRequirements": {"type": "array", "default": []},
+        "fundingAmount": {"default": None},
+        "deadlines": {"type": "array", "default": []}
+    },
+    "required": ["summary"]
+}
+
+
+def analyze_chunk(client, deployment_name: str, file_name: str, chunk: str, part: int,
+                  part_count: int, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Analyze one chunk of a document (the whole document if part_count is 1)
+    """
+    if part_count == 1:
+        user_prompt = f"Document filename: {file_name}\nDocument content: {chunk}"
+    else:
+        user_prompt = f"Document filename: {file_name} (part {part} of {part_count})\nDocument content: {chunk}"
     
-    return AzureOpenAI(
-        azure_endpoint=endpoint,
-        api_key=api_key,
-        api_version="2024-02-01"  # Latest API version
+    # Re-uploaded documents hit the completion cache chunk by chunk
+    route = get_route("document_analysis")
+    return structured_completion(
+        client,
+        model=deployment_name,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        schema=ANALYSIS_SCHEMA,
+        temperature=0.3,
+        max_tokens=route.max_tokens,
+        use_cache=use_cache,
+        route=route.name
     )
 
-def get_storage_client():
-    """Initialize Azure Storage client"""
-    connection_string = os.environ.get("AzureWebJobsStorage")
-    if not connection_string:
-        raise ValueError("Storage connection string missing")
-    return BlobServiceClient.from_connection_string(connection_string)
 
-def get_cosmos_client():
-    """Initialize Cosmos DB client"""
-    endpoint = os.environ.get("COSMOS_ENDPOINT")
-    key = os.environ.get("COSMOS_KEY")
+def _value_key(value) -> str:
+    return json.dumps(value, sort_keys=True, default=str).lower()
+
+
+def merge_values(values: List[Any]) -> Any:
+    """
+    Union of per-chunk values: lists are concatenated without duplicates,
+    dicts merged key by key, and differing scalars collected into a list
+    """
+    values = [v for v in values if v not in (None, "", [], {})]
+    if not values:
+        return None
+    if all(isinstance(v, dict) for v in values):
+        keys = list(dict.fromkeys(k for v in values for k in v))
+        return {k: merge_values([v.get(k) for v in values]) for k in keys}
+    
+    merged = {}
+    for value in values:
+        for item in value if isinstance(value, list) else [value]:
+            merged.setdefault(_value_key(item), item)
+    items = list(merged.values())
+    if len(items) == 1 and not any(isinstance(v, list) for v in values):
+        return items[0]
+    return items
+
+
+def merge_analyses(analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reduce per-chunk analyses (in document order) into one document analysis
+    """
+    if len(analyses) == 1:
+        return analyses[0]
+    
+    merged: Dict[str, Any] = {}
+    for analysis in analyses:
+        for key, value in analysis.items():
+            merged.setdefault(key, value)
+    
+    summaries = [str(a.get("summary")).strip() for a in analyses if a.get("summary")]
+    merged["summary"] = "\n\n".join(dict.fromkeys(summaries))
+    
+    types = Counter(a.get("documentType") for a in analyses if a.get("documentType") not in (None, "", "unknown"))
+    merged["documentType"] = types.most_common(1)[0][0] if types else "unknown"
+    
+    merged["isGrantRelated"] = any(a.get("isGrantRelated") is True for a in analyses)
+    
+    confidences = [a["confidence"] for a in analyses if isinstance(a.get("confidence"), (int, float))]
+    merged["confidence"] = round(sum(confidences) / len(confidences), 3) if confidences else 0.5
+    
+    for field in UNION_FIELDS:
+        value = merge_values([a.get(field) for a in analyses])
+        merged[field] = value if value is not None or field == "fundingAmount" else []
+    return merged
+
+
+def analyze_document(client, deployment_name: str, file_name: str, document_content: str,
+                     use_cache: bool = True, chunk_tokens: Optional[int] = None,
+                     overlap_tokens: Optional[int] = None, max_concurrency: Optional[int] = None,
+                     prerequisite: Optional[Future] = None) -> Dict[str, Any]:
+    """
+    Map-reduce analysis of a whole document
+
+    The text is split into token-budgeted, overlapping chunks that are
+    analyzed concurrently by a bounded worker pool, then merged. Returns
+    {"analysis", "chunkCount", "failedChunks"}; raises if every chunk failed.
+
+    If the prerequisite future (e.g. the blob upload) fails, chunks that have
+    not started yet are cancelled and its error is raised, so a request that
+    will fail anyway stops paying for completions. Finished chunks are in the
+    completion cache, so a retry does not pay for them again.
+    """
+    if chunk_tokens is None:
+        chunk_tokens = get_int_setting("PROCESS_DOCUMENT_CHUNK_TOKENS", DEFAULT_CHUNK_TOKENS)
+    if overlap_tokens is None:
+        overlap_tokens = get_int_setting("PROCESS_DOCUMENT_CHUNK_OVERLAP_TOKENS", DEFAULT_CHUNK_OVERLAP_TOKENS)
+    if max_concurrency is None:
+        max_concurrency = get_int_setting("PROCESS_DOCUMENT_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+    
+    chunks = chunk_text(document_content, max(1, chunk_tokens), overlap_tokens,
+                        get_token_counter(deployment_name)) or [document_content]
+    logging.info(f"Analyzing {file_name} in {len(chunks)} chunk(s)")
+    
+    results: Dict[int, Dict[str, Any]] = {}
+    failed: List[int] = []
+    last_error: Optional[Exception] = None
+    workers = max(1, min(max_concurrency, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze-chunk") as executor:
+        futures = {
+            executor.submit(analyze_chunk, client, deployment_name, file_name, chunk,
+                            i + 1, len(chunks), use_cache): i
+            for i, chunk in enumerate(chunks)
+        }
+        def cancel_pending(done: Future):
+            if done.exception() is not None:
+                for future in futures:
+                    future.cancel()
+        
+        if prerequisite is not None:
+            prerequisite.add_done_callback(cancel_pending)
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                logging.warning(f"Analysis of chunk {i + 1}/{len(chunks)} of {file_name} failed: {str(e)}")
+                failed.append(i + 1)
+                last_error = e
+    
+    if prerequisite is not None and prerequisite.done() and prerequisite.exception() is not None:
+        raise prerequisite.exception()
+    if not results:
+        raise last_error
+    
+    return {
+        "analysis": merge_analyses([results[i] for i in sorted(results)]),
+        "chunkCount": len(chunks),
+        "failedChunks": sorted(failed)
+    }
+
+def compute_content_hash(document_content: str) -> str:
+    """SHA-256 of the document text, used as its document id and blob name"""
+    return hashlib.sha256(document_content.encode("utf-8")).hexdigest()
+
+
+def content_blob_name(content_hash: str) -> str:
+    return f"sha256/{content_hash}"
+
+
+def upload_document(container_name: str, blob_name: str, document_content: str) -> str:
+    """
+    Upload the raw document to blob storage and return its URL
+
+    Blob names are content-addressed, so an existing blob already holds
+    these exact bytes and is left as it is.
+    """
+    blob_client = get_blob_container_client(container_name).get_blob_client(blob_name)
+    try:
+        blob_client.upload_blob(document_content, overwrite=False)
+    except ResourceExistsError:
+        logging.info(f"Blob {blob_name} already stored")
+    return blob_client.url
+
+
+def get_documents_container():
+    """Cosmos container holding document records (partitioned on /id)"""
+    database_name = os.environ.get("COSMOS_DATABASE_NAME", "GrantAnalysis")
+    database = get_cosmos_client().get_database_client(database_name)
+    return database.get_container_client("Documents")
+
+
+def read_document_record(container, document_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Stored record for a document id in any state, or None
+
+    Lookup errors other than not-found are logged and treated as not found,
+    which at worst costs another analysis.
+    """
+    try:
+        return container.read_item(item=document_id, partition_key=document_id)
+    except CosmosResourceNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Document lookup failed for {document_id}: {str(e)}")
+        return None
+
+
+def is_completed(record: Dict[str, Any]) -> bool:
+    """Whether a record holds a complete analysis (records without status predate async mode)"""
+    # A record with failed chunks is re-analyzed rather than served
+    return record.get("status", "completed") == "completed" and not record.get("failedChunks")
+
+
+def is_pending(record: Dict[str, Any]) -> bool:
+    """Whether a record is a queued or running job that has not gone stale"""
+    if record.get("status") not in ("queued", "processing"):
+        return False
+    try:
+        updated_at = datetime.fromisoformat(record.get("updatedAt", ""))
+    except ValueError:
+        return False
+    stale_seconds = get_int_setting("PROCESS_DOCUMENT_JOB_STALE_SECONDS", DEFAULT_JOB_STALE_SECONDS)
+    return (datetime.now() - updated_at).total_seconds() < stale_seconds
+
+
+def link_file_name(container, record: Dict[str, Any], file_name: str):
+    """
+    Record another file name under which the same content was uploaded
+    """
+    file_names = record.get("fileNames") or [record.get("fileName")]
+    if file_name in file_names:
+        return
+    record["fileNames"] = file_names + [file_name]
+    try:
+        container.upsert_item(record)
+    except Exception as e:
+        logging.warning(f"Could not link {file_name} to document {record.get('id')}: {str(e)}")
+
+
+def build_document_record(content_hash: str, file_name: str, file_type: str, blob_url: str,
+                          document_content: str, document_analysis: Dict[str, Any],
+                          previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Completed document record, keeping file names linked to an earlier record
+    """
+    file_names = list((previous or {}).get("fileNames") or [])
+    if file_name not in file_names:
+        file_names.append(file_name)
+    now = datetime.now().isoformat()
+    return {
+        "id": content_hash,
+        "contentHash": content_hash,
+        "status": "completed",
+        "fileName": file_name,
+        "fileNames": file_names,
+        "fileType": file_type,
+        "blobUrl": blob_url,
+        "analysis": document_analysis["analysis"],
+        "uploadedAt": (previous or {}).get("uploadedAt", now),
+        "updatedAt": now,
+        "wordCount": len(document_content.split()),
+        "chunkCount": document_analysis["chunkCount"],
+        "failedChunks": document_analysis["failedChunks"]
+    }
+
+
+def add_document_embedding(openai_client, record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store the embedding GetMatches uses as this document's match query
+
+    Computed once per content hash here rather than on every match request;
+    a failed embedding call leaves the record without one.
+    """
+    embedding = try_embed_text(openai_client, document_embedding_text(record))
+    if embedding:
+        record["embedding"] = embedding
+        record["embeddingModel"] = get_embedding_deployment()
+    return record
+
+
+def run_document_job(job: Dict[str, Any]):
+    """
+    Analyze a queued document (called by ProcessDocumentWorker or the in-process queue)
+
+    The record is marked processing, then completed with the analysis, or
+    failed with the error before the error is re-raised so the queue can retry.
+    """
+    document_id = job["documentId"]
+    container = get_documents_container()
+    record = read_document_record(container, document_id) or {"id": document_id}
+    if is_completed(record) and "analysis" in record:
+        logging.info(f"Document {document_id} already analyzed, skipping job")
+        return
     
-    if not endpoint or not key:
-        raise ValueError("Cosmos DB configuration missing")
+    record.update({"status": "processing", "updatedAt": datetime.now().isoformat()})
+    container.upsert_item(record)
     
-    return CosmosClient(endpoint, key)
+    try:
+        blob_client = get_blob_container_client(DOCUMENTS_BLOB_CONTAINER).get_blob_client(content_blob_name(document_id))
+        document_content = blob_client.download_blob().readall().decode("utf-8")
+        deployment_name = get_route("document_analysis").deployment
+        openai_client = get_openai_client()
+        document_analysis = analyze_document(openai_client, deployment_name, job["fileName"],
+                                             document_content, job.get("useCache", True))
+    except Exception as e:
+        logging.error(f"Document job {document_id} failed: {str(e)}")
+        record.update({"status": "failed", "error": str(e), "updatedAt": datetime.now().isoformat()})
+        container.upsert_item(record)
+        raise
+    
+    document_record = build_document_record(document_id, job["fileName"], job.get("fileType", "txt"),
+                                            blob_client.url, document_content, document_analysis, record)
+    container.upsert_item(add_document_embedding(openai_client, document_record))
+    logging.info(f"Document job {document_id} completed")
+
+
+def enqueue_document_job(container, content_hash: str, file_name: str, file_type: str,
+                         document_content: str, use_cache: bool,
+                         previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Store the document, record a queued job and send it to the worker queue; returns the job record
+    """
+    blob_url = upload_document(DOCUMENTS_BLOB_CONTAINER, content_blob_name(content_hash), document_content)
+    file_names = list((previous or {}).get("fileNames") or [])
+    if file_name not in file_names:
+        file_names.append(file_name)
+    now = datetime.now().isoformat()
+    record = {
+        "id": content_hash,
+        "contentHash": content_hash,
+        "status": "queued",
+        "fileName": file_name,
+        "fileNames": file_names,
+        "fileType": file_type,
+        "blobUrl": blob_url,
+        "uploadedAt": (previous or {}).get("uploadedAt", now),
+        "updatedAt": now
+    }
+    container.upsert_item(record)
+    get_job_queue(DOCUMENT_JOBS_QUEUE, run_document_job).send({
+        "documentId": content_hash,
+        "fileName": file_name,
+        "fileType": file_type,
+        "useCache": use_cache
+    })
+    return record
+
+
+def create_job_response(record: Dict[str, Any], status_code: int = 202) -> func.HttpResponse:
+    """
+    Job status body; completed jobs include the analysis
+    """
+    body = {
+        "jobId": record["id"],
+        "documentId": record["id"],
+        "status": record.get("status", "completed"),
+        "statusUrl": f"/api/processdocument?jobId={record['id']}",
+        "fileName": record.get("fileName"),
+        "updatedAt": record.get("updatedAt", record.get("uploadedAt"))
+    }
+    if body["status"] == "completed":
+        body.update({
+            "analysis": record.get("analysis"),
+            "blobUrl": record.get("blobUrl"),
+            "wordCount": record.get("wordCount"),
+            "chunkCount": record.get("chunkCount", 1),
+            "failedChunks": record.get("failedChunks", [])
+        })
+    elif body["status"] == "failed":
+        body["error"] = record.get("error")
+    return func.HttpResponse(json.dumps(body), status_code=status_code, mimetype="application/json")
+
+
+def get_job_status(job_id: str) -> func.HttpResponse:
+    """
+    Handle GET ?jobId=...: current status of an async job (or any processed document)
+    """
+    record = read_document_record(get_documents_container(), job_id)
+    if record is None:
+        return func.HttpResponse(
+            json.dumps({"error": f"Job {job_id} not found"}),
+            status_code=404,
+            mimetype="application/json"
+        )
+    return create_job_response(record, status_code=200)
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -48,6 +442,16 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('ProcessDocument function triggered')
     
     try:
+        if req.method == "GET":
+            job_id = req.params.get('jobId') or req.params.get('documentId')
+            if not job_id:
+                return func.HttpResponse(
+                    json.dumps({"error": "jobId query parameter is required"}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
+            return get_job_status(job_id)
+        
         # Parse request
         try:
             req_body = req.get_json()
@@ -68,6 +472,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         document_content = req_body.get('documentContent')
         file_name = req_body.get('fileName')
         file_type = req_body.get('fileType', 'txt')
+        use_cache = req_body.get('useCache', True)
+        async_mode = req_body.get('async') is True or req.params.get('async', '').lower() in ('1', 'true')
         
         if not document_content or not file_name:
             return func.HttpResponse(
@@ -76,99 +482,73 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
-        # Initialize Azure services
-        openai_client = get_openai_client()
-        storage_client = get_storage_client()
-        cosmos_client = get_cosmos_client()
-        
-        # Upload to blob storage
-        container_name = "documents"
-        blob_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file_name}"
-        
-        container_client = storage_client.get_container_client(container_name)
-        
-        # Create container if it doesn't exist
-        try:
-            container_client.create_container()
-        except Exception:
-            pass  # Container already exists
-        
-        # Upload document
-        blob_client = container_client.get_blob_client(blob_name)
-        blob_client.upload_blob(document_content, overwrite=True)
-        
-        # Analyze with Azure OpenAI
-        deployment_name = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-35-turbo")
-        
-        system_prompt = """You are a document analyzer specializing in grant-related content. 
-        Analyze the following document and extract key information. Return a JSON response with:
-        - summary: Brief document summary
-        - documentType: Type (grant application, grant opportunity, research paper, etc.)
-        - keyEntities: Important organizations, amounts, dates mentioned
-        - isGrantRelated: boolean indicating if grant-related
-        - confidence: confidence score (0-1)
-        - grantRequirements: If grant opportunity, list key requirements
-        - fundingAmount: Any funding amounts mentioned
-        - deadlines: Important dates/deadlines found"""
-        
-        user_prompt = f"Document filename: {file_name}\nDocument content: {document_content[:4000]}"
+        container = get_documents_container()
         
-        # Call Azure OpenAI with SDK v2
-        response = openai_client.chat.completions.create(
-            model=deployment_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1000
-        )
-        
-        analysis_text = response.choices[0].message.content
+        # Identical content is analyzed and stored once; useCache=false forces a fresh analysis
+        content_hash = compute_content_hash(document_content)
+        previous = read_document_record(container, content_hash)
+        existing = previous if previous is not None and use_cache and is_completed(previous) else None
+        if existing is not None:
+            if req_body.get('linkFileName', True):
+                link_file_name(container, existing, file_name)
+            logging.info(f"Duplicate of document {content_hash} uploaded as {file_name}")
+            return func.HttpResponse(
+                json.dumps({
+                    "success": True,
+                    "documentId": existing["id"],
+                    "analysis": existing["analysis"],
+                    "blobUrl": existing.get("blobUrl"),
+                    "wordCount": existing.get("wordCount", len(document_content.split())),
+                    "chunkCount": existing.get("chunkCount", 1),
+                    "failedChunks": [],
+                    "duplicate": True
+                }),
+                status_code=200,
+                mimetype="application/json"
+            )
         
-        # Parse JSON response from OpenAI
-        try:
-            analysis = json.loads(analysis_text)
-        except json.JSONDecodeError:
-            analysis = {
-                "summary": analysis_text,
-                "documentType": "unknown",
-                "keyEntities": [],
-                "isGrantRelated": False,
-                "confidence": 0.5,
-                "grantRequirements": [],
-                "fundingAmount": None,
-                "deadlines": []
-            }
+        if async_mode:
+            # Identical uploads while a job is queued or running share that job
+            if previous is not None and is_pending(previous):
+                return create_job_response(previous)
+            record = enqueue_document_job(container, content_hash, file_name, file_type,
+                                          document_content, use_cache, previous)
+            logging.info(f"Document {content_hash} queued for analysis: {file_name}")
+            return create_job_response(record)
         
-        # Store in Cosmos DB
-        database_name = os.environ.get("COSMOS_DATABASE_NAME", "GrantAnalysis")
-        container_name_cosmos = "Documents"
+        openai_client = get_openai_client()
+        blob_name = content_blob_name(content_hash)
+        deployment_name = get_route("document_analysis").deployment
         
-        database = cosmos_client.get_database_client(database_name)
-        container = database.get_container_client(container_name_cosmos)
+        # The blob upload and the analysis are independent: upload in the
+        # background while the analysis runs on this thread, and stop the
+        # analysis early if the upload fails
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-document") as executor:
+            upload = executor.submit(upload_document, DOCUMENTS_BLOB_CONTAINER, blob_name, document_content)
+            document_analysis = analyze_document(openai_client, deployment_name, file_name,
+                                                 document_content, use_cache, prerequisite=upload)
+            blob_url = upload.result()
+        analysis = document_analysis["analysis"]
         
-        document_record = {
-            "id": blob_name,
-            "fileName": file_name,
-            "fileType": file_type,
-            "blobUrl": blob_client.url,
-            "analysis": analysis,
-            "uploadedAt": datetime.now().isoformat(),
-            "wordCount": len(document_content.split())
-        }
+        # Store in Cosmos DB, keyed by content hash
+        document_record = build_document_record(content_hash, file_name, file_type, blob_url,
+                                                document_content, document_analysis, previous)
+        add_document_embedding(openai_client, document_record)
         
-        container.create_item(document_record)
+        container.upsert_item(document_record)
         
         logging.info(f"Document processed successfully: {file_name}")
         
         return func.HttpResponse(
             json.dumps({
                 "success": True,
-                "documentId": blob_name,
+                "documentId": content_hash,
                 "analysis": analysis,
-                "blobUrl": blob_client.url,
-                "wordCount": len(document_content.split())
+                "blobUrl": blob_url,
+                "wordCount": len(document_content.split()),
+                "chunkCount": document_analysis["chunkCount"],
+                "failedChunks": document_analysis["failedChunks"],
+                "duplicate": False
             }),
             status_code=200,
             mimetype="application/json"
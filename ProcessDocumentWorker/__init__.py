@@ -0,0 +1,14 @@
+import azure.functions as func
+import json
+import logging
+
+from ProcessDocument import run_document_job
+
+
+def main(msg: func.QueueMessage) -> None:
+    """
+    Analyze one document queued by ProcessDocument in async mode
+    """
+    job = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(f"ProcessDocumentWorker picked up document {job.get('documentId')} (attempt {msg.dequeue_count})")
+    run_document_job(job)
@@ -1,15 +1,244 @@
 import azure.functions as func
+import codecs
 import json
 import logging
 import os
+import re
+import time
+import zlib
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+from shared_code.clients import get_blob_container_client
+from shared_code.job_queue import get_job_queue, new_job_id, read_job_record, write_job_record
+from shared_code.bpe_tokenizer import (
+    BPEEncoding, PACKED_TOKEN_IDS_FORMAT, encoding_name_for_model, get_encoding, iter_stream_pieces,
+    pack_token_ids
+)
+from shared_code.settings import get_int_setting
+from shared_code.tokenizer_pool import get_preload_models
+
+DEFAULT_TOKENIZER_MODEL = 'openai/gpt-oss-120b'
+DEFAULT_MAX_BATCH_ITEMS = 1000
+SPLIT_MODES = ('pages', 'paragraphs', 'lines')
+TOKEN_ID_FORMATS = ('list', 'packed')
+DEFAULT_STREAM_CHUNK_BYTES = 64 * 1024
+DEFAULT_STREAM_BATCH_TOKENS = 4096
+
+# Stream mode runs as a job: TokenizerWorker reads the text blob and writes the
+# NDJSON output blob chunk by chunk, so neither is ever held in memory whole
+TOKENIZER_JOBS_QUEUE = "tokenizer-jobs"
+DEFAULT_TOKENIZER_JOBS_CONTAINER = "tokenizer-jobs"
+
+# Word/punctuation pattern of the simple fallback tokenizer
+SIMPLE_TOKEN_PATTERN = re.compile(r'\b\w+\b|\S')
+
+def resolve_encoding(model_name: str) -> Optional[BPEEncoding]:
+    """
+    BPE encoding for a deployment/model name, or None to use the simple tokenizer
+    """
+    encoding_name = encoding_name_for_model(model_name)
+    if encoding_name is None:
+        return None
+    try:
+        return get_encoding(encoding_name)
+    except FileNotFoundError as e:
+        logging.warning(f"BPE ranks for {encoding_name} not available, using simple tokenizer: {str(e)}")
+        return None
+
+def preload_encodings():
+    """
+    Load the BPE ranks for TOKENIZER_PRELOAD_MODELS so the first request does not pay for it
+    """
+    for model_name in get_preload_models():
+        resolve_encoding(model_name)
+
+preload_encodings()
+
+def encode_text(encoding: BPEEncoding, text: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Per-text tokenization fields (count, tokens, ids, decoded text) for one encoding
+
+    With count_only no token or id lists are built at all.
+    """
+    allowed_special = 'all' if options.get('allow_special_tokens', False) else ()
+    if options.get('count_only', False):
+        return {"token_count": encoding.count_tokens(text, allowed_special=allowed_special)}
+    
+    token_ids = encoding.encode(text, allowed_special=allowed_special)
+    
+    result = {"token_count": len(token_ids)}
+    if options.get('return_tokens', True):
+        result["tokens"] = encoding.decode_tokens(token_ids)
+    if options.get('return_token_ids', True):
+        result["token_ids"] = format_token_ids(token_ids, options)
+    if options.get('include_decoded', False):
+        result["decoded_text"] = encoding.decode(token_ids)
+    return result
+
+def format_token_ids(token_ids: List[int], options: Dict[str, Any]):
+    """
+    Token ids as a JSON list, or packed into one base64 string with token_ids_format="packed"
+    """
+    if options.get('token_ids_format', 'list') == 'packed':
+        return pack_token_ids(token_ids)
+    return token_ids
+
+def count_simple_tokens(text: str) -> int:
+    """
+    Token count of the simple fallback tokenizer without building the token list
+    """
+    return sum(1 for _ in SIMPLE_TOKEN_PATTERN.finditer(text))
+
+def shape_result(result: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply the response-shaping options to a single-text result
+
+    slim drops the echoed text and static metadata; packed ids are labelled
+    with their format so clients know how to decode them.
+    """
+    if options.get('slim', False):
+        for key in ('text', 'special_tokens', 'note'):
+            result.pop(key, None)
+    if options.get('token_ids_format', 'list') == 'packed' and isinstance(result.get('token_ids'), str):
+        result["token_ids_format"] = PACKED_TOKEN_IDS_FORMAT
+    return result
+
+def tokenize_text(text: str, model_name: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Tokenize text with the BPE encoding of an Azure OpenAI deployment
+
+    Token ids and counts match tiktoken for cl100k_base / o200k_base models.
+    Models without a known encoding (or without a bundled rank file) fall back
+    to simple_tokenize_text.
+    """
+    if options is None:
+        options = {}
+    
+    encoding = resolve_encoding(model_name)
+    
+    if options.get('count_only', False):
+        # Budgeting fast path: just the count, no token lists, no echoed text
+        try:
+            if encoding is None:
+                token_count = count_simple_tokens(text)
+            else:
+                token_count = encode_text(encoding, text, options)["token_count"]
+            return {
+                "success": True,
+                "model": model_name,
+                "encoding": encoding.name if encoding is not None else None,
+                "token_count": token_count
+            }
+        except Exception as e:
+            logging.error(f"Token counting failed: {str(e)}")
+            return {"success": False, "error": str(e), "model": model_name}
+    
+    if encoding is None:
+        result = simple_tokenize_text(text, model_name, options.get('return_tokens', True),
+                                      options.get('return_token_ids', True))
+        if result.get('success') and 'token_ids' in result:
+            result["token_ids"] = format_token_ids(result["token_ids"], options)
+        return shape_result(result, options)
+    
+    try:
+        result = {
+            "success": True,
+            "model": model_name,
+            "encoding": encoding.name,
+            "text": text,
+            "vocab_size": encoding.n_vocab,
+            "special_tokens": encoding.special_tokens
+        }
+        result.update(encode_text(encoding, text, options))
+        return shape_result(result, options)
+        
+    except Exception as e:
+        logging.error(f"Tokenization failed: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "model": model_name,
+            "text": text
+        }
+
+def split_document(document: str, split: str) -> List[str]:
+    """
+    Split a document on the server into pages (form feeds), paragraphs or lines
+    """
+    if split == 'pages':
+        return document.split('\f')
+    if split == 'paragraphs':
+        return [part for part in re.split(r'\n\s*\n', document) if part.strip()]
+    if split == 'lines':
+        return document.splitlines()
+    raise ValueError(f"split must be one of: {', '.join(SPLIT_MODES)}")
+
+def tokenize_batch(texts: List[Any], model_name: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Tokenize many texts in one call
+
+    Items come back in input order, each with its own success flag, so one bad
+    item does not fail the batch. All items share the encoding's piece memo,
+    and identical texts are encoded once.
+    """
+    if options is None:
+        options = {}
+    
+    started = time.perf_counter()
+    encoding = resolve_encoding(model_name)
+    items = []
+    seen = {}
+    total_tokens = 0
+    
+    for index, text in enumerate(texts):
+        if not isinstance(text, str):
+            items.append({"index": index, "success": False, "error": "Item must be a string"})
+            continue
+        try:
+            if text not in seen:
+                if encoding is not None:
+                    seen[text] = encode_text(encoding, text, options)
+                elif options.get('count_only', False):
+                    seen[text] = {"token_count": count_simple_tokens(text)}
+                else:
+                    simple = simple_tokenize_text(text, model_name, options.get('return_tokens', True),
+                                                  options.get('return_token_ids', True))
+                    if not simple.get('success'):
+                        raise ValueError(simple.get('error', 'Tokenization failed'))
+                    seen[text] = {key: simple[key] for key in ('token_count', 'tokens', 'token_ids') if key in simple}
+                    if 'token_ids' in seen[text]:
+                        seen[text]["token_ids"] = format_token_ids(seen[text]["token_ids"], options)
+            item = {"index": index, "success": True}
+            item.update(seen[text])
+            total_tokens += item["token_count"]
+            items.append(item)
+        except Exception as e:
+            logging.warning(f"Batch item {index} failed to tokenize: {str(e)}")
+            items.append({"index": index, "success": False, "error": str(e)})
+    
+    elapsed = time.perf_counter() - started
+    result = {
+        "success": True,
+        "model": model_name,
+        "encoding": encoding.name if encoding is not None else None,
+        "vocab_size": encoding.n_vocab if encoding is not None else 50257,
+        "items": items,
+        "item_count": len(items),
+        "failed_items": sum(1 for item in items if not item["success"]),
+        "total_tokens": total_tokens,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "tokens_per_second": round(total_tokens / elapsed, 1) if elapsed > 0 else None
+    }
+    if options.get('token_ids_format', 'list') == 'packed' and not options.get('count_only', False):
+        result["token_ids_format"] = PACKED_TOKEN_IDS_FORMAT
+    return result
 
 def simple_tokenize_text(text: str, model: str = "simple", return_tokens: bool = True, return_token_ids: bool = True) -> dict:
     """Simple word-based tokenization for testing"""
     try:
         # Simple word tokenization (split by spaces and punctuation)
-        import re
-        tokens = re.findall(r'\b\w+\b|\S', text)
-        token_ids = [hash(token) % 50257 for token in tokens]  # Simple hash-based IDs
+        tokens = SIMPLE_TOKEN_PATTERN.findall(text)
+        token_ids = [zlib.crc32(token.encode('utf-8')) % 50257 for token in tokens]  # Stable hash-based IDs
         
         result = {
             "success": True,
@@ -24,7 +253,7 @@ def simple_tokenize_text(text: str, model: str = "simple", return_tokens: bool =
                 "sep_token": None,
                 "mask_token": None
             },
-            "note": "This is a simple tokenizer for testing. Full transformers integration coming soon."
+            "note": "Simple word tokenizer: no BPE encoding is available for this model, ids are not model token ids."
         }
         
         # Add tokens and token_ids based on request parameters
@@ -44,6 +273,264 @@ def simple_tokenize_text(text: str, model: str = "simple", return_tokens: bool =
             "text": text
         }
 
+def dump_response(result: Dict[str, Any], options: Dict[str, Any]) -> str:
+    """
+    Serialize a result: pretty-printed by default, compact for slim/count-only responses
+    """
+    if options.get('slim', False) or options.get('count_only', False):
+        return json.dumps(result, separators=(',', ':'))
+    return json.dumps(result, indent=2)
+
+def validate_options(options: Dict[str, Any]) -> Optional[str]:
+    """
+    Error message for invalid tokenization options, or None
+    """
+    if not isinstance(options, dict):
+        return "options must be an object"
+    if options.get('token_ids_format', 'list') not in TOKEN_ID_FORMATS:
+        return f"token_ids_format must be one of: {', '.join(TOKEN_ID_FORMATS)}"
+    return None
+
+def iter_text_chunks(byte_chunks: Iterable[bytes], chunk_size: int) -> Iterator[str]:
+    """
+    Decode UTF-8 byte chunks into text pieces of at most chunk_size bytes
+
+    Characters split across chunks are carried over.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for data in byte_chunks:
+        view = memoryview(data)
+        for start in range(0, len(view), chunk_size):
+            text = decoder.decode(view[start:start + chunk_size])
+            if text:
+                yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def iter_simple_token_id_batches(chunks: Iterable[str], batch_size: int) -> Iterator[List[int]]:
+    """
+    Streaming counterpart of simple_tokenize_text's ids
+    """
+    batch: List[int] = []
+    for token in iter_stream_pieces(SIMPLE_TOKEN_PATTERN, chunks):
+        batch.append(zlib.crc32(token.encode('utf-8')) % 50257)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stream_tokenize(chunks: Iterable[str], model_name: str, options: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Tokenize a stream of text chunks, yielding start, tokens and complete events
+
+    Each tokens event carries one batch of ids and its offset in the token
+    sequence, so token ids are produced one batch at a time however large the
+    input is (the caller decides whether events are kept).
+    """
+    started = time.perf_counter()
+    batch_size = max(1, int(options.get('batch_size', DEFAULT_STREAM_BATCH_TOKENS)))
+    encoding = resolve_encoding(model_name)
+    yield {"type": "start", "model": model_name, "encoding": encoding.name if encoding is not None else None}
+    
+    if encoding is None:
+        batches = iter_simple_token_id_batches(chunks, batch_size)
+    else:
+        batches = encoding.iter_encode_chunks(chunks, batch_size)
+    
+    offset = 0
+    try:
+        for token_ids in batches:
+            event = {"type": "tokens", "offset": offset, "count": len(token_ids)}
+            if not options.get('count_only', False):
+                event["token_ids"] = format_token_ids(token_ids, options)
+            offset += len(token_ids)
+            yield event
+    except Exception as e:
+        logging.error(f"Streaming tokenization failed after {offset} tokens: {str(e)}")
+        yield {"type": "error", "error": str(e), "token_count": offset}
+        return
+    
+    complete = {
+        "type": "complete",
+        "token_count": offset,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+    if options.get('token_ids_format', 'list') == 'packed':
+        complete["token_ids_format"] = PACKED_TOKEN_IDS_FORMAT
+    yield complete
+
+def get_tokenizer_jobs_container():
+    """Blob container holding stream job inputs, NDJSON outputs and progress records"""
+    return get_blob_container_client(os.environ.get("TOKENIZER_JOBS_CONTAINER", DEFAULT_TOKENIZER_JOBS_CONTAINER))
+
+def tokenize_stream_request(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Handle ?stream=ndjson: queue a job tokenizing the raw request body into an NDJSON blob
+
+    Options come from the query string. With ?inputBlob=<name> the text is
+    read from that blob in the jobs container instead of the request body.
+    """
+    options = {
+        'token_ids_format': req.params.get('token_ids_format', 'list'),
+        'count_only': req.params.get('count_only', '').lower() in ('1', 'true', 'yes'),
+        'batch_size': req.params.get('batch_size', DEFAULT_STREAM_BATCH_TOKENS)
+    }
+    options_error = validate_options(options)
+    if options_error is None and not str(options['batch_size']).isdigit():
+        options_error = "batch_size must be a positive integer"
+    if options_error:
+        return func.HttpResponse(
+            json.dumps({"error": options_error}),
+            mimetype="application/json",
+            status_code=400
+        )
+    options['batch_size'] = int(options['batch_size'])
+    
+    model_name = req.params.get('model') or os.environ.get('DEFAULT_MODEL', DEFAULT_TOKENIZER_MODEL)
+    job_id = new_job_id()
+    container = get_tokenizer_jobs_container()
+    input_blob = req.params.get('inputBlob')
+    if not input_blob:
+        input_blob = f"{job_id}/input.txt"
+        container.get_blob_client(input_blob).upload_blob(req.get_body() or b'', overwrite=True)
+    
+    record = write_job_record(container, {
+        "jobId": job_id,
+        "status": "queued",
+        "statusUrl": f"/api/tokenizerfunction?jobId={job_id}",
+        "model": model_name,
+        "inputBlob": input_blob
+    })
+    get_job_queue(TOKENIZER_JOBS_QUEUE, run_tokenizer_job).send({
+        "jobId": job_id,
+        "model": model_name,
+        "inputBlob": input_blob,
+        "options": options
+    })
+    return func.HttpResponse(json.dumps(record), mimetype="application/json", status_code=202)
+
+def run_tokenizer_job(job: Dict[str, Any]):
+    """
+    Tokenize a queued text blob into an NDJSON blob (called by TokenizerWorker or the in-process queue)
+
+    The input is downloaded and the output uploaded in chunks, so memory is
+    bounded by the chunk and batch sizes whatever the size of the text. A
+    failed job is recorded as failed and the error re-raised so the queue can retry.
+    """
+    from azure.storage.blob import ContentSettings
+    
+    job_id = job["jobId"]
+    container = get_tokenizer_jobs_container()
+    record = read_job_record(container, job_id) or {"jobId": job_id}
+    if record.get("status") == "completed":
+        logging.info(f"Tokenizer job {job_id} already completed, skipping")
+        return
+    record.update({"status": "processing"})
+    record.pop("error", None)
+    write_job_record(container, record)
+    
+    chunk_size = max(1, get_int_setting('TOKENIZER_STREAM_CHUNK_BYTES', DEFAULT_STREAM_CHUNK_BYTES))
+    last_event: Dict[str, Any] = {}
+    
+    def ndjson_lines():
+        byte_chunks = container.get_blob_client(job["inputBlob"]).download_blob().chunks()
+        for event in stream_tokenize(iter_text_chunks(byte_chunks, chunk_size), job["model"], job["options"]):
+            last_event.clear()
+            last_event.update(event)
+            yield (json.dumps(event, separators=(',', ':')) + "\n").encode("utf-8")
+    
+    output_client = container.get_blob_client(f"{job_id}/output.ndjson")
+    try:
+        output_client.upload_blob(ndjson_lines(), overwrite=True,
+                                  content_settings=ContentSettings(content_type="application/x-ndjson"))
+    except Exception as e:
+        logging.error(f"Tokenizer job {job_id} failed: {str(e)}")
+        record.update({"status": "failed", "error": str(e)})
+        write_job_record(container, record)
+        raise
+    
+    if last_event.get("type") != "complete":
+        record.update({"status": "failed", "error": last_event.get("error", "Tokenization did not complete")})
+        write_job_record(container, record)
+        raise RuntimeError(record["error"])
+    record.update({
+        "status": "completed",
+        "token_count": last_event["token_count"],
+        "outputBlob": f"{job_id}/output.ndjson",
+        "outputUrl": output_client.url
+    })
+    write_job_record(container, record)
+    logging.info(f"Tokenizer job {job_id} completed: {last_event['token_count']} tokens")
+
+def get_tokenizer_job_status(job_id: str) -> func.HttpResponse:
+    """
+    Handle GET ?jobId=...: status of a stream job, with the output blob once completed
+    """
+    record = read_job_record(get_tokenizer_jobs_container(), job_id)
+    if record is None:
+        return func.HttpResponse(
+            json.dumps({"error": f"Job {job_id} not found"}),
+            mimetype="application/json",
+            status_code=404
+        )
+    return func.HttpResponse(json.dumps(record), mimetype="application/json", status_code=200)
+
+def tokenize_batch_request(req_body: Dict[str, Any]) -> func.HttpResponse:
+    """
+    Handle a POST carrying "texts" or "document" instead of a single "text"
+    """
+    texts = req_body.get('texts')
+    if texts is None:
+        document = req_body.get('document')
+        if not isinstance(document, str) or not document:
+            return func.HttpResponse(
+                json.dumps({"error": "document must be a non-empty string"}),
+                mimetype="application/json",
+                status_code=400
+            )
+        try:
+            texts = split_document(document, req_body.get('split', 'pages'))
+        except ValueError as e:
+            return func.HttpResponse(
+                json.dumps({"error": str(e)}),
+                mimetype="application/json",
+                status_code=400
+            )
+    
+    if not isinstance(texts, list) or not texts:
+        return func.HttpResponse(
+            json.dumps({"error": "texts must be a non-empty array"}),
+            mimetype="application/json",
+            status_code=400
+        )
+    
+    max_items = get_int_setting('TOKENIZER_MAX_BATCH_ITEMS', DEFAULT_MAX_BATCH_ITEMS)
+    if len(texts) > max_items:
+        return func.HttpResponse(
+            json.dumps({"error": f"Batch too large: {len(texts)} items (max {max_items})"}),
+            mimetype="application/json",
+            status_code=400
+        )
+    
+    options = req_body.get('options', {})
+    options_error = validate_options(options)
+    if options_error:
+        return func.HttpResponse(
+            json.dumps({"error": options_error}),
+            mimetype="application/json",
+            status_code=400
+        )
+    
+    model_name = req_body.get('model_name') or req_body.get('model', os.environ.get('DEFAULT_MODEL', DEFAULT_TOKENIZER_MODEL))
+    result = tokenize_batch(texts, model_name, options)
+    return func.HttpResponse(
+        dump_response(result, options),
+        mimetype="application/json",
+        status_code=200
+    )
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Main Azure Function entry point"""
     logging.info('Python HTTP trigger function processed a request.')
@@ -52,19 +539,36 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         method = req.method
         
         if method == "GET":
-            default_model = os.environ.get('DEFAULT_MODEL', 'simple')
+            job_id = req.params.get('jobId')
+            if isinstance(job_id, str) and job_id:
+                return get_tokenizer_job_status(job_id)
+            default_model = os.environ.get('DEFAULT_MODEL', DEFAULT_TOKENIZER_MODEL)
             return func.HttpResponse(
                 json.dumps({
-                    "message": "Simple Tokenizer API is running",
-                    "status": "TESTING MODE - Transformers not yet installed",
+                    "message": "Tokenizer API is running",
                     "default_model": default_model,
+                    "encodings": ["cl100k_base", "o200k_base", "o200k_harmony"],
                     "supported_methods": ["GET", "POST"],
                     "usage": {
                         "POST": "/api/tokenizerfunction",
                         "body": {
-                            "text": "Text to tokenize (required)",
-                            "model": "Model name (optional, currently using simple tokenizer)"
-                        }
+                            "text": "Text to tokenize (required unless texts or document is given)",
+                            "texts": "Array of texts to tokenize in one call (optional)",
+                            "document": "Text to split on the server and tokenize per part (optional)",
+                            "split": f"How to split document: {', '.join(SPLIT_MODES)} (default: pages)",
+                            "model": f"Deployment/model or encoding name (optional, default: {default_model})",
+                            "options": {
+                                "return_tokens": "bool (optional, default: True)",
+                                "return_token_ids": "bool (optional, default: True)",
+                                "include_decoded": "bool (optional, default: False)",
+                                "allow_special_tokens": "bool (optional, default: False)",
+                                "count_only": "bool (optional, default: False) - only token_count, no token lists",
+                                "slim": "bool (optional, default: False) - no echoed text, compact JSON",
+                                "token_ids_format": "list or packed (base64 of uint32 little-endian)"
+                            }
+                        },
+                        "stream": "POST /api/tokenizerfunction?stream=ndjson&model=... with the raw text as body; "
+                                  "returns a job, poll GET ?jobId=... for the NDJSON output blob"
                     }
                 }, indent=2),
                 mimetype="application/json",
@@ -72,6 +576,9 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             )
         
         elif method == "POST":
+            if req.params.get('stream') == 'ndjson':
+                return tokenize_stream_request(req)
+            
             try:
                 req_body = req.get_json()
                 if not req_body:
@@ -81,6 +588,9 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                         status_code=400
                     )
                 
+                if 'texts' in req_body or 'document' in req_body:
+                    return tokenize_batch_request(req_body)
+                
                 text = req_body.get('text', '')
                 if not text:
                     return func.HttpResponse(
@@ -90,16 +600,26 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                     )
                 
                 # Accept both 'model' and 'model_name' parameters for compatibility
-                model_name = req_body.get('model_name') or req_body.get('model', 'simple')
-                return_tokens = req_body.get('return_tokens', True)
-                return_token_ids = req_body.get('return_token_ids', True)
+                model_name = req_body.get('model_name') or req_body.get('model', os.environ.get('DEFAULT_MODEL', DEFAULT_TOKENIZER_MODEL))
+                options = req_body.get('options', {})
+                # Top-level return_tokens / return_token_ids are still accepted
+                for key in ('return_tokens', 'return_token_ids'):
+                    if key in req_body:
+                        options = {**options, key: req_body[key]}
+                
+                options_error = validate_options(options)
+                if options_error:
+                    return func.HttpResponse(
+                        json.dumps({"error": options_error}),
+                        mimetype="application/json",
+                        status_code=400
+                    )
                 
-                # Use simple tokenization for now
-                result = simple_tokenize_text(text, model_name, return_tokens, return_token_ids)
+                result = tokenize_text(text, model_name, options)
                 
                 status_code = 200 if result.get('success') else 500
                 return func.HttpResponse(
-                    json.dumps(result, indent=2),
+                    dump_response(result, options),
                     mimetype="application/json",
                     status_code=status_code
                 )
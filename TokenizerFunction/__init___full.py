@@ -5,20 +5,57 @@ import os
 from transformers import AutoTokenizer
 from typing import Optional, Dict, Any
 
-# Global tokenizer cache to avoid reloading
-_tokenizer_cache = {}
+from shared_code.settings import get_bool_setting, get_int_setting
+from shared_code.tokenizer_pool import (
+    DEFAULT_MAX_MODELS, DEFAULT_MAX_VOCAB, TokenizerPool, get_preload_models
+)
+
+# Tokenizer files packaged with the app: <dir>/<org>/<model>/tokenizer.json etc.
+DEFAULT_ARTIFACTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tokenizer_artifacts')
+
+def get_artifacts_dir() -> str:
+    return os.environ.get('TOKENIZER_ARTIFACTS_DIR') or DEFAULT_ARTIFACTS_DIR
+
+def local_artifact_path(model_name: str) -> Optional[str]:
+    """Directory of the packaged tokenizer for model_name, or None"""
+    root = os.path.abspath(get_artifacts_dir())
+    path = os.path.abspath(os.path.join(root, *model_name.split('/')))
+    # Model names come from the request; never resolve outside the artifact directory
+    if not path.startswith(root + os.sep):
+        return None
+    return path if os.path.isdir(path) else None
+
+def load_tokenizer(model_name: str) -> AutoTokenizer:
+    """
+    Load a tokenizer from the packaged artifacts, without touching the network
+
+    Downloading from the Hugging Face Hub is only attempted when
+    TOKENIZER_ALLOW_DOWNLOAD is enabled.
+    """
+    path = local_artifact_path(model_name)
+    if path is not None:
+        logging.info(f"Loading tokenizer for model {model_name} from {path}")
+        return AutoTokenizer.from_pretrained(path, local_files_only=True)
+    if not get_bool_setting('TOKENIZER_ALLOW_DOWNLOAD', False):
+        raise FileNotFoundError(f"No packaged tokenizer for {model_name} in {get_artifacts_dir()}")
+    logging.info(f"Downloading tokenizer for model: {model_name}")
+    return AutoTokenizer.from_pretrained(model_name)
+
+# Bounded tokenizer pool, warmed with TOKENIZER_PRELOAD_MODELS when the worker loads this module
+_tokenizer_pool = TokenizerPool(
+    load_tokenizer,
+    get_int_setting('TOKENIZER_POOL_MAX_MODELS', DEFAULT_MAX_MODELS),
+    get_int_setting('TOKENIZER_POOL_MAX_VOCAB', DEFAULT_MAX_VOCAB)
+)
+_tokenizer_pool.preload(get_preload_models())
 
 def get_tokenizer(model_name: str) -> AutoTokenizer:
-    """Get or load tokenizer with caching"""
-    if model_name not in _tokenizer_cache:
-        try:
-            logging.info(f"Loading tokenizer for model: {model_name}")
-            _tokenizer_cache[model_name] = AutoTokenizer.from_pretrained(model_name)
-            logging.info(f"Successfully loaded tokenizer for {model_name}")
-        except Exception as e:
-            logging.error(f"Failed to load tokenizer for {model_name}: {str(e)}")
-            raise e
-    return _tokenizer_cache[model_name]
+    """Get a tokenizer from the pool, loading it on first use"""
+    try:
+        return _tokenizer_pool.get(model_name)
+    except Exception as e:
+        logging.error(f"Failed to load tokenizer for {model_name}: {str(e)}")
+        raise e
 
 def tokenize_text(text: str, model_name: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
     """Tokenize text using the specified model"""
@@ -81,6 +118,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 json.dumps({
                     "message": "Tokenizer API is running",
                     "default_model": default_model,
+                    "tokenizer_pool": _tokenizer_pool.stats(),
                     "supported_methods": ["GET", "POST"],
                     "usage": {
                         "POST": "/api/TokenizerFunction",
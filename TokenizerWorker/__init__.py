@@ -0,0 +1,14 @@
+import azure.functions as func
+import json
+import logging
+
+from TokenizerFunction import run_tokenizer_job
+
+
+def main(msg: func.QueueMessage) -> None:
+    """
+    Tokenize one text blob queued by TokenizerFunction in stream mode
+    """
+    job = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(f"TokenizerWorker picked up tokenizer job {job.get('jobId')} (attempt {msg.dequeue_count})")
+    run_tokenizer_job(job)
@@ -0,0 +1,3 @@
+"""
+Shared helpers used by the GrantSeeker Azure Functions
+"""
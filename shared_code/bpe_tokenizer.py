@@ -0,0 +1,427 @@
+"""
+Lightweight byte-level BPE tokenizer compatible with tiktoken encodings
+
+Loads cl100k_base / o200k_base merge ranks from local ``.tiktoken`` files (one
+``base64(token) rank`` pair per line) and reproduces tiktoken's token ids and
+counts for the Azure OpenAI deployments we call, without the transformers
+stack. Ranks are loaded once per worker; token bytes for decoding are kept in
+one contiguous buffer with an offset array. Encoded pieces are memoized, so
+repeated words and chunks skip the merge loop entirely.
+
+Pre-tokenization uses the ``regex`` package for the exact Unicode patterns.
+Without it an approximation built on ``re`` is used and counts on non-ASCII
+text may differ slightly.
+
+App settings:
+    TOKENIZER_ENCODINGS_DIR    directory holding <encoding>.tiktoken files
+                               (default: shared_code/encodings)
+    TOKENIZER_PIECE_CACHE_SIZE memoized pieces per encoding (default 65536)
+"""
+import base64
+import logging
+import os
+import re
+import sys
+import threading
+from array import array
+from functools import lru_cache
+from typing import Collection, Dict, Iterable, Iterator, List, Optional, Union
+
+from .settings import get_int_setting
+
+try:
+    import regex
+except ImportError:  # pragma: no cover - exercised only where regex is missing
+    regex = None
+
+DEFAULT_ENCODINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "encodings")
+DEFAULT_PIECE_CACHE_SIZE = 65536
+
+# Array typecode for 4-byte unsigned ints ("I" on all common platforms)
+_UINT32_TYPECODE = "I" if array("I").itemsize == 4 else "L"
+PACKED_TOKEN_IDS_FORMAT = "uint32le-base64"
+
+ENDOFTEXT = "<|endoftext|>"
+FIM_PREFIX = "<|fim_prefix|>"
+FIM_MIDDLE = "<|fim_middle|>"
+FIM_SUFFIX = "<|fim_suffix|>"
+ENDOFPROMPT = "<|endofprompt|>"
+STARTOFTEXT = "<|startoftext|>"
+
+_CL100K_PATTERN = (
+    r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+)
+
+_O200K_PATTERN = "|".join([
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\p{N}{1,3}""",
+    r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+])
+
+# Stdlib approximations: letters are [^\W\d_], numbers \d, no case classes
+_CL100K_FALLBACK_PATTERN = (
+    r"""'(?i:[sdmt]|ll|ve|re)|(?:[^\r\n\w]|_)?[^\W\d_]+|\d{1,3}| ?(?:[^\s\w]|_)+[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+)
+_O200K_FALLBACK_PATTERN = "|".join([
+    r"""(?:[^\r\n\w]|_)?[^\W\d_]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\d{1,3}""",
+    r""" ?(?:[^\s\w]|_)+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+])
+
+ENCODING_SPECS = {
+    "cl100k_base": {
+        "pattern": _CL100K_PATTERN,
+        "fallback_pattern": _CL100K_FALLBACK_PATTERN,
+        "special_tokens": {
+            ENDOFTEXT: 100257,
+            FIM_PREFIX: 100258,
+            FIM_MIDDLE: 100259,
+            FIM_SUFFIX: 100260,
+            ENDOFPROMPT: 100276
+        }
+    },
+    "o200k_base": {
+        "pattern": _O200K_PATTERN,
+        "fallback_pattern": _O200K_FALLBACK_PATTERN,
+        "special_tokens": {
+            ENDOFTEXT: 199999,
+            ENDOFPROMPT: 200018
+        }
+    },
+    # gpt-oss: o200k_base ranks plus the harmony chat-format tokens
+    "o200k_harmony": {
+        "rank_file": "o200k_base",
+        "pattern": _O200K_PATTERN,
+        "fallback_pattern": _O200K_FALLBACK_PATTERN,
+        "special_tokens": {
+            STARTOFTEXT: 199998,
+            ENDOFTEXT: 199999,
+            "<|return|>": 200002,
+            "<|constrain|>": 200003,
+            "<|channel|>": 200005,
+            "<|start|>": 200006,
+            "<|end|>": 200007,
+            "<|message|>": 200008,
+            "<|call|>": 200012,
+            ENDOFPROMPT: 200018
+        }
+    }
+}
+
+# Azure OpenAI deployment / model names and the encoding they use
+MODEL_TO_ENCODING = {
+    "gpt-35-turbo": "cl100k_base",
+    "gpt-35-turbo-16k": "cl100k_base",
+    "gpt-3.5-turbo": "cl100k_base",
+    "gpt-4": "cl100k_base",
+    "gpt-4-32k": "cl100k_base",
+    "gpt-4-turbo": "cl100k_base",
+    "text-embedding-ada-002": "cl100k_base",
+    "text-embedding-3-small": "cl100k_base",
+    "text-embedding-3-large": "cl100k_base",
+    "gpt-4o": "o200k_base",
+    "gpt-4o-mini": "o200k_base",
+    "openai/gpt-oss-120b": "o200k_harmony",
+    "openai/gpt-oss-20b": "o200k_harmony",
+    "gpt-4.1": "o200k_base",
+    "o1": "o200k_base",
+    "o3": "o200k_base",
+    "o3-mini": "o200k_base",
+    "o4-mini": "o200k_base"
+}
+
+# Checked longest first, so "gpt-4o-2024-08-06" resolves to o200k_base
+MODEL_PREFIX_TO_ENCODING = {
+    "gpt-4o": "o200k_base",
+    "gpt-4.1": "o200k_base",
+    "gpt-4.5": "o200k_base",
+    "o1-": "o200k_base",
+    "o3-": "o200k_base",
+    "o4-": "o200k_base",
+    "gpt-35-turbo": "cl100k_base",
+    "gpt-3.5-turbo": "cl100k_base",
+    "gpt-4-": "cl100k_base",
+    "text-embedding-": "cl100k_base",
+    "gpt-oss": "o200k_harmony",
+    "openai/gpt-oss": "o200k_harmony"
+}
+
+
+def pack_token_ids(token_ids: Iterable[int]) -> str:
+    """Pack token ids as base64 of little-endian uint32 values"""
+    packed = array(_UINT32_TYPECODE, token_ids)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode("ascii")
+
+
+def unpack_token_ids(data: str) -> List[int]:
+    """Inverse of pack_token_ids"""
+    packed = array(_UINT32_TYPECODE)
+    packed.frombytes(base64.b64decode(data))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tolist()
+
+
+def iter_stream_pieces(pattern, chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Split a stream of text chunks with pattern as if they were one string
+
+    The text from the start of each buffer's last match is held back and
+    re-matched together with the next chunk, since that piece (or the
+    whitespace before it) may continue across the boundary. Only one chunk
+    plus one pending piece is held in memory at a time.
+    """
+    pending = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer = pending + chunk
+        previous = None
+        for match in pattern.finditer(buffer):
+            if previous is not None:
+                yield previous.group()
+            previous = match
+        pending = buffer[previous.start():] if previous is not None else ""
+    for match in pattern.finditer(pending):
+        yield match.group()
+
+
+def load_tiktoken_ranks(path: str) -> Dict[bytes, int]:
+    """Read a .tiktoken file into {token bytes: rank}"""
+    ranks = {}
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            token, rank = line.split()
+            ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+class BPEEncoding:
+    """
+    One byte-level BPE encoding (merge ranks, pre-tokenizer and special tokens)
+    """
+
+    def __init__(self, name: str, mergeable_ranks: Dict[bytes, int], pattern: str,
+                 special_tokens: Optional[Dict[str, int]] = None, fallback_pattern: Optional[str] = None,
+                 piece_cache_size: int = DEFAULT_PIECE_CACHE_SIZE):
+        self.name = name
+        self._ranks = mergeable_ranks
+        self.special_tokens = dict(special_tokens or {})
+        self.exact = regex is not None or fallback_pattern is None
+        if regex is not None:
+            self._pattern = regex.compile(pattern)
+        else:
+            self._pattern = re.compile(fallback_pattern or pattern)
+
+        # Decoder: all token bytes in one buffer, addressed by offsets[id]..offsets[id + 1]
+        self.max_token_value = max([*mergeable_ranks.values(), *self.special_tokens.values()], default=-1)
+        lengths = [0] * (self.max_token_value + 1)
+        for token, rank in mergeable_ranks.items():
+            lengths[rank] = len(token)
+        for token, rank in self.special_tokens.items():
+            lengths[rank] = len(token.encode("utf-8"))
+        self._offsets = array("I", [0]) * (self.max_token_value + 2)
+        for i, length in enumerate(lengths):
+            self._offsets[i + 1] = self._offsets[i] + length
+        buffer = bytearray(self._offsets[-1])
+        for token, rank in mergeable_ranks.items():
+            buffer[self._offsets[rank]:self._offsets[rank + 1]] = token
+        for token, rank in self.special_tokens.items():
+            buffer[self._offsets[rank]:self._offsets[rank + 1]] = token.encode("utf-8")
+        self._token_bytes = bytes(buffer)
+
+        self._special_pattern = None
+        if self.special_tokens:
+            self._special_pattern = re.compile(
+                "|".join(re.escape(token) for token in sorted(self.special_tokens, key=len, reverse=True))
+            )
+        self._encode_piece = lru_cache(maxsize=piece_cache_size)(self._encode_piece_uncached)
+
+    @property
+    def n_vocab(self) -> int:
+        return self.max_token_value + 1
+
+    def _encode_piece_uncached(self, piece: bytes) -> tuple:
+        rank = self._ranks.get(piece)
+        if rank is not None:
+            return (rank,)
+        return tuple(self._ranks[part] for part in self._byte_pair_merge(piece))
+
+    def _byte_pair_merge(self, piece: bytes) -> List[bytes]:
+        """Repeatedly merge the adjacent pair with the lowest rank (leftmost on ties)"""
+        ranks = self._ranks
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best_rank = None
+            best_index = -1
+            for i in range(len(parts) - 1):
+                rank = ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+                    best_index = i
+            if best_rank is None:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+        return parts
+
+    def iter_pieces(self, text: str) -> Iterable[str]:
+        """Pre-tokenize text into the pieces BPE runs on"""
+        for match in self._pattern.finditer(text):
+            yield match.group()
+
+    def encode_ordinary(self, text: str) -> List[int]:
+        """Encode text, treating special-token strings as plain text"""
+        ids: List[int] = []
+        encode_piece = self._encode_piece
+        for piece in self.iter_pieces(text):
+            ids.extend(encode_piece(piece.encode("utf-8")))
+        return ids
+
+    def iter_encode_chunks(self, chunks: Iterable[str], batch_size: int = 4096) -> Iterator[List[int]]:
+        """
+        Encode a stream of text chunks, yielding token ids in lists of about batch_size
+
+        The ids are the same as encode_ordinary over the concatenated text;
+        special-token strings are encoded as plain text.
+        """
+        encode_piece = self._encode_piece
+        batch: List[int] = []
+        for piece in iter_stream_pieces(self._pattern, chunks):
+            batch.extend(encode_piece(piece.encode("utf-8")))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def encode(self, text: str, allowed_special: Union[str, Collection[str]] = ()) -> List[int]:
+        """
+        Encode text; special tokens listed in allowed_special ("all" for every one) map to their ids
+        """
+        if allowed_special == "all":
+            allowed_special = set(self.special_tokens)
+        if not allowed_special or self._special_pattern is None:
+            return self.encode_ordinary(text)
+
+        ids: List[int] = []
+        start = 0
+        for match in self._special_pattern.finditer(text):
+            if match.group() not in allowed_special:
+                continue
+            ids.extend(self.encode_ordinary(text[start:match.start()]))
+            ids.append(self.special_tokens[match.group()])
+            start = match.end()
+        ids.extend(self.encode_ordinary(text[start:]))
+        return ids
+
+    def count_tokens(self, text: str, allowed_special: Union[str, Collection[str]] = ()) -> int:
+        """Number of tokens text encodes to"""
+        if not allowed_special:
+            count = 0
+            encode_piece = self._encode_piece
+            for piece in self.iter_pieces(text):
+                count += len(encode_piece(piece.encode("utf-8")))
+            return count
+        return len(self.encode(text, allowed_special))
+
+    def token_bytes(self, token_id: int) -> bytes:
+        if token_id < 0 or token_id > self.max_token_value:
+            raise ValueError(f"Unknown token id {token_id}")
+        return self._token_bytes[self._offsets[token_id]:self._offsets[token_id + 1]]
+
+    def decode_bytes(self, token_ids: Iterable[int]) -> bytes:
+        return b"".join(self.token_bytes(token_id) for token_id in token_ids)
+
+    def decode(self, token_ids: Iterable[int]) -> str:
+        return self.decode_bytes(token_ids).decode("utf-8", errors="replace")
+
+    def decode_tokens(self, token_ids: Iterable[int]) -> List[str]:
+        """Text of each token (partial UTF-8 sequences shown as U+FFFD)"""
+        return [self.token_bytes(token_id).decode("utf-8", errors="replace") for token_id in token_ids]
+
+    def cache_info(self):
+        return self._encode_piece.cache_info()
+
+
+_encodings: Dict[str, BPEEncoding] = {}
+_rank_files: Dict[str, Dict[bytes, int]] = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encodings_dir() -> str:
+    return os.environ.get("TOKENIZER_ENCODINGS_DIR") or DEFAULT_ENCODINGS_DIR
+
+
+def get_encoding(name: str) -> BPEEncoding:
+    """
+    Get a named encoding, loading its rank file on first use
+
+    Encodings sharing a rank file (o200k_base / o200k_harmony) share the
+    loaded ranks; each keeps its own special tokens.
+
+    Raises ValueError for unknown encodings and FileNotFoundError if the rank
+    file is not in the encodings directory.
+    """
+    if name not in ENCODING_SPECS:
+        raise ValueError(f"Unknown encoding: {name}")
+    with _encodings_lock:
+        encoding = _encodings.get(name)
+        if encoding is None:
+            spec = ENCODING_SPECS[name]
+            path = os.path.join(get_encodings_dir(), f"{spec.get('rank_file', name)}.tiktoken")
+            logging.info(f"Loading BPE ranks for {name} from {path}")
+            if path not in _rank_files:
+                _rank_files[path] = load_tiktoken_ranks(path)
+            encoding = BPEEncoding(
+                name,
+                _rank_files[path],
+                spec["pattern"],
+                spec["special_tokens"],
+                fallback_pattern=spec["fallback_pattern"],
+                piece_cache_size=get_int_setting("TOKENIZER_PIECE_CACHE_SIZE", DEFAULT_PIECE_CACHE_SIZE)
+            )
+            if not encoding.exact:
+                logging.warning(f"regex package not installed; {name} pre-tokenization is approximate")
+            _encodings[name] = encoding
+        return encoding
+
+
+def encoding_name_for_model(model: str) -> Optional[str]:
+    """Encoding used by a deployment/model name (or an encoding name itself), or None"""
+    if not model:
+        return None
+    key = model.strip().lower()
+    if key in ENCODING_SPECS:
+        return key
+    if key in MODEL_TO_ENCODING:
+        return MODEL_TO_ENCODING[key]
+    for prefix in sorted(MODEL_PREFIX_TO_ENCODING, key=len, reverse=True):
+        if key.startswith(prefix):
+            return MODEL_PREFIX_TO_ENCODING[prefix]
+    return None
+
+
+def encoding_for_model(model: str) -> BPEEncoding:
+    """Encoding for a deployment/model name; raises ValueError if the model is unknown"""
+    name = encoding_name_for_model(model)
+    if name is None:
+        raise ValueError(f"No BPE encoding known for model: {model}")
+    return get_encoding(name)
+
+
+def reset_encodings():
+    """Drop loaded encodings (used by tests)"""
+    with _encodings_lock:
+        _encodings.clear()
+        _rank_files.clear()
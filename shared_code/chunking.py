@@ -0,0 +1,134 @@
+"""
+Token-budgeted, overlapping chunking of long documents
+
+Text is split on paragraph boundaries, then lines, then words (as needed),
+and packed greedily into chunks of at most ``max_tokens`` tokens. Each chunk
+starts with about ``overlap_tokens`` from the end of the previous one, cut at
+a paragraph, line or word boundary, so facts that straddle a boundary are
+seen whole by at least one chunk. Every character of the input ends up in
+some chunk.
+
+Token counts use the deployment's BPE encoding when its rank file is
+available and fall back to a characters/4 estimate otherwise.
+"""
+import logging
+import math
+import re
+from typing import Callable, List, Optional
+
+from .bpe_tokenizer import encoding_for_model
+
+# Rough characters per token for English text when no BPE encoding is loaded
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_PATTERN = re.compile(r".*?(?:\n[ \t]*\n\s*|\Z)", re.DOTALL)
+_LINE_PATTERN = re.compile(r".*?(?:\n|\Z)", re.DOTALL)
+_WORD_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count from the character length"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def get_token_counter(model: Optional[str]) -> Callable[[str], int]:
+    """
+    Token counting function for a deployment/model name
+
+    Falls back to estimate_tokens if the model has no known encoding or its
+    rank file is not deployed.
+    """
+    try:
+        encoding = encoding_for_model(model)
+    except (ValueError, FileNotFoundError) as e:
+        logging.info(f"Estimating token counts for {model}: {str(e)}")
+        return estimate_tokens
+    return encoding.count_tokens
+
+
+def _split(text: str, pattern) -> List[str]:
+    return [match.group() for match in pattern.finditer(text) if match.group()]
+
+
+def _units(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> List[tuple]:
+    """(text, tokens) units that each fit in max_tokens"""
+    units = []
+    for paragraph in _split(text, _PARAGRAPH_PATTERN):
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            units.append((paragraph, tokens))
+            continue
+        for line in _split(paragraph, _LINE_PATTERN):
+            tokens = count_tokens(line)
+            if tokens <= max_tokens:
+                units.append((line, tokens))
+                continue
+            for word in _split(line, _WORD_PATTERN):
+                tokens = count_tokens(word)
+                if tokens <= max_tokens:
+                    units.append((word, tokens))
+                    continue
+                # A single unbroken run longer than the budget: cut by characters
+                step = max(1, len(word) * max_tokens // tokens)
+                for start in range(0, len(word), step):
+                    piece = word[start:start + step]
+                    units.append((piece, count_tokens(piece)))
+    return units
+
+
+def _tail(text: str, budget: int, count_tokens: Callable[[str], int],
+          patterns=(_LINE_PATTERN, _WORD_PATTERN)) -> List[tuple]:
+    """Trailing (text, tokens) pieces of text within budget, split as finely as needed"""
+    tail: List[tuple] = []
+    used = 0
+    if not patterns or budget <= 0:
+        return tail
+    for part in reversed(_split(text, patterns[0])):
+        tokens = count_tokens(part)
+        if used + tokens > budget:
+            tail[:0] = _tail(part, budget - used, count_tokens, patterns[1:])
+            break
+        tail.insert(0, (part, tokens))
+        used += tokens
+    return tail
+
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 0,
+               count_tokens: Callable[[str], int] = estimate_tokens) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens tokens with overlap_tokens of overlap
+
+    Chunk token counts are the sums of their units' counts, which can differ
+    from counting the joined chunk by a token or so at unit boundaries.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    if not text:
+        return []
+
+    chunks = []
+    current: List[tuple] = []
+    current_tokens = 0
+    for unit in _units(text, max_tokens, count_tokens):
+        if current and current_tokens + unit[1] > max_tokens:
+            chunks.append("".join(part for part, _ in current))
+            # Carry the tail of the chunk over as overlap
+            carried: List[tuple] = []
+            carried_tokens = 0
+            budget = min(overlap_tokens, max_tokens - unit[1])
+            for part in reversed(current):
+                if carried_tokens + part[1] > budget:
+                    # Only part of this unit fits: carry its last lines or words
+                    tail = _tail(part[0], budget - carried_tokens, count_tokens)
+                    carried[:0] = tail
+                    carried_tokens += sum(tokens for _, tokens in tail)
+                    break
+                carried.insert(0, part)
+                carried_tokens += part[1]
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += unit[1]
+    if current:
+        chunks.append("".join(part for part, _ in current))
+    return chunks
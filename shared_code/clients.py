@@ -0,0 +1,180 @@
+"""
+Process-wide Azure service clients
+
+Each function app used to build a fresh AzureOpenAI / CosmosClient /
+BlobServiceClient on every invocation. The clients here are created lazily on
+first use and kept for the lifetime of the worker, so warm invocations reuse
+the same HTTP connection pools. A client is only rebuilt when the configuration
+it was created from changes.
+"""
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Set, Tuple
+
+from openai import AzureOpenAI
+
+from .settings import get_int_setting
+
+OPENAI_API_VERSION = "2024-02-01"
+
+# Size of the HTTP connection pool shared by the Cosmos and Blob clients
+DEFAULT_POOL_SIZE = 20
+
+_clients: Dict[str, Tuple[Tuple, Any]] = {}
+_client_stats = {"created": 0, "reused": 0}
+_lock = threading.Lock()
+
+# Blob containers known to exist for the current storage client
+_ensured_containers: Set[str] = set()
+
+
+def _get_or_create(name: str, config: Tuple, factory: Callable[[], Any]) -> Any:
+    """Return the cached client for name, rebuilding it if config changed"""
+    with _lock:
+        cached = _clients.get(name)
+        if cached is not None and cached[0] == config:
+            _client_stats["reused"] += 1
+            return cached[1]
+
+        if cached is not None:
+            logging.info(f"Configuration changed, rebuilding {name} client")
+        if name == "storage":
+            _ensured_containers.clear()
+        client = factory()
+        _clients[name] = (config, client)
+        _client_stats["created"] += 1
+        return client
+
+
+def _pool_size() -> int:
+    return get_int_setting("AZURE_CLIENT_POOL_SIZE", DEFAULT_POOL_SIZE)
+
+
+def _pooled_transport(pool_size: int):
+    """Build an azure-core transport backed by a keep-alive connection pool"""
+    import requests
+    from azure.core.pipeline.transport import RequestsTransport
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(session=session, session_owner=False)
+
+
+def get_openai_client() -> AzureOpenAI:
+    """Get the shared Azure OpenAI client"""
+    endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
+    api_key = os.environ.get("AZURE_OPENAI_KEY")
+
+    if not endpoint or not api_key:
+        raise ValueError("Azure OpenAI configuration missing")
+
+    return _get_or_create(
+        "openai",
+        (endpoint, api_key, OPENAI_API_VERSION),
+        lambda: AzureOpenAI(
+            azure_endpoint=endpoint,
+            api_key=api_key,
+            api_version=OPENAI_API_VERSION
+        )
+    )
+
+
+def get_cosmos_client():
+    """Get the shared Cosmos DB client"""
+    # Imported lazily: FillGrantForm must not load the Cosmos/Blob SDKs (GLIBC issues)
+    from azure.cosmos import CosmosClient
+
+    endpoint = os.environ.get("COSMOS_ENDPOINT")
+    key = os.environ.get("COSMOS_KEY")
+
+    if not endpoint or not key:
+        raise ValueError("Cosmos DB configuration missing")
+
+    pool_size = _pool_size()
+    return _get_or_create(
+        "cosmos",
+        (endpoint, key, pool_size),
+        lambda: CosmosClient(endpoint, key, transport=_pooled_transport(pool_size))
+    )
+
+
+def get_storage_client():
+    """Get the shared Blob Storage client"""
+    from azure.storage.blob import BlobServiceClient
+
+    connection_string = os.environ.get("AzureWebJobsStorage")
+    if not connection_string:
+        raise ValueError("Storage connection string missing")
+
+    pool_size = _pool_size()
+    return _get_or_create(
+        "storage",
+        (connection_string, pool_size),
+        lambda: BlobServiceClient.from_connection_string(
+            connection_string,
+            transport=_pooled_transport(pool_size)
+        )
+    )
+
+
+def get_queue_client(queue_name: str):
+    """Get a shared Storage queue client; messages are base64-encoded as queue triggers expect"""
+    from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+
+    connection_string = os.environ.get("AzureWebJobsStorage")
+    if not connection_string:
+        raise ValueError("Storage connection string missing")
+
+    return _get_or_create(
+        f"queue:{queue_name}",
+        (connection_string,),
+        lambda: QueueClient.from_connection_string(
+            connection_string,
+            queue_name,
+            message_encode_policy=TextBase64EncodePolicy()
+        )
+    )
+
+
+def get_blob_container_client(container_name: str):
+    """
+    Get a container client on the shared storage client, creating the container once per process
+
+    Later calls skip the create_container round trip entirely.
+    """
+    from azure.core.exceptions import ResourceExistsError
+
+    container_client = get_storage_client().get_container_client(container_name)
+    with _lock:
+        if container_name in _ensured_containers:
+            return container_client
+
+    try:
+        container_client.create_container()
+    except ResourceExistsError:
+        pass
+    with _lock:
+        _ensured_containers.add(container_name)
+    return container_client
+
+
+def get_client_stats() -> Dict[str, Any]:
+    """Return how many clients were created versus reused in this process"""
+    with _lock:
+        return {
+            "created": _client_stats["created"],
+            "reused": _client_stats["reused"],
+            "active_clients": sorted(_clients.keys())
+        }
+
+
+def reset_clients():
+    """Drop all cached clients and counters (used by tests)"""
+    with _lock:
+        _clients.clear()
+        _ensured_containers.clear()
+        _client_stats["created"] = 0
+        _client_stats["reused"] = 0
@@ -0,0 +1,66 @@
+"""
+Embedding helpers for grant retrieval
+
+Grants get an embedding when AnalyzeGrant stores them and documents when
+ProcessDocument does; GetMatches uses the document's embedding (or embeds the
+profile) at match time and retrieves the nearest grants.
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+DEFAULT_EMBEDDING_DEPLOYMENT = "text-embedding-ada-002"
+
+# Embedding models accept ~8k tokens; stay well below that in characters
+MAX_EMBEDDING_CHARS = 8000
+
+
+def get_embedding_deployment() -> str:
+    """Name of the Azure OpenAI embedding deployment"""
+    return os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", DEFAULT_EMBEDDING_DEPLOYMENT)
+
+
+def embed_text(client, text: str) -> List[float]:
+    """Embed a single text with the configured embedding deployment"""
+    response = client.embeddings.create(
+        model=get_embedding_deployment(),
+        input=text[:MAX_EMBEDDING_CHARS]
+    )
+    return list(response.data[0].embedding)
+
+
+def try_embed_text(client, text: str) -> Optional[List[float]]:
+    """Embed text, returning None instead of raising so callers can degrade gracefully"""
+    if not text:
+        return None
+    try:
+        return embed_text(client, text)
+    except Exception as e:
+        logging.warning(f"Embedding request failed: {str(e)}")
+        return None
+
+
+def grant_embedding_text(grant: Dict) -> str:
+    """Text representation of a grant record used for its embedding"""
+    analysis = grant.get("analysis") or {}
+    parts = [
+        grant.get("originalDescription", ""),
+        f"Organization Type: {grant.get('organizationType', 'Not specified')}",
+        f"Funding Amount: {grant.get('fundingAmount', 'Not specified')}",
+        f"Strategic Alignment: {json.dumps(analysis.get('strategicAlignment', []))}",
+        f"Eligibility: {json.dumps(analysis.get('eligibilityRequirements', []))}"
+    ]
+    return "\n".join(part for part in parts if part)
+
+
+def document_embedding_text(user_document: Dict) -> str:
+    """Text representation of an analyzed user document used as the match query"""
+    analysis = user_document.get("analysis") or {}
+    parts = [
+        analysis.get("summary", "") if isinstance(analysis.get("summary"), str) else "",
+        f"Document Type: {analysis.get('documentType', user_document.get('fileType', 'unknown'))}",
+        f"Key Entities: {json.dumps(analysis.get('keyEntities', []))}",
+        f"Requirements: {json.dumps(analysis.get('grantRequirements', []))}"
+    ]
+    return "\n".join(part for part in parts if part)
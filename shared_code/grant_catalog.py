@@ -0,0 +1,234 @@
+"""
+Warm, process-level catalog of active grants
+
+GetMatches used to run a cross-partition SELECT * over GrantOpportunities on
+every request. The catalog loads the active grants once per worker, keeps only
+the fields matching needs, and afterwards pulls just the records changed since
+the last ``_ts`` watermark. Refreshes are rate limited, so request-path RU cost
+and latency no longer grow with the size of the catalog.
+
+Only the very first load blocks requests. Later queries run outside the
+snapshot lock, one refresh at a time, and the periodic full reload runs on a
+background thread; requests keep reading the current snapshot until the new
+one is swapped in.
+
+App settings:
+    GRANT_CATALOG_REFRESH_SECONDS      minimum time between incremental refreshes (default 60)
+    GRANT_CATALOG_FULL_RELOAD_SECONDS  full reload interval, picks up deletes (default 3600)
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .settings import get_int_setting
+from .vector_index import create_vector_index
+
+DEFAULT_REFRESH_SECONDS = 60
+DEFAULT_FULL_RELOAD_SECONDS = 3600
+
+# Only the fields the matching path reads
+GRANT_PROJECTION = (
+    "c.id, c.originalDescription, c.fundingAmount, c.deadline, c.organizationType, "
+    "c.analysis.eligibilityRequirements AS eligibilityRequirements, "
+    "c.matchFeatures, c.analyzedAt, c.status, c.embedding, c._ts"
+)
+
+FULL_LOAD_QUERY = f"SELECT {GRANT_PROJECTION} FROM c WHERE c.status = 'active'"
+
+# Inactive grants are included so they can be dropped from the catalog
+INCREMENTAL_QUERY = f"SELECT {GRANT_PROJECTION} FROM c WHERE c._ts >= @since"
+
+
+def build_grant_index(grants: List[Dict], dimension: Optional[int] = None):
+    """
+    Build a vector index over the grants that carry an embedding
+
+    Only embeddings of the given dimension (or of the first embedding found)
+    are indexed so records from different embedding models never mix.
+    """
+    embedded = [g for g in grants if g.get("embedding")]
+    if dimension is None and embedded:
+        dimension = len(embedded[0]["embedding"])
+    embedded = [g for g in embedded if len(g["embedding"]) == dimension]
+
+    index = create_vector_index()
+    index.build([g["id"] for g in embedded], [g["embedding"] for g in embedded])
+    return index
+
+
+class GrantCatalog:
+    """
+    In-memory copy of the active grants, refreshed incrementally
+    """
+
+    def __init__(self, refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+                 full_reload_seconds: float = DEFAULT_FULL_RELOAD_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.version = 0
+        self._grants: Dict[str, Dict] = {}
+        self._watermark = 0
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+        self._index = None
+        self._index_version = -1
+        self._derived: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        # Held by whichever request (or background reload) is querying Cosmos
+        self._refresh_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at > 0
+
+    def refresh(self, container, force: bool = False):
+        """
+        Bring the catalog up to date if the refresh interval has passed
+
+        The first call runs a full load and blocks until it is done. Afterwards
+        only records whose _ts is at or after the watermark are queried, and
+        every full_reload_seconds a full reload is started in the background.
+        If another refresh is already running the call returns straight away
+        and the current snapshot keeps being served.
+        """
+        if not self.loaded:
+            with self._refresh_lock:
+                if not self.loaded:
+                    self._full_load(container)
+                    return
+
+        now = time.time()
+        if not force and now - self._refreshed_at < self.refresh_seconds:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+
+        if now - self._loaded_at >= self.full_reload_seconds:
+            # The thread owns _refresh_lock until the new snapshot is in place
+            self._reload_thread = threading.Thread(
+                target=self._background_reload, args=(container,), daemon=True)
+            self._reload_thread.start()
+            return
+
+        try:
+            self._incremental_load(container)
+        finally:
+            self._refresh_lock.release()
+
+    def wait_for_reload(self, timeout: Optional[float] = None):
+        """Wait for a background full reload to finish (used by tests)"""
+        thread = self._reload_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _background_reload(self, container):
+        try:
+            self._full_load(container)
+        except Exception as e:
+            logging.warning(f"Grant catalog reload failed, keeping current snapshot: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def _full_load(self, container):
+        since = self._watermark
+        grants = {}
+        watermark = 0
+        for grant in container.query_items(query=FULL_LOAD_QUERY, enable_cross_partition_query=True):
+            grants[grant["id"]] = grant
+            watermark = max(watermark, grant.get("_ts", 0))
+
+        if self.loaded:
+            # Records changed while the query was paging may be missing from
+            # the new snapshot; restarting from the previous watermark makes
+            # the next incremental refresh apply them again.
+            watermark = min(watermark, since)
+
+        now = time.time()
+        with self._lock:
+            self._grants = grants
+            self._watermark = watermark
+            self._loaded_at = now
+            self._refreshed_at = now
+            self.version += 1
+        logging.info(f"Grant catalog loaded: {len(grants)} active grants")
+
+    def _incremental_load(self, container):
+        changed = list(container.query_items(
+            query=INCREMENTAL_QUERY,
+            parameters=[{"name": "@since", "value": self._watermark}],
+            enable_cross_partition_query=True
+        ))
+
+        with self._lock:
+            for grant in changed:
+                self._watermark = max(self._watermark, grant.get("_ts", 0))
+                if grant.get("status") == "active":
+                    self._grants[grant["id"]] = grant
+                else:
+                    self._grants.pop(grant["id"], None)
+            self._refreshed_at = time.time()
+            if changed:
+                self.version += 1
+        if changed:
+            logging.info(f"Grant catalog refreshed: {len(changed)} changed grants")
+
+    def grants(self) -> List[Dict]:
+        """Snapshot of the active grants, oldest first"""
+        with self._lock:
+            return sorted(self._grants.values(), key=lambda g: (g.get("_ts", 0), g["id"]))
+
+    def vector_index(self, dimension: Optional[int] = None):
+        """Vector index over the catalog, rebuilt only when the catalog has changed"""
+        with self._lock:
+            if self._index is None or self._index_version != self.version or (
+                    dimension is not None and getattr(self._index, "dimension", dimension) != dimension):
+                grants = list(self._grants.values())
+                self._index = build_grant_index(grants, dimension)
+                self._index_version = self.version
+            return self._index
+
+    def derived(self, name: str, builder: Callable[[List[Dict]], Any]) -> Any:
+        """
+        Value computed from the grant snapshot, cached until the catalog changes
+
+        builder receives the same ordering as grants(), so column-oriented views
+        (e.g. parsed match features) line up with it.
+        """
+        with self._lock:
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == self.version:
+                return cached[1]
+            version = self.version
+            grants = sorted(self._grants.values(), key=lambda g: (g.get("_ts", 0), g["id"]))
+        value = builder(grants)
+        with self._lock:
+            self._derived[name] = (version, value)
+        return value
+
+    def __len__(self):
+        return len(self._grants)
+
+
+_catalog: Optional[GrantCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_grant_catalog() -> GrantCatalog:
+    """Get the process-wide grant catalog"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = GrantCatalog(
+                get_int_setting("GRANT_CATALOG_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS),
+                get_int_setting("GRANT_CATALOG_FULL_RELOAD_SECONDS", DEFAULT_FULL_RELOAD_SECONDS)
+            )
+        return _catalog
+
+
+def reset_grant_catalog():
+    """Drop the process-wide catalog (used by tests)"""
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
@@ -0,0 +1,426 @@
+"""
+Deterministic pre-filter and lexical scoring of grants
+
+Before anything reaches the LLM, grants that are obviously ineligible (deadline
+passed, wrong organization type, funding far from the applicant's budget) are
+dropped and the rest ranked with BM25 against the applicant profile. Free-text
+deadlines, amounts and organization types are parsed once per catalog version
+into NumPy arrays, so filtering and scoring a request is a handful of vector
+operations.
+
+AnalyzeGrant stores the same features on each record (``matchFeatures``) when
+it writes it, so the catalog only falls back to parsing for records written
+before that, or with an older MATCH_FEATURES_VERSION.
+"""
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# A grant is "far" from the applicant's budget if the budget is more than this
+# factor above the grant's maximum or below its minimum
+FUNDING_TOLERANCE = 3.0
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "will", "have", "has",
+    "not", "but", "all", "any", "can", "our", "their", "its", "into", "who", "which", "such",
+    "must", "may", "per", "each", "other", "than", "more", "been", "also", "they", "you", "your",
+    "specified", "none", "n/a"
+}
+
+# Canonical organization types and the phrases that map to them
+ORGANIZATION_TYPE_ALIASES = {
+    "nonprofit": ["nonprofit", "non-profit", "non profit", "ngo", "charity", "charities", "charitable",
+                  "501(c)(3)", "501c3", "foundation"],
+    "university": ["university", "universities", "college", "academic", "higher education", "research institution"],
+    "government": ["government", "municipal", "municipality", "municipalities", "public agency", "state agency",
+                   "tribal", "city", "cities", "county", "counties"],
+    "business": ["business", "company", "companies", "for-profit", "for profit", "startup", "small business", "sme",
+                 "enterprise"],
+    "school": ["school", "k-12", "school district"],
+    "individual": ["individual", "researcher", "artist", "fellow", "student"]
+}
+
+# Phrases meaning any applicant may apply ("Open to all", "Any eligible entity");
+# "Open to all nonprofits" is not one of them
+_WILDCARD_ORGANIZATION_TYPE_PATTERN = re.compile(
+    r"^(?:any|all|open|various|none|n/?a|not specified|unspecified|unrestricted)?[.!]?$"
+    r"|\b(?:any|all)\s+(?:eligible\s+|legal\s+|types?\s+of\s+)?"
+    r"(?:entit(?:y|ies)|organi[sz]ations?(?:\s+types?)?|applicants?|sectors?)\b"
+    r"|\bopen\s+to\s+(?:all|any|everyone|anyone)\s*[.!]?$"
+    r"|\b(?:everyone|anyone)\b"
+    r"|\bno\s+(?:eligibility\s+)?restrictions?\b"
+)
+
+CANONICAL_ORGANIZATION_TYPES = frozenset(ORGANIZATION_TYPE_ALIASES)
+
+# Phrases rewritten before alias matching; "not-for-profit" contains the
+# business alias "for-profit"
+_NOT_FOR_PROFIT_PATTERN = re.compile(r"\bnot[\s-]*for[\s-]*profit")
+# Whole-word alias matches (plural "s"/"es" allowed), so "sme" does not match "smelting"
+_ORGANIZATION_TYPE_PATTERNS = {
+    code: re.compile("|".join(rf"(?<![a-z0-9]){re.escape(alias)}(?:s|es)?(?![a-z0-9])" for alias in aliases))
+    for code, aliases in ORGANIZATION_TYPE_ALIASES.items()
+}
+
+DATE_FORMATS = (
+    "%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%d.%m.%Y", "%B %d, %Y", "%b %d, %Y",
+    "%d %B %Y", "%d %b %Y", "%B %d %Y", "%b %d %Y"
+)
+
+_AMOUNT_PATTERN = re.compile(r"\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|m|million|thousand|b|billion)?\b", re.IGNORECASE)
+_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "million": 1e6, "b": 1e9, "billion": 1e9}
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Bump when parsing or tokenization changes so stored features are recomputed
+# (2: whole-word organization type matching; version 1 stored "not-for-profit" as business)
+# (3: unrecognized organization types are unknown instead of slug codes)
+MATCH_FEATURES_VERSION = 3
+
+# Eligibility digest sent to the LLM instead of the full requirements JSON
+DIGEST_MAX_REQUIREMENTS = 8
+DIGEST_MAX_REQUIREMENT_CHARS = 160
+
+
+def parse_deadline(value) -> Optional[date]:
+    """Parse a free-text deadline into a date, or None if unknown"""
+    if not value or not isinstance(value, str):
+        return None
+    text = value.strip()
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date()
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    # Last resort: an ISO date embedded in longer text ("Applications due 2025-03-15")
+    match = re.search(r"\d{4}-\d{2}-\d{2}", text)
+    if match:
+        try:
+            return datetime.strptime(match.group(0), "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    return None
+
+
+def parse_funding_range(value) -> Tuple[Optional[float], Optional[float]]:
+    """Parse "$50,000", "$10k-$25k" or "up to $1.5M" into (min, max) dollars"""
+    if value is None:
+        return None, None
+    if isinstance(value, (int, float)):
+        return float(value), float(value)
+
+    amounts = []
+    for number, suffix in _AMOUNT_PATTERN.findall(str(value)):
+        try:
+            amount = float(number.replace(",", ""))
+        except ValueError:
+            continue
+        amount *= _MULTIPLIERS.get(suffix.lower(), 1) if suffix else 1
+        amounts.append(amount)
+
+    # Ignore stray small numbers such as "3 years" when real amounts are present
+    significant = [a for a in amounts if a >= 100] or amounts
+    if not significant:
+        return None, None
+    if re.search(r"\bup to\b|\bmax(imum)?\b", str(value), re.IGNORECASE) and len(significant) == 1:
+        return 0.0, significant[0]
+    return min(significant), max(significant)
+
+
+def normalize_organization_types(value) -> Set[str]:
+    """
+    Map free-text organization types to canonical codes; empty set means any type
+
+    Text that names no known type ("Community-based organizations") is
+    treated as unknown rather than as a type no applicant can match.
+    """
+    if value is None:
+        return set()
+    if isinstance(value, (list, tuple, set)):
+        text = " ".join(str(v) for v in value)
+    else:
+        text = str(value)
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    if _WILDCARD_ORGANIZATION_TYPE_PATTERN.search(text):
+        return set()
+
+    text = _NOT_FOR_PROFIT_PATTERN.sub("nonprofit", text)
+    codes = set()
+    for code, pattern in _ORGANIZATION_TYPE_PATTERNS.items():
+        if pattern.search(text):
+            codes.add(code)
+    return codes
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens for lexical scoring"""
+    return [t for t in _TOKEN_PATTERN.findall((text or "").lower()) if len(t) > 2 and t not in STOPWORDS]
+
+
+def grant_search_text(grant: Dict) -> str:
+    """Text of a grant used for lexical scoring"""
+    requirements = grant.get("eligibilityRequirements")
+    if requirements is None:
+        requirements = (grant.get("analysis") or {}).get("eligibilityRequirements", [])
+    if isinstance(requirements, (list, tuple)):
+        requirements = " ".join(str(r) for r in requirements)
+    return f"{grant.get('originalDescription', '')} {grant.get('organizationType', '')} {requirements or ''}"
+
+
+def eligibility_digest(requirements) -> str:
+    """
+    Compact, deduplicated summary of eligibility requirements for prompts
+    """
+    if not requirements:
+        return ""
+    if not isinstance(requirements, (list, tuple)):
+        requirements = [requirements]
+    items = []
+    for requirement in requirements:
+        text = requirement if isinstance(requirement, str) else json.dumps(requirement, sort_keys=True)
+        text = re.sub(r"\s+", " ", text).strip()
+        if len(text) > DIGEST_MAX_REQUIREMENT_CHARS:
+            text = text[:DIGEST_MAX_REQUIREMENT_CHARS - 3].rstrip() + "..."
+        if text and text.lower() not in (item.lower() for item in items):
+            items.append(text)
+    digest = "; ".join(items[:DIGEST_MAX_REQUIREMENTS])
+    if len(items) > DIGEST_MAX_REQUIREMENTS:
+        digest += f" (+{len(items) - DIGEST_MAX_REQUIREMENTS} more)"
+    return digest
+
+
+def compute_match_features(grant: Dict) -> Dict:
+    """
+    Normalized match features of a grant record, as stored in ``matchFeatures``
+
+    Deadline as an ISO date, funding range in dollars, canonical organization
+    type codes, lexical term counts and the eligibility digest. Unknown values
+    are None (or empty), which the filters treat as "keep".
+    """
+    deadline = parse_deadline(grant.get("deadline"))
+    low, high = parse_funding_range(grant.get("fundingAmount"))
+    requirements = grant.get("eligibilityRequirements")
+    if requirements is None:
+        requirements = (grant.get("analysis") or {}).get("eligibilityRequirements", [])
+    return {
+        "version": MATCH_FEATURES_VERSION,
+        "deadline": deadline.isoformat() if deadline else None,
+        "fundingMin": low,
+        "fundingMax": high,
+        "organizationTypes": sorted(normalize_organization_types(grant.get("organizationType"))),
+        "terms": dict(Counter(tokenize(grant_search_text(grant)))),
+        "eligibilityDigest": eligibility_digest(requirements)
+    }
+
+
+def stored_match_features(grant: Dict) -> Optional[Dict]:
+    """The record's stored features if they are of the current version"""
+    features = grant.get("matchFeatures")
+    if isinstance(features, dict) and features.get("version") == MATCH_FEATURES_VERSION:
+        return features
+    return None
+
+
+def grant_eligibility_digest(grant: Dict) -> str:
+    """Eligibility digest of a grant, from its stored features when available"""
+    features = stored_match_features(grant)
+    if features is not None:
+        return features.get("eligibilityDigest") or ""
+    requirements = grant.get("eligibilityRequirements")
+    if requirements is None:
+        requirements = (grant.get("analysis") or {}).get("eligibilityRequirements", [])
+    return eligibility_digest(requirements)
+
+
+class GrantFeatures:
+    """
+    Typed, column-oriented match features for a list of grants
+
+    Built from the features stored on each record; records without current
+    stored features are parsed here instead.
+    """
+
+    def __init__(self, grants: List[Dict]):
+        self.grants = list(grants)
+        count = len(self.grants)
+
+        self.deadlines = np.full(count, np.nan)
+        self.funding_min = np.full(count, np.nan)
+        self.funding_max = np.full(count, np.nan)
+        self.organization_types: List[Set[str]] = []
+        self.eligibility_digests: List[str] = []
+        self.computed = 0
+
+        postings = defaultdict(list)
+        self.doc_lengths = np.zeros(count)
+
+        for i, grant in enumerate(self.grants):
+            features = stored_match_features(grant)
+            if features is None:
+                features = compute_match_features(grant)
+                self.computed += 1
+
+            if features.get("deadline"):
+                self.deadlines[i] = date.fromisoformat(features["deadline"]).toordinal()
+
+            if features.get("fundingMin") is not None and features.get("fundingMax") is not None:
+                self.funding_min[i] = features["fundingMin"]
+                self.funding_max[i] = features["fundingMax"]
+
+            # Only canonical codes restrict eligibility; anything else is unknown
+            self.organization_types.append(set(features.get("organizationTypes") or []) & CANONICAL_ORGANIZATION_TYPES)
+            self.eligibility_digests.append(features.get("eligibilityDigest") or "")
+
+            terms = features.get("terms") or {}
+            self.doc_lengths[i] = sum(terms.values())
+            for term, tf in terms.items():
+                postings[term].append((i, tf))
+
+        self.avg_doc_length = float(self.doc_lengths.mean()) if count and self.doc_lengths.sum() else 1.0
+        self._postings = {
+            term: (np.array([i for i, _ in entries], dtype=np.int64), np.array([tf for _, tf in entries], dtype=np.float64))
+            for term, entries in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.grants)
+
+    def eligibility_mask(self, organization_type: Optional[str] = None, budget: Optional[float] = None,
+                         today: Optional[date] = None) -> np.ndarray:
+        """Boolean mask of grants that pass the hard eligibility rules"""
+        today = today or datetime.utcnow().date()
+        mask = np.ones(len(self), dtype=bool)
+
+        # Deadline already passed (unknown deadlines are kept)
+        mask &= ~(self.deadlines < today.toordinal())
+
+        applicant_types = normalize_organization_types(organization_type)
+        if applicant_types:
+            type_ok = np.array([not types or bool(types & applicant_types) for types in self.organization_types], dtype=bool)
+            mask &= type_ok
+
+        if budget:
+            too_large = budget > self.funding_max * FUNDING_TOLERANCE
+            too_small = budget < self.funding_min / FUNDING_TOLERANCE
+            # Comparisons with NaN are False, so unknown amounts are kept
+            mask &= ~(too_large | too_small)
+
+        return mask
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        """BM25 relevance of every grant to the query text"""
+        scores = np.zeros(len(self))
+        if not len(self):
+            return scores
+
+        count = len(self)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tfs = posting
+            idf = math.log(1 + (count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_ids] / self.avg_doc_length)
+            scores[doc_ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        return scores
+
+    def matched_terms(self, index: int, query: str, limit: int = 5) -> List[str]:
+        """Query terms that occur in the grant at index"""
+        terms = []
+        for term in dict.fromkeys(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None and index in posting[0]:
+                terms.append(term)
+                if len(terms) == limit:
+                    break
+        return terms
+
+
+def rank_grants(features: GrantFeatures, query: str, organization_type: Optional[str] = None,
+                budget: Optional[float] = None, today: Optional[date] = None) -> List[Tuple[int, float]]:
+    """
+    Filter grants by eligibility and rank survivors by BM25
+
+    Returns (grant index, relevance 0-100) pairs, best first. Relevance is
+    BM25 scaled by the best score in this request.
+    """
+    mask = features.eligibility_mask(organization_type, budget, today)
+    scores = features.bm25_scores(query)
+    survivors = np.flatnonzero(mask)
+    if not len(survivors):
+        return []
+
+    order = survivors[np.argsort(-scores[survivors], kind="stable")]
+    best = scores[order[0]]
+    return [(int(i), round(float(scores[i] / best * 100), 1) if best > 0 else 0.0) for i in order]
+
+
+def build_fast_match(features: GrantFeatures, index: int, relevance: float, query: str,
+                     organization_type: Optional[str] = None, budget: Optional[float] = None,
+                     similarity: Optional[float] = None) -> Dict:
+    """
+    Build a match entry without the LLM from the rule-based signals
+    """
+    grant = features.grants[index]
+    score = relevance if similarity is None else 0.5 * relevance + 50 * max(similarity, 0.0)
+    score = int(round(min(score, 100)))
+
+    strengths = []
+    gaps = []
+    terms = features.matched_terms(index, query)
+    if terms:
+        strengths.append(f"Keyword overlap: {', '.join(terms)}")
+    else:
+        gaps.append("Little keyword overlap with the applicant profile")
+
+    grant_types = features.organization_types[index]
+    if not grant_types:
+        strengths.append("Open to all organization types")
+    elif normalize_organization_types(organization_type) & grant_types:
+        strengths.append("Organization type eligible")
+
+    if not np.isnan(features.deadlines[index]):
+        strengths.append(f"Deadline open until {date.fromordinal(int(features.deadlines[index])).isoformat()}")
+    else:
+        gaps.append("Deadline not specified")
+
+    if budget and not np.isnan(features.funding_max[index]):
+        if features.funding_min[index] <= budget <= features.funding_max[index]:
+            strengths.append("Requested budget within funding range")
+        else:
+            gaps.append("Requested budget outside the stated funding range")
+
+    return {
+        "grantId": grant["id"],
+        "matchScore": score,
+        "reasoning": "Rule-based ranking from eligibility filters and keyword relevance (no LLM analysis)",
+        "strengths": strengths,
+        "gaps": gaps,
+        "recommendations": ["Request a full analysis for detailed recommendations"],
+        "priority": "high" if score >= 70 else "medium" if score >= 40 else "low"
+    }
+
+
+def profile_query_text(values: Iterable) -> str:
+    """Join the applicant profile pieces used as the lexical query"""
+    parts = []
+    for value in values:
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            parts.extend(str(v) for v in value)
+        else:
+            parts.append(str(value))
+    return " ".join(parts)
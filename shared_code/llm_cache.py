@@ -0,0 +1,323 @@
+"""
+Content-addressed cache for Azure OpenAI chat completions
+
+Completions are keyed by a SHA-256 of (deployment, messages, temperature,
+max_tokens and request options such as response_format), so identical prompts - a re-uploaded document, a repeated match
+run - are answered without another OpenAI round trip. Lookups go through an
+in-memory LRU tier first and then an optional persistent tier (local SQLite
+file or a Cosmos DB container).
+
+App settings:
+    LLM_CACHE_ENABLED          "false" disables caching entirely (default true)
+    LLM_CACHE_MAX_ENTRIES      in-memory LRU size (default 512)
+    LLM_CACHE_TTL_SECONDS      entry lifetime for both tiers (default 86400)
+    LLM_CACHE_SQLITE_PATH      enable the SQLite tier at this path
+    LLM_CACHE_COSMOS_CONTAINER enable the Cosmos tier using this container
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from .model_router import get_route_metrics
+from .settings import get_bool_setting, get_int_setting
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+# OpenAI call options that only affect how the request is sent, not the completion
+TRANSPORT_OPTIONS = ("timeout", "extra_headers", "extra_query")
+
+
+def make_cache_key(deployment: str, messages: List[Dict[str, str]], temperature: float,
+                   max_tokens: Optional[int], options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Hash everything that determines a completion into a stable cache key
+
+    options are the other request-shaping arguments (response_format, tools,
+    seed, ...); without any, keys match those of plain requests.
+    """
+    payload = {
+        "deployment": deployment,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if options:
+        payload["options"] = options
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+                          .encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """
+    Thread-safe in-memory LRU with a per-entry TTL
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheStore:
+    """
+    Persistent cache tier backed by a local SQLite file
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return row[0]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_seconds)
+            )
+            self._conn.commit()
+
+
+class CosmosCacheStore:
+    """
+    Persistent cache tier backed by a Cosmos DB container partitioned on /id
+
+    Items carry a Cosmos ``ttl`` so expired entries are purged server-side when
+    the container has time-to-live enabled; expiry is also checked on read.
+    """
+
+    def __init__(self, container, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.container = container
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            item = self.container.read_item(item=key, partition_key=key)
+        except Exception:
+            return None
+        if item.get("expiresAt", 0) < time.time():
+            return None
+        return item.get("value")
+
+    def set(self, key: str, value: str):
+        self.container.upsert_item({
+            "id": key,
+            "value": value,
+            "expiresAt": time.time() + self.ttl_seconds,
+            "ttl": int(self.ttl_seconds)
+        })
+
+
+class LLMCache:
+    """
+    Two-tier completion cache with hit/miss counters
+    """
+
+    def __init__(self, memory: MemoryCache, persistent=None, enabled: bool = True):
+        self.memory = memory
+        self.persistent = persistent
+        self.enabled = enabled
+        self._stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0, "bypassed": 0,
+                       "rejected": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.persistent is not None:
+            try:
+                value = self.persistent.get(key)
+            except Exception as e:
+                logging.warning(f"Persistent LLM cache read failed: {str(e)}")
+                value = None
+            if value is not None:
+                self._count("persistent_hits")
+                self.memory.set(key, value)
+                return value
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value)
+            except Exception as e:
+                logging.warning(f"Persistent LLM cache write failed: {str(e)}")
+        self._count("stores")
+
+    def record_bypass(self):
+        self._count("bypassed")
+
+    def record_rejected(self):
+        """A cached value failed the caller's validation and was not used"""
+        self._count("rejected")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["persistent_hits"]) / lookups, 3) if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def _build_persistent_store(ttl_seconds: float):
+    sqlite_path = os.environ.get("LLM_CACHE_SQLITE_PATH")
+    if sqlite_path:
+        return SQLiteCacheStore(sqlite_path, ttl_seconds)
+
+    container_name = os.environ.get("LLM_CACHE_COSMOS_CONTAINER")
+    if container_name:
+        from .clients import get_cosmos_client
+        database_name = os.environ.get("COSMOS_DATABASE_NAME", "GrantAnalysis")
+        database = get_cosmos_client().get_database_client(database_name)
+        return CosmosCacheStore(database.get_container_client(container_name), ttl_seconds)
+
+    return None
+
+
+def get_llm_cache() -> LLMCache:
+    """Get the process-wide completion cache, configured from app settings"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            ttl_seconds = get_int_setting("LLM_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+            memory = MemoryCache(get_int_setting("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES), ttl_seconds)
+            try:
+                persistent = _build_persistent_store(ttl_seconds)
+            except Exception as e:
+                logging.warning(f"Persistent LLM cache unavailable, using memory only: {str(e)}")
+                persistent = None
+            _cache = LLMCache(memory, persistent, get_bool_setting("LLM_CACHE_ENABLED", True))
+        return _cache
+
+
+def reset_llm_cache():
+    """Drop the process-wide cache so it is rebuilt from settings (used by tests)"""
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def is_json_response(content: str) -> bool:
+    """Cache validator accepting only responses that parse as JSON"""
+    try:
+        json.loads(content)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def cached_chat_completion(client, model: str, messages: List[Dict[str, str]], temperature: float,
+                           max_tokens: Optional[int] = None, use_cache: bool = True,
+                           validate: Optional[Callable[[str], bool]] = None, route: Optional[str] = None,
+                           **kwargs) -> str:
+    """
+    Return the message content of a chat completion, served from cache when possible
+
+    Extra keyword arguments are passed to the OpenAI call; those that shape the
+    completion (``response_format``, ``tools``, ``seed``, ...) are part of the
+    cache key, transport options (``timeout``, extra headers) are not. Pass
+    ``use_cache=False`` to bypass the cache for one request; the fresh result
+    is still stored for later callers. If ``validate`` is given, only content it
+    accepts is stored or served from the cache, so a malformed completion (or
+    one stored under an older format) is not replayed. With ``route``, the
+    call's latency, token usage and cache hits are recorded for that model route.
+    """
+    cache = get_llm_cache()
+    options = {name: value for name, value in kwargs.items() if name not in TRANSPORT_OPTIONS}
+    key = make_cache_key(model, messages, temperature, max_tokens, options)
+
+    if cache.enabled and use_cache:
+        cached = cache.get(key)
+        if cached is not None and validate is not None and not validate(cached):
+            cache.record_rejected()
+            cached = None
+        if cached is not None:
+            if route:
+                get_route_metrics().record_cache_hit(route, model)
+            return cached
+    elif cache.enabled:
+        cache.record_bypass()
+
+    request = {"model": model, "messages": messages, "temperature": temperature, **kwargs}
+    if max_tokens is not None:
+        request["max_tokens"] = max_tokens
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(**request)
+    except Exception:
+        if route:
+            get_route_metrics().record_error(route, model)
+        raise
+    if route:
+        get_route_metrics().record_call(route, model, time.perf_counter() - started, getattr(response, "usage", None))
+    content = response.choices[0].message.content
+
+    if cache.enabled and content and (validate is None or validate(content)):
+        cache.set(key, content)
+    return content
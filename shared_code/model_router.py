@@ -0,0 +1,168 @@
+"""
+Routing of LLM tasks to deployment tiers, with per-route usage metrics
+
+Each kind of LLM task has a route: a deployment tier ("fast" or "quality")
+and a completion token budget. Tiers map to Azure OpenAI deployments, so
+cheap, latency-sensitive work (short form fields, document classification)
+can run on a small deployment while grant analysis and match scoring use a
+stronger one. Every completion records its route's latency, token usage and
+cache hits, so the table can be tuned from data.
+
+App settings:
+    MODEL_DEPLOYMENT_FAST               deployment of the "fast" tier
+    MODEL_DEPLOYMENT_QUALITY            deployment of the "quality" tier
+                                        (both default to AZURE_OPENAI_DEPLOYMENT_NAME)
+    MODEL_ROUTE_<ROUTE>_TIER            tier of one route, e.g. MODEL_ROUTE_SHORT_FIELD_TIER
+    MODEL_ROUTE_<ROUTE>_DEPLOYMENT      deployment of one route (overrides its tier)
+    MODEL_ROUTE_<ROUTE>_MAX_TOKENS      completion token budget of one route
+"""
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+from .settings import get_int_setting
+
+DEFAULT_DEPLOYMENT = "gpt-35-turbo"
+TIERS = ("fast", "quality")
+
+# Latency samples kept per route for percentiles
+LATENCY_WINDOW = 256
+
+# route: (tier, max_tokens)
+ROUTES = {
+    "document_analysis": ("fast", 1000),
+    "grant_analysis": ("quality", 1500),
+    "match_scoring": ("quality", 2000),
+    "profile_extraction": ("fast", 500),
+    "short_field": ("fast", 150),
+    "long_field": ("quality", 900)
+}
+
+
+class Route:
+    """
+    Resolved route: where a task goes and how many tokens it may generate
+    """
+
+    def __init__(self, name: str, tier: str, deployment: str, max_tokens: int):
+        self.name = name
+        self.tier = tier
+        self.deployment = deployment
+        self.max_tokens = max_tokens
+
+    def __repr__(self):
+        return f"Route({self.name!r}, tier={self.tier!r}, deployment={self.deployment!r}, max_tokens={self.max_tokens})"
+
+
+def get_tier_deployment(tier: str) -> str:
+    """Deployment serving a tier"""
+    default = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", DEFAULT_DEPLOYMENT)
+    return os.environ.get(f"MODEL_DEPLOYMENT_{tier.upper()}") or default
+
+
+def get_route(name: str) -> Route:
+    """
+    Resolve a route from the defaults and app settings
+
+    Settings are read on every call, so a changed app setting applies to the
+    next request without a restart.
+    """
+    if name not in ROUTES:
+        raise ValueError(f"Unknown model route: {name}")
+    tier, max_tokens = ROUTES[name]
+    prefix = f"MODEL_ROUTE_{name.upper()}"
+
+    configured_tier = (os.environ.get(f"{prefix}_TIER") or tier).lower()
+    if configured_tier not in TIERS:
+        logging.warning(f"Invalid tier for {prefix}_TIER: {configured_tier!r}, using {tier}")
+        configured_tier = tier
+    deployment = os.environ.get(f"{prefix}_DEPLOYMENT") or get_tier_deployment(configured_tier)
+    max_tokens = max(1, get_int_setting(f"{prefix}_MAX_TOKENS", max_tokens))
+    return Route(name, configured_tier, deployment, max_tokens)
+
+
+def _usage_value(usage, name: str) -> int:
+    value = getattr(usage, name, None)
+    return value if isinstance(value, int) else 0
+
+
+class RouteMetrics:
+    """
+    Thread-safe per-route counters of calls, cache hits, errors, latency and tokens
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._routes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, route: str, deployment: str) -> Dict[str, Any]:
+        entry = self._routes.get(route)
+        if entry is None:
+            entry = {
+                "deployments": set(), "calls": 0, "cache_hits": 0, "errors": 0, "latency_seconds": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0, "latencies": deque(maxlen=self.window)
+            }
+            self._routes[route] = entry
+        entry["deployments"].add(deployment)
+        return entry
+
+    def record_call(self, route: str, deployment: str, latency: float, usage=None):
+        """Record one OpenAI round trip and its token usage"""
+        with self._lock:
+            entry = self._entry(route, deployment)
+            entry["calls"] += 1
+            entry["latency_seconds"] += latency
+            entry["latencies"].append(latency)
+            entry["prompt_tokens"] += _usage_value(usage, "prompt_tokens")
+            entry["completion_tokens"] += _usage_value(usage, "completion_tokens")
+
+    def record_cache_hit(self, route: str, deployment: str):
+        with self._lock:
+            self._entry(route, deployment)["cache_hits"] += 1
+
+    def record_error(self, route: str, deployment: str):
+        with self._lock:
+            self._entry(route, deployment)["errors"] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-route totals with mean, p50 and p95 latency of recent calls"""
+        with self._lock:
+            snapshot = {name: dict(entry, latencies=sorted(entry["latencies"]),
+                                   deployments=sorted(entry["deployments"]))
+                        for name, entry in self._routes.items()}
+        stats = {}
+        for name, entry in snapshot.items():
+            latencies = entry.pop("latencies")
+            calls = entry["calls"]
+            entry["latency_seconds"] = round(entry["latency_seconds"], 3)
+            entry["mean_latency_seconds"] = round(entry["latency_seconds"] / calls, 3) if calls else None
+            entry["p50_latency_seconds"] = round(latencies[len(latencies) // 2], 3) if latencies else None
+            entry["p95_latency_seconds"] = (round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+                                            if latencies else None)
+            entry["mean_completion_tokens"] = round(entry["completion_tokens"] / calls, 1) if calls else None
+            stats[name] = entry
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+_metrics = RouteMetrics()
+
+
+def get_route_metrics() -> RouteMetrics:
+    """Process-wide per-route metrics"""
+    return _metrics
+
+
+def get_route_stats() -> Dict[str, Dict[str, Any]]:
+    return _metrics.stats()
+
+
+def reset_route_metrics():
+    """Forget recorded metrics (used by tests)"""
+    _metrics.clear()
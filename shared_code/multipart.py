@@ -0,0 +1,75 @@
+"""
+Minimal multipart/form-data parsing for HTTP-triggered functions
+
+Azure Functions hands the whole request body over as bytes. Parts are sliced
+straight out of that buffer, so an uploaded file is copied once instead of
+going through base64 text inside a JSON document.
+"""
+from email.message import Message
+from typing import Any, Dict, Optional
+
+
+def _header_param(header_name: str, header_value: str, param: str) -> Optional[str]:
+    message = Message()
+    message[header_name] = header_value
+    value = message.get_param(param, header=header_name)
+    return str(value) if value is not None else None
+
+
+def get_multipart_boundary(content_type: str) -> Optional[str]:
+    """Boundary of a multipart/form-data Content-Type header, or None"""
+    if not content_type or not content_type.lower().startswith("multipart/form-data"):
+        return None
+    return _header_param("content-type", content_type, "boundary")
+
+
+def parse_multipart_form(body: bytes, content_type: str) -> Dict[str, Any]:
+    """
+    Parse a multipart/form-data body into {field name: value}
+
+    File parts (those with a filename) and parts with a non-text content type
+    are returned as bytes; plain form fields are decoded as UTF-8 text. Raises
+    ValueError if the body is not well-formed multipart.
+    """
+    boundary = get_multipart_boundary(content_type)
+    if not boundary:
+        raise ValueError("Content-Type is not multipart/form-data with a boundary")
+
+    delimiter = b"--" + boundary.encode("latin-1")
+    fields: Dict[str, Any] = {}
+
+    position = body.find(delimiter)
+    if position < 0:
+        raise ValueError("Multipart boundary not found in body")
+
+    while True:
+        start = position + len(delimiter)
+        if body[start:start + 2] == b"--":
+            break
+        header_end = body.find(b"\r\n\r\n", start)
+        if header_end < 0:
+            raise ValueError("Malformed multipart part headers")
+        next_position = body.find(b"\r\n" + delimiter, header_end)
+        if next_position < 0:
+            raise ValueError("Unterminated multipart part")
+
+        headers = {}
+        for line in body[start:header_end].decode("utf-8", errors="replace").split("\r\n"):
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+
+        disposition = headers.get("content-disposition", "")
+        name = _header_param("content-disposition", disposition, "name")
+        if name:
+            content = body[header_end + 4:next_position]
+            filename = _header_param("content-disposition", disposition, "filename")
+            part_type = headers.get("content-type", "text/plain").lower()
+            if filename is None and part_type.startswith("text/"):
+                fields[name] = content.decode("utf-8")
+            else:
+                fields[name] = content
+
+        position = next_position + 2
+
+    return fields
@@ -0,0 +1,39 @@
+"""
+Token-bucket rate limiting for bulk work against throttled services
+
+Bulk ingestion paces its Azure OpenAI calls so a large import runs at a
+steady, configured rate instead of bursting into 429 responses.
+"""
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: rate_per_second sustained, up to burst at once
+    """
+
+    def __init__(self, rate_per_second: float, burst: Optional[int] = None):
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be positive")
+        self.rate_per_second = rate_per_second
+        self.burst = max(1, burst if burst is not None else int(rate_per_second) or 1)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the time waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate_per_second
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,37 @@
+"""
+Helpers for reading numeric and boolean app settings
+"""
+import logging
+import os
+
+
+def get_int_setting(name: str, default: int) -> int:
+    """Read an integer app setting, falling back to default if unset or invalid"""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logging.warning(f"Invalid integer for {name}: {value!r}, using {default}")
+        return default
+
+
+def get_float_setting(name: str, default: float) -> float:
+    """Read a float app setting, falling back to default if unset or invalid"""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logging.warning(f"Invalid number for {name}: {value!r}, using {default}")
+        return default
+
+
+def get_bool_setting(name: str, default: bool) -> bool:
+    """Read a boolean app setting ("1", "true", "yes" are truthy)"""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,378 @@
+"""
+Schema-validated JSON completions with local repair and targeted re-asks
+
+Every endpoint that expects JSON from the model goes through
+structured_completion with its own schema (a small JSON Schema subset: type,
+properties, required, items, enum, minimum, maximum, default). A completion
+that is not clean JSON is repaired locally before anything is thrown away:
+markdown code fences and surrounding prose are stripped, trailing commas
+dropped, and a reply cut off at max_tokens is closed after its last complete
+element. Values are coerced where the intent is unambiguous ("85" for an
+integer, "High" for an enum of lowercase values, a lone string for an array).
+
+Only what is still missing after repair is asked for again: the follow-up
+names the missing or invalid top-level fields and asks for just those, and
+the answer is merged into what was already parsed. Object schemas also
+request the deployment's JSON mode (response_format json_object).
+
+App settings:
+    LLM_JSON_MODE                "false" stops requesting JSON mode (default true)
+    LLM_STRUCTURED_MAX_REASKS    follow-up completions per call (default 1)
+"""
+import json
+import logging
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .llm_cache import cached_chat_completion
+from .settings import get_bool_setting, get_int_setting
+
+DEFAULT_MAX_REASKS = 1
+
+# Most recent cut points tried when closing a truncated reply
+MAX_REPAIR_ATTEMPTS = 64
+# Opening brackets tried when a reply has prose before its JSON
+MAX_JSON_STARTS = 16
+
+_FENCE_PATTERN = re.compile(r"```[a-zA-Z]*[ \t]*\n?(.*?)(?:```|\Z)", re.DOTALL)
+_NUMBER_PATTERN = re.compile(r"^\s*\$?\s*(-?[\d,]*\.?\d+)\s*%?\s*$")
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None)
+}
+
+
+class StructuredOutputError(ValueError):
+    """
+    The model did not produce a value matching the schema
+
+    ``value`` holds whatever was parsed (None if nothing was) and
+    ``missing`` the required fields that are still absent.
+    """
+
+    def __init__(self, message: str, value: Any = None, missing: Optional[List[str]] = None):
+        super().__init__(message)
+        self.value = value
+        self.missing = missing or []
+
+
+_stats = {"completions": 0, "clean": 0, "repaired": 0, "reasks": 0, "failed": 0}
+_stats_lock = threading.Lock()
+_json_mode_unsupported = set()
+
+
+def _count(name: str, amount: int = 1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_structured_output_stats() -> Dict[str, int]:
+    """Process-wide counters: completions, clean/repaired parses, re-asks and failures"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_structured_output_stats():
+    """Zero the counters and forget deployments without JSON mode (used by tests)"""
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+        _json_mode_unsupported.clear()
+
+
+def close_truncated_json(text: str) -> Any:
+    """
+    Parse JSON that was cut off (or has trailing commas) by dropping the
+    incomplete tail and closing the brackets that are still open
+
+    Raises ValueError if no prefix of text can be completed into JSON.
+    """
+    stack: List[str] = []
+    in_string = escape = False
+    cuts: List[Tuple[int, str]] = []
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            cuts.append((i + 1, "".join(reversed(stack))))
+            if not stack:
+                break
+        elif ch == "," and stack:
+            # Everything before a separator is a complete element
+            cuts.append((i, "".join(reversed(stack))))
+
+    for end, closers in reversed(cuts[-MAX_REPAIR_ATTEMPTS:]):
+        try:
+            return json.loads(text[:end] + closers)
+        except ValueError:
+            continue
+    raise ValueError("Response is not valid JSON and could not be repaired")
+
+
+def extract_json(text: Optional[str]) -> Tuple[Any, bool]:
+    """
+    Parse the JSON value in a completion; returns (value, repaired)
+
+    Raises ValueError if the text holds no recoverable JSON value.
+    """
+    stripped = (text or "").strip()
+    try:
+        return json.loads(stripped), False
+    except ValueError:
+        pass
+
+    fence = _FENCE_PATTERN.search(stripped)
+    candidate = fence.group(1).strip() if fence else stripped
+    starts = [i for i, ch in enumerate(candidate) if ch in "{["][:MAX_JSON_STARTS]
+    if not starts:
+        raise ValueError("Response contains no JSON value")
+
+    # Prose before or after the value: decode from the first bracket that parses
+    decoder = json.JSONDecoder()
+    for start in starts:
+        try:
+            value, _ = decoder.raw_decode(candidate, start)
+            return value, True
+        except ValueError:
+            continue
+    return close_truncated_json(candidate[starts[0]:]), True
+
+
+def _schema_types(schema: Dict[str, Any]) -> List[str]:
+    types = schema.get("type")
+    if types is None:
+        return []
+    return [types] if isinstance(types, str) else list(types)
+
+
+def _has_type(value: Any, type_name: str) -> bool:
+    if type_name in ("integer", "number"):
+        numeric = isinstance(value, int) if type_name == "integer" else isinstance(value, (int, float))
+        return numeric and not isinstance(value, bool)
+    return isinstance(value, _JSON_TYPES[type_name])
+
+
+def _coerce(value: Any, type_name: str) -> Tuple[bool, Any]:
+    """(True, value) if value is, or unambiguously converts to, type_name"""
+    if type_name in ("integer", "number"):
+        if isinstance(value, bool):
+            return False, value
+        if isinstance(value, str):
+            match = _NUMBER_PATTERN.match(value)
+            if not match:
+                return False, value
+            value = float(match.group(1).replace(",", ""))
+        if not isinstance(value, (int, float)) or not math.isfinite(value):
+            return False, value
+        if type_name == "integer":
+            if float(value) != int(value):
+                return False, value
+            return True, int(value)
+        return True, value
+    if type_name == "boolean" and isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return True, value.strip().lower() == "true"
+    if type_name == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return True, str(value)
+    if type_name == "array" and value is not None and not isinstance(value, list):
+        return True, [value]
+    return _has_type(value, type_name), value
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> Tuple[Any, List[str], bool]:
+    """
+    Check value against schema; returns (coerced value, errors, valid)
+
+    valid is False when the value itself does not fit (wrong type, not in
+    the enum, out of range, or an object missing a required property).
+    Invalid array items and invalid properties are dropped and reported
+    without invalidating their parent; missing optional properties get the
+    schema's default if it has one. An object schema with a single required
+    array property also accepts the bare array.
+    """
+    types = _schema_types(schema)
+    if types:
+        if "object" in types and isinstance(value, list) and len(schema.get("required", [])) == 1:
+            wrapper = schema["required"][0]
+            if "array" in _schema_types(schema.get("properties", {}).get(wrapper, {})):
+                value = {wrapper: value}
+        # Prefer a type the value already has over one it could be converted to
+        exact = [t for t in types if _has_type(value, t)]
+        for type_name in exact + types:
+            ok, coerced = _coerce(value, type_name)
+            if ok:
+                value = coerced
+                break
+        else:
+            return value, [f"{path}: expected {' or '.join(types)}"], False
+
+    if "enum" in schema and value not in schema["enum"]:
+        folded = {str(option).casefold(): option for option in schema["enum"]}
+        if str(value).strip().casefold() not in folded:
+            return value, [f"{path}: expected one of {', '.join(map(str, schema['enum']))}"], False
+        value = folded[str(value).strip().casefold()]
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            return value, [f"{path}: below minimum {schema['minimum']}"], False
+        if "maximum" in schema and value > schema["maximum"]:
+            return value, [f"{path}: above maximum {schema['maximum']}"], False
+
+    errors: List[str] = []
+    if isinstance(value, dict) and "properties" in schema:
+        value = dict(value)
+        required = schema.get("required", [])
+        for name, property_schema in schema["properties"].items():
+            if name not in value or (value[name] is None and name not in required):
+                value.pop(name, None)
+                if name not in required and "default" in property_schema:
+                    value[name] = property_schema["default"]
+                continue
+            coerced, property_errors, valid = validate(value[name], property_schema, f"{path}.{name}")
+            errors.extend(property_errors)
+            if valid:
+                value[name] = coerced
+            else:
+                del value[name]
+        missing = [name for name in required if name not in value]
+        if missing:
+            errors.extend(f"{path}.{name}: required" for name in missing)
+            return value, errors, False
+    elif isinstance(value, list) and "items" in schema:
+        items = []
+        for i, item in enumerate(value):
+            coerced, item_errors, valid = validate(item, schema["items"], f"{path}[{i}]")
+            errors.extend(item_errors)
+            if valid:
+                items.append(coerced)
+        value = items
+    return value, errors, True
+
+
+def parse_structured(content: Optional[str], schema: Dict[str, Any]) -> Tuple[Any, bool, List[str]]:
+    """
+    Repair and validate one completion; returns (value, repaired, missing required fields)
+
+    Raises ValueError if no JSON can be recovered or it has the wrong top-level type.
+    """
+    value, repaired = extract_json(content)
+    value, errors, _ = validate(value, schema)
+    top_level = [error for error in errors if error.startswith("$: ")]
+    if top_level:
+        raise ValueError(top_level[0])
+    if errors:
+        logging.info(f"Structured output dropped invalid values: {'; '.join(errors[:5])}")
+    missing = [name for name in schema.get("required", []) if isinstance(value, dict) and name not in value]
+    return value, repaired, missing
+
+
+def is_schema_response(schema: Dict[str, Any]):
+    """Cache validator accepting only completions that yield every required field"""
+    def check(content: str) -> bool:
+        try:
+            return not parse_structured(content, schema)[2]
+        except ValueError:
+            return False
+    return check
+
+
+def _complete(client, model: str, messages: List[Dict[str, str]], schema: Dict[str, Any], temperature: float,
+              max_tokens: Optional[int], use_cache: bool, **kwargs) -> str:
+    _count("completions")
+    json_mode = ("object" in _schema_types(schema) and model not in _json_mode_unsupported
+                 and get_bool_setting("LLM_JSON_MODE", True))
+    if json_mode:
+        try:
+            return cached_chat_completion(client, model=model, messages=messages, temperature=temperature,
+                                          max_tokens=max_tokens, use_cache=use_cache,
+                                          validate=is_schema_response(schema),
+                                          response_format={"type": "json_object"}, **kwargs)
+        except Exception as e:
+            if "response_format" not in str(e):
+                raise
+            logging.warning(f"Deployment {model} does not support JSON mode, using plain completions")
+            _json_mode_unsupported.add(model)
+    return cached_chat_completion(client, model=model, messages=messages, temperature=temperature,
+                                  max_tokens=max_tokens, use_cache=use_cache,
+                                  validate=is_schema_response(schema), **kwargs)
+
+
+def structured_completion(client, model: str, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                          temperature: float, max_tokens: Optional[int] = None, use_cache: bool = True,
+                          max_reasks: Optional[int] = None, **kwargs) -> Any:
+    """
+    Chat completion parsed, repaired and validated against schema
+
+    If the reply has no usable JSON, the model is asked once more for the
+    JSON alone; if required fields are missing or invalid, it is asked for
+    just those fields. Raises StructuredOutputError (with the partial value)
+    when that still does not produce every required field. Extra keyword
+    arguments (route, timeout, ...) are passed to cached_chat_completion.
+    """
+    if max_reasks is None:
+        max_reasks = get_int_setting("LLM_STRUCTURED_MAX_REASKS", DEFAULT_MAX_REASKS)
+
+    content = _complete(client, model, messages, schema, temperature, max_tokens, use_cache, **kwargs)
+    value, missing, error = None, [], None
+    try:
+        value, repaired, missing = parse_structured(content, schema)
+        _count("repaired" if repaired else "clean")
+    except ValueError as e:
+        error = str(e)
+
+    for _ in range(max(0, max_reasks)):
+        if value is not None and not missing:
+            break
+        _count("reasks")
+        if value is None:
+            follow_up = f"Your reply could not be used ({error}). Reply with only the JSON, nothing else."
+            reask_schema = schema
+        else:
+            follow_up = (f"Your reply is missing or has invalid values for: {', '.join(missing)}. "
+                         f"Reply with a JSON object containing only these fields.")
+            reask_schema = {
+                "type": "object",
+                "properties": {name: schema["properties"][name] for name in missing},
+                "required": list(missing)
+            }
+        logging.info(f"Re-asking {model}: {follow_up}")
+        reply = _complete(client, model, messages + [
+            {"role": "assistant", "content": content or ""},
+            {"role": "user", "content": follow_up}
+        ], reask_schema, temperature, max_tokens, use_cache, **kwargs)
+        try:
+            part, _, part_missing = parse_structured(reply, reask_schema)
+        except ValueError as e:
+            error = str(e)
+            continue
+        if value is None:
+            value, missing, content = part, part_missing, reply
+        else:
+            value.update(part)
+            missing = [name for name in missing if name not in part]
+
+    if value is None or missing:
+        _count("failed")
+        if value is None:
+            raise StructuredOutputError(f"Model response is not valid JSON: {error}")
+        raise StructuredOutputError(f"Model response is missing required fields: {', '.join(missing)}",
+                                    value, missing)
+    return value
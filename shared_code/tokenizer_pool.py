@@ -0,0 +1,142 @@
+"""
+Bounded, process-level pool of loaded tokenizers
+
+Loaded tokenizers are kept in an LRU that is capped both by the number of
+models and by a total weight (vocabulary entries by default, a proxy for
+memory). Each model is loaded at most once even when several requests ask for
+it at the same time, and a configurable list of models can be loaded when the
+worker starts so the first request does not pay for it.
+
+App settings:
+    TOKENIZER_POOL_MAX_MODELS  maximum number of loaded tokenizers (default 4)
+    TOKENIZER_POOL_MAX_VOCAB   maximum total vocabulary entries across them (default 1000000)
+    TOKENIZER_PRELOAD_MODELS   comma-separated models to load at worker start
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+DEFAULT_MAX_MODELS = 4
+DEFAULT_MAX_VOCAB = 1_000_000
+
+
+def get_preload_models() -> List[str]:
+    """Model names listed in TOKENIZER_PRELOAD_MODELS"""
+    value = os.environ.get("TOKENIZER_PRELOAD_MODELS", "")
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class TokenizerPool:
+    """
+    Thread-safe LRU of loaded tokenizers with a model-count and weight budget
+    """
+
+    def __init__(self, loader: Callable[[str], Any], max_models: int = DEFAULT_MAX_MODELS,
+                 max_weight: Optional[int] = DEFAULT_MAX_VOCAB, weigh: Callable[[Any], int] = len):
+        self.loader = loader
+        self.max_models = max(1, max_models)
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0, "load_seconds": 0.0}
+
+    def get(self, name: str) -> Any:
+        """Loaded tokenizer for name, loading it (once) on a miss"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                self._stats["hits"] += 1
+                return entry[0]
+            load_lock = self._loading.setdefault(name, threading.Lock())
+
+        with load_lock:
+            # Another request may have finished loading while we waited
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    self._entries.move_to_end(name)
+                    self._stats["hits"] += 1
+                    return entry[0]
+
+            started = time.perf_counter()
+            try:
+                tokenizer = self.loader(name)
+            except Exception:
+                with self._lock:
+                    self._loading.pop(name, None)
+                raise
+            elapsed = time.perf_counter() - started
+
+            try:
+                weight = int(self.weigh(tokenizer))
+            except Exception:
+                weight = 0
+            # Publish the entry before dropping the loading lock, so a request
+            # arriving in between finds one or the other and never loads again
+            with self._lock:
+                self._entries[name] = (tokenizer, weight)
+                self._loading.pop(name, None)
+                self._stats["loads"] += 1
+                self._stats["load_seconds"] += elapsed
+                self._evict()
+            logging.info(f"Loaded tokenizer {name} in {elapsed:.2f}s (weight {weight})")
+            return tokenizer
+
+    def _evict(self):
+        # Never evicts the most recently used entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_models or
+                (self.max_weight is not None and self.total_weight() > self.max_weight)):
+            name, _ = self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+            logging.info(f"Evicted tokenizer {name} from the pool")
+
+    def total_weight(self) -> int:
+        return sum(weight for _, weight in self._entries.values())
+
+    def preload(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Load models ahead of the first request; returns {name: error or None}
+
+        A model that fails to load is logged and skipped so one bad entry
+        does not stop the worker from starting.
+        """
+        results = {}
+        for name in names:
+            try:
+                self.get(name)
+                results[name] = None
+            except Exception as e:
+                logging.warning(f"Could not preload tokenizer {name}: {str(e)}")
+                results[name] = str(e)
+        return results
+
+    def loaded_models(self) -> List[str]:
+        """Loaded model names, least recently used first"""
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["models"] = list(self._entries)
+            stats["total_weight"] = self.total_weight()
+        stats["load_seconds"] = round(stats["load_seconds"], 3)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
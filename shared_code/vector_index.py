@@ -0,0 +1,78 @@
+"""
+Nearest-neighbour search over grant embeddings
+
+The default backend is an exact brute-force search: embeddings are L2-normalised
+into one float32 matrix and scored with a single matrix-vector product. Other
+backends (e.g. an ANN library) can be plugged in with register_index_backend
+and selected with the VECTOR_INDEX_BACKEND app setting.
+"""
+import os
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class BruteForceIndex:
+    """
+    Exact cosine-similarity index backed by a NumPy matrix
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def build(self, ids: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Replace the index contents with the given ids and vectors"""
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+        self.ids = list(ids)
+        if not self.ids:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._matrix = matrix / norms
+
+    def search(self, query: Sequence[float], k: int) -> List[Tuple[str, float]]:
+        """Return up to k (id, cosine similarity) pairs, best first"""
+        if not self.ids or k <= 0:
+            return []
+        vector = np.asarray(query, dtype=np.float32)
+        if vector.shape[0] != self._matrix.shape[1]:
+            raise ValueError(f"Query dimension {vector.shape[0]} does not match index dimension {self._matrix.shape[1]}")
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+
+        scores = self._matrix @ vector
+        k = min(k, len(self.ids))
+        # argpartition finds the top k in O(n); only those k are sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    @property
+    def dimension(self) -> int:
+        return self._matrix.shape[1] if self.ids else 0
+
+    def __len__(self):
+        return len(self.ids)
+
+
+_index_backends: Dict[str, Callable[[], object]] = {
+    "numpy": BruteForceIndex
+}
+
+
+def register_index_backend(name: str, factory: Callable[[], object]):
+    """Register an index implementation exposing build(ids, vectors) and search(query, k)"""
+    _index_backends[name] = factory
+
+
+def create_vector_index(backend: str = None):
+    """Create an empty index for the requested (or configured) backend"""
+    backend = backend or os.environ.get("VECTOR_INDEX_BACKEND", "numpy")
+    if backend not in _index_backends:
+        raise ValueError(f"Unknown vector index backend: {backend}")
+    return _index_backends[backend]()
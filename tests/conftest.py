@@ -121,6 +121,29 @@ def configure_logging():
     logging.getLogger().setLevel(logging.CRITICAL)  # Suppress logs during tests
 
 
+def _process_state_resets():
+    """Reset functions of the process-wide caches, pools and counters in shared_code"""
+    from shared_code.bpe_tokenizer import reset_encodings
+    from shared_code.grant_catalog import reset_grant_catalog
+    from shared_code.job_queue import reset_job_queues
+    from shared_code.llm_cache import reset_llm_cache
+    from shared_code.model_router import reset_route_metrics
+    from shared_code.structured_output import reset_structured_output_stats
+    return [reset_llm_cache, reset_grant_catalog, reset_job_queues, reset_structured_output_stats,
+            reset_route_metrics, reset_encodings]
+
+
+@pytest.fixture(autouse=True)
+def reset_process_state():
+    """Give every test fresh process-wide state (completion cache, catalog, queues, counters, encodings)"""
+    resets = _process_state_resets()
+    for reset in resets:
+        reset()
+    yield
+    for reset in resets:
+        reset()
+
+
 # Performance monitoring fixture
 @pytest.fixture
 def performance_monitor():
@@ -0,0 +1,212 @@
+"""
+Unit tests for AnalyzeGrant bulk ingestion
+"""
+import pytest
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import Mock, patch
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import azure.functions as func
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+import AnalyzeGrant
+from AnalyzeGrant import grant_content_hash, ingest_grants, main, upsert_grant
+from shared_code.rate_limiter import RateLimiter
+
+
+def analysis_client(delay=0.0, tracker=None):
+    """OpenAI client double returning a fixed analysis and failing embeddings"""
+    client = Mock()
+
+    def create(**request):
+        if tracker is not None:
+            tracker.enter()
+        time.sleep(delay)
+        if tracker is not None:
+            tracker.leave()
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = json.dumps({"eligibilityRequirements": ["Nonprofit"]})
+        return response
+
+    client.chat.completions.create.side_effect = create
+    client.embeddings.create.side_effect = RuntimeError("no embedding deployment")
+    return client
+
+
+class FakeGrants:
+    """Dict-backed stand-in for the GrantOpportunities container"""
+
+    def __init__(self):
+        self.items = {}
+        self.upserts = 0
+
+    def read_item(self, item, partition_key):
+        if item not in self.items:
+            raise CosmosResourceNotFoundError(message="not found")
+        return dict(self.items[item])
+
+    def upsert_item(self, body):
+        self.upserts += 1
+        self.items[body["id"]] = dict(body)
+
+
+class ConcurrencyTracker:
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def leave(self):
+        with self.lock:
+            self.current -= 1
+
+
+class TestIngestGrants:
+    """Test bounded-concurrency bulk ingestion"""
+
+    def test_results_in_order_with_item_errors(self):
+        container = Mock()
+        items = [{"grantDescription": f"Grant {i}"} for i in range(6)]
+        items.insert(2, {"fundingAmount": "$5,000"})
+
+        result = ingest_grants(analysis_client(), container, items, use_cache=False, max_concurrency=3)
+
+        assert [item["index"] for item in result["items"]] == list(range(7))
+        assert [item["success"] for item in result["items"]] == [True, True, False, True, True, True, True]
+        assert result["items"][2]["error"] == "grantDescription is required"
+        assert result["failedItems"] == 1
+        assert container.upsert_item.call_count == 6
+
+    def test_concurrency_is_bounded(self):
+        tracker = ConcurrencyTracker()
+        items = [{"grantDescription": f"Grant {i}"} for i in range(10)]
+
+        ingest_grants(analysis_client(0.02, tracker), Mock(), items, use_cache=False, max_concurrency=2)
+
+        assert tracker.peak == 2
+
+    def test_max_items(self):
+        items = [{"grantDescription": f"Grant {i}"} for i in range(3)]
+        result = ingest_grants(analysis_client(), Mock(), items, use_cache=False, max_items=2)
+        assert [item["success"] for item in result["items"]] == [True, True, False]
+
+
+class TestIdempotentUpserts:
+    """Test content-hash identity of grants"""
+
+    def test_resubmission_skips_analysis(self):
+        client = analysis_client()
+        container = FakeGrants()
+        grant = {"grantDescription": "Community  garden grant", "organizationType": "nonprofit",
+                 "fundingAmount": "$5,000", "deadline": "2030-01-01"}
+
+        first, first_analyzed = upsert_grant(client, container, grant)
+        resubmitted = dict(grant, grantDescription="community garden grant ")
+        second, second_analyzed = upsert_grant(client, container, resubmitted)
+
+        assert first_analyzed and not second_analyzed
+        assert first["id"] == second["id"]
+        assert len(container.items) == 1
+        assert client.chat.completions.create.call_count == 1
+
+    def test_prompt_version_change_reanalyzes(self):
+        client = analysis_client()
+        container = FakeGrants()
+        grant = AnalyzeGrant.grant_fields({"grantDescription": "Arts grant"})
+        upsert_grant(client, container, grant, use_cache=False)
+
+        with patch.object(AnalyzeGrant, "ANALYSIS_PROMPT_VERSION", "2"):
+            record, reanalyzed = upsert_grant(client, container, grant, use_cache=False)
+
+        assert reanalyzed
+        assert record["promptVersion"] == "2"
+        assert len(container.items) == 1
+
+    def test_match_features_are_stored_and_backfilled(self):
+        client = analysis_client()
+        container = FakeGrants()
+        grant = AnalyzeGrant.grant_fields({"grantDescription": "Arts grant", "deadline": "March 15, 2030",
+                                           "fundingAmount": "up to $20k"})
+
+        record, _ = upsert_grant(client, container, grant)
+        assert record["matchFeatures"]["deadline"] == "2030-03-15"
+        assert record["matchFeatures"]["fundingMax"] == 20000.0
+
+        # A record written before features existed gets them without another analysis
+        del container.items[record["id"]]["matchFeatures"]
+        record, reanalyzed = upsert_grant(client, container, grant)
+        assert not reanalyzed
+        assert container.items[record["id"]]["matchFeatures"]["eligibilityDigest"] == "Nonprofit"
+        assert client.chat.completions.create.call_count == 1
+
+    def test_embedding_is_paced_with_analysis(self):
+        client = analysis_client()
+        client.embeddings.create.side_effect = None
+        client.embeddings.create.return_value.data = [Mock(embedding=[0.1, 0.2])]
+        limiter = Mock()
+        container = FakeGrants()
+
+        upsert_grant(client, container, AnalyzeGrant.grant_fields({"grantDescription": "Arts grant"}), limiter=limiter)
+        upsert_grant(client, container, AnalyzeGrant.grant_fields({"grantDescription": "Arts grant"}), limiter=limiter)
+
+        # One token for the analysis and one for the embedding; the resubmission makes no calls
+        assert limiter.acquire.call_count == 2
+        assert client.embeddings.create.call_count == 1
+
+    def test_changed_text_is_a_new_grant(self):
+        assert grant_content_hash({"grantDescription": "Arts grant"}) != \
+            grant_content_hash({"grantDescription": "Arts grants"})
+
+
+class TestBulkRequest:
+    """Test the ?bulk=true HTTP entry point"""
+
+    def call(self, body, content_type):
+        req = func.HttpRequest(method="POST", url="/api/analyzegrant", params={"bulk": "true"},
+                               headers={"Content-Type": content_type}, body=body)
+        with patch('AnalyzeGrant.get_openai_client', return_value=analysis_client()), \
+                patch('AnalyzeGrant.get_grants_container', return_value=Mock()), \
+                patch.dict(os.environ, {"ANALYZE_GRANT_REQUESTS_PER_MINUTE": "0"}):
+            return main(req)
+
+    def test_ndjson_body(self):
+        body = b'{"grantDescription": "Grant A"}\n\nnot json\n{"grantDescription": "Grant B"}\n'
+
+        response = self.call(body, "application/x-ndjson")
+
+        data = json.loads(response.get_body())
+        assert response.status_code == 200
+        assert data["itemCount"] == 3
+        assert [item["success"] for item in data["items"]] == [True, False, True]
+
+    def test_json_array_body(self):
+        response = self.call(json.dumps({"grants": [{"grantDescription": "Grant A"}]}).encode(), "application/json")
+        assert json.loads(response.get_body())["items"][0]["success"] is True
+
+    def test_empty_bulk_request(self):
+        response = self.call(json.dumps({"grants": []}).encode(), "application/json")
+        assert response.status_code == 400
+
+
+class TestRateLimiter:
+    def test_paces_requests(self):
+        limiter = RateLimiter(50, burst=1)
+        started = time.monotonic()
+        for _ in range(4):
+            limiter.acquire()
+        assert time.monotonic() - started >= 0.05
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -243,5 +243,147 @@ class TestMainFunction:
             assert response_data["default_model"] == "openai/gpt-oss-120b"
 
 
+class TestBatchTokenization:
+    """Test the batch tokenization mode"""
+
+    def make_request(self, body):
+        req = Mock(spec=func.HttpRequest)
+        req.method = "POST"
+        req.get_json.return_value = body
+        return req
+
+    def test_texts_keep_order_with_per_item_errors(self):
+        """Test that items come back in order and a bad item does not fail the batch"""
+        response = main(self.make_request({"texts": ["one two", 42, "three"], "model": "simple"}))
+
+        assert response.status_code == 200
+        data = json.loads(response.get_body().decode())
+        assert [item["index"] for item in data["items"]] == [0, 1, 2]
+        assert [item["success"] for item in data["items"]] == [True, False, True]
+        assert data["items"][0]["token_count"] == 2
+        assert data["failed_items"] == 1
+        assert data["total_tokens"] == 3
+        assert "tokens_per_second" in data
+
+    def test_document_split_into_pages(self):
+        """Test server-side splitting of a document"""
+        response = main(self.make_request({"document": "page one\fpage two words", "model": "simple"}))
+
+        data = json.loads(response.get_body().decode())
+        assert [item["token_count"] for item in data["items"]] == [2, 3]
+
+    def test_batch_limit(self):
+        """Test that oversized batches are rejected"""
+        with patch.dict(os.environ, {"TOKENIZER_MAX_BATCH_ITEMS": "2"}):
+            response = main(self.make_request({"texts": ["a", "b", "c"]}))
+        assert response.status_code == 400
+
+    def test_invalid_split(self):
+        response = main(self.make_request({"document": "text", "split": "chapters"}))
+        assert response.status_code == 400
+
+    def test_count_only_is_compact(self):
+        """Test that count-only batches return just counts as compact JSON"""
+        response = main(self.make_request({"texts": ["one two", "three"], "model": "simple",
+                                           "options": {"count_only": True}}))
+
+        body = response.get_body().decode()
+        assert "\n" not in body
+        data = json.loads(body)
+        assert [item["token_count"] for item in data["items"]] == [2, 1]
+        assert "tokens" not in data["items"][0]
+
+    def test_invalid_token_ids_format(self):
+        response = main(self.make_request({"texts": ["a"], "options": {"token_ids_format": "csv"}}))
+        assert response.status_code == 400
+
+
+class FakeBlobContainer:
+    """Blob container stand-in that records how uploads and downloads are chunked"""
+
+    def __init__(self, download_chunk_size=5):
+        self.blobs = {}
+        self.download_chunk_size = download_chunk_size
+        self.upload_pieces = {}
+
+    def get_blob_client(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+        container = self
+        client = Mock()
+        client.url = f"https://storage/tokenizer-jobs/{name}"
+
+        def upload(data, overwrite=False, **kwargs):
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            pieces = [data] if isinstance(data, bytes) else list(data)
+            container.upload_pieces[name] = len(pieces)
+            container.blobs[name] = b"".join(pieces)
+
+        def download():
+            if name not in container.blobs:
+                raise ResourceNotFoundError("not found")
+            data = container.blobs[name]
+            size = container.download_chunk_size
+            return Mock(readall=lambda: data,
+                        chunks=lambda: iter([data[i:i + size] for i in range(0, len(data), size)]))
+
+        client.upload_blob.side_effect = upload
+        client.download_blob.side_effect = download
+        return client
+
+
+class TestStreamingTokenization:
+    """Test the ?stream=ndjson job mode"""
+
+    def setup_method(self):
+        self.blobs = FakeBlobContainer()
+
+    def call(self, body, method="POST", **params):
+        if method == "POST":
+            params = {"stream": "ndjson", "model": "simple", **params}
+        req = func.HttpRequest(method=method, url="/api/tokenizerfunction", params=params, body=body)
+        with patch('TokenizerFunction.get_blob_container_client', return_value=self.blobs):
+            return main(req)
+
+    def test_job_output_matches_whole_text(self):
+        """Test that ids tokenized chunk by chunk into the output blob equal tokenizing the whole text"""
+        from TokenizerFunction import tokenize_text
+        from shared_code.job_queue import get_job_queue
+        text = "Grant écrit for the community garden, phase 2! " * 50
+        with patch.dict(os.environ, {"TOKENIZER_STREAM_CHUNK_BYTES": "7", "JOB_QUEUE_MODE": "inprocess"}), \
+                patch('TokenizerFunction.get_blob_container_client', return_value=self.blobs):
+            accepted = main(func.HttpRequest(method="POST", url="/api/tokenizerfunction", body=text.encode("utf-8"),
+                                             params={"stream": "ndjson", "model": "simple", "batch_size": "16"}))
+            job = json.loads(accepted.get_body())
+            get_job_queue("tokenizer-jobs", None).drain(timeout=5)
+            status = json.loads(main(func.HttpRequest(method="GET", url="/api/tokenizerfunction",
+                                                      params={"jobId": job["jobId"]}, body=b"")).get_body())
+
+        assert accepted.status_code == 202
+        assert status["status"] == "completed"
+        output = self.blobs.blobs[status["outputBlob"]]
+        events = [json.loads(line) for line in output.decode().splitlines()]
+        assert events[0]["type"] == "start"
+        assert events[-1]["type"] == "complete"
+        token_ids = [i for event in events if event["type"] == "tokens" for i in event["token_ids"]]
+        assert all(event["count"] <= 16 for event in events if event["type"] == "tokens")
+        assert token_ids == tokenize_text(text, "simple")["token_ids"]
+        assert status["token_count"] == events[-1]["token_count"] == len(token_ids)
+        # The output was handed to the upload one line at a time, not as one string
+        assert self.blobs.upload_pieces[status["outputBlob"]] == len(events)
+
+    def test_text_chunks_keep_split_characters(self):
+        from TokenizerFunction import iter_text_chunks
+        data = "écrit".encode("utf-8")
+        assert "".join(iter_text_chunks([data[:1], data[1:3], data[3:]], 2)) == "écrit"
+
+    def test_unknown_job(self):
+        assert self.call(b"", method="GET", jobId="f" * 32).status_code == 404
+
+    def test_invalid_batch_size(self):
+        response = self.call(b"text", batch_size="many")
+        assert response.status_code == 400
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
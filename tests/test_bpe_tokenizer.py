@@ -0,0 +1,170 @@
+"""
+Unit tests for the BPE tokenizer engine
+"""
+import pytest
+import base64
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code import bpe_tokenizer
+from shared_code.bpe_tokenizer import (
+    BPEEncoding, ENCODING_SPECS, encoding_name_for_model, get_encoding, load_tiktoken_ranks,
+    pack_token_ids, unpack_token_ids
+)
+
+# Single bytes get ranks 0-255, then a few merges
+MERGES = [b"he", b"ll", b"hell", b"hello", b" w", b"or", b" wor", b"ld", b" world"]
+
+
+def make_ranks():
+    ranks = {bytes([i]): i for i in range(256)}
+    for token in MERGES:
+        ranks[token] = len(ranks)
+    return ranks
+
+
+def write_rank_file(path, ranks):
+    with open(path, "wb") as f:
+        for token, rank in ranks.items():
+            f.write(base64.b64encode(token) + b" " + str(rank).encode() + b"\n")
+
+
+@pytest.fixture
+def encoding():
+    spec = ENCODING_SPECS["cl100k_base"]
+    return BPEEncoding("test", make_ranks(), spec["pattern"], {"<|endoftext|>": 300},
+                       fallback_pattern=spec["fallback_pattern"])
+
+
+class TestBPEEncoding:
+    """Test encoding, decoding and caching"""
+
+    def test_merges_to_lowest_ranks(self, encoding):
+        """Test that pieces merge fully and unknown bytes stay single"""
+        ranks = make_ranks()
+        assert encoding.encode("hello world") == [ranks[b"hello"], ranks[b" world"]]
+        assert encoding.encode("help") == [ranks[b"he"], ord("l"), ord("p")]
+
+    def test_round_trip_and_multibyte(self, encoding):
+        """Test that decoding restores the text, including non-ASCII bytes"""
+        text = "hello wörld 42!\n"
+        ids = encoding.encode(text)
+        assert encoding.decode(ids) == text
+        assert encoding.count_tokens(text) == len(ids)
+
+    def test_special_tokens(self, encoding):
+        """Test that special tokens are plain text unless allowed"""
+        assert 300 not in encoding.encode("hello<|endoftext|>")
+        assert encoding.encode("hello<|endoftext|>", allowed_special="all") == [make_ranks()[b"hello"], 300]
+        assert encoding.decode([300]) == "<|endoftext|>"
+
+    def test_repeated_pieces_hit_memo(self, encoding):
+        """Test that repeated words skip the merge loop"""
+        encoding.encode("hello hello hello")
+        info = encoding.cache_info()
+        assert info.hits >= 1
+        assert info.currsize == 2  # "hello" and " hello"
+
+    def test_chunked_encoding_matches_whole_text(self, encoding):
+        text = "hello world  hello\n\nworld 123 héllo"
+        for size in (1, 2, 5):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            batches = list(encoding.iter_encode_chunks(chunks, batch_size=3))
+            assert [i for batch in batches for i in batch] == encoding.encode_ordinary(text)
+
+    def test_unknown_token_id(self, encoding):
+        with pytest.raises(ValueError):
+            encoding.decode([10_000])
+
+
+class TestPackedTokenIds:
+    """Test the packed uint32 token id encoding"""
+
+    def test_round_trip(self):
+        ids = [0, 1, 300, 200019, 2 ** 32 - 1]
+        packed = pack_token_ids(ids)
+        assert base64.b64decode(packed)[:8] == b"\x00\x00\x00\x00\x01\x00\x00\x00"
+        assert unpack_token_ids(packed) == ids
+
+    def test_empty(self):
+        assert pack_token_ids([]) == ""
+        assert unpack_token_ids("") == []
+
+
+class TestEncodingLoading:
+    """Test rank files and model resolution"""
+
+    def test_load_rank_file(self, tmp_path, monkeypatch):
+        """Test loading from the encodings directory, shared between encodings"""
+        ranks = make_ranks()
+        write_rank_file(tmp_path / "o200k_base.tiktoken", ranks)
+        monkeypatch.setenv("TOKENIZER_ENCODINGS_DIR", str(tmp_path))
+
+        assert load_tiktoken_ranks(str(tmp_path / "o200k_base.tiktoken")) == ranks
+        base = get_encoding("o200k_base")
+        harmony = get_encoding("o200k_harmony")
+        assert get_encoding("o200k_base") is base
+        assert base._ranks is harmony._ranks
+        assert harmony.special_tokens["<|start|>"] == 200006
+
+    def test_missing_rank_file(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("TOKENIZER_ENCODINGS_DIR", str(tmp_path))
+        with pytest.raises(FileNotFoundError):
+            get_encoding("cl100k_base")
+
+    def test_model_resolution(self):
+        assert encoding_name_for_model("gpt-35-turbo") == "cl100k_base"
+        assert encoding_name_for_model("gpt-4o-2024-08-06") == "o200k_base"
+        assert encoding_name_for_model("openai/gpt-oss-120b") == "o200k_harmony"
+        assert encoding_name_for_model("cl100k_base") == "cl100k_base"
+        assert encoding_name_for_model("bert-base-uncased") is None
+
+
+class TestTokenizeText:
+    """Test TokenizerFunction on top of the engine"""
+
+    def test_bpe_model(self, tmp_path, monkeypatch):
+        from TokenizerFunction import tokenize_text
+        write_rank_file(tmp_path / "cl100k_base.tiktoken", make_ranks())
+        monkeypatch.setenv("TOKENIZER_ENCODINGS_DIR", str(tmp_path))
+
+        result = tokenize_text("hello world", "gpt-35-turbo", {"include_decoded": True})
+
+        assert result["encoding"] == "cl100k_base"
+        assert result["tokens"] == ["hello", " world"]
+        assert result["token_count"] == 2
+        assert result["decoded_text"] == "hello world"
+
+    def test_count_only_and_slim(self, tmp_path, monkeypatch):
+        from TokenizerFunction import tokenize_text
+        write_rank_file(tmp_path / "cl100k_base.tiktoken", make_ranks())
+        monkeypatch.setenv("TOKENIZER_ENCODINGS_DIR", str(tmp_path))
+
+        counted = tokenize_text("hello world", "gpt-35-turbo", {"count_only": True})
+        assert counted == {"success": True, "model": "gpt-35-turbo", "encoding": "cl100k_base", "token_count": 2}
+
+        slim = tokenize_text("hello world", "gpt-35-turbo", {"slim": True, "token_ids_format": "packed"})
+        assert "text" not in slim and "special_tokens" not in slim
+        assert slim["token_ids_format"] == "uint32le-base64"
+        assert unpack_token_ids(slim["token_ids"]) == [256 + MERGES.index(b"hello"), 256 + MERGES.index(b" world")]
+
+    def test_simple_tokenizer_count_only(self):
+        from TokenizerFunction import tokenize_text
+        full = tokenize_text("Hello, world!", "simple")
+        counted = tokenize_text("Hello, world!", "simple", {"count_only": True})
+        assert counted["token_count"] == full["token_count"] == 4
+        assert "tokens" not in counted
+
+    def test_unknown_model_uses_simple_tokenizer(self):
+        from TokenizerFunction import tokenize_text
+        first = tokenize_text("hello world", "simple")
+        second = tokenize_text("hello world", "simple")
+        assert "encoding" not in first
+        assert first["token_ids"] == second["token_ids"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,66 @@
+"""
+Unit tests for token-budgeted document chunking
+"""
+import pytest
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code.chunking import chunk_text, estimate_tokens, get_token_counter
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class TestChunkText:
+    """Test chunk budgets, overlap and coverage"""
+
+    def test_short_text_is_one_chunk(self):
+        assert chunk_text("A short grant notice.", 100) == ["A short grant notice."]
+        assert chunk_text("", 100) == []
+
+    def test_chunks_respect_budget_and_cover_text(self):
+        paragraphs = [" ".join(f"p{p}w{w}" for w in range(7)) for p in range(20)]
+        text = "\n\n".join(paragraphs)
+
+        chunks = chunk_text(text, 20, count_tokens=count_words)
+
+        assert len(chunks) > 1
+        assert all(count_words(chunk) <= 20 for chunk in chunks)
+        assert "".join(chunks) == text
+
+    def test_overlap_repeats_previous_tail(self):
+        text = "\n".join(f"line {i} of the funding notice" for i in range(30))
+
+        chunks = chunk_text(text, 30, overlap_tokens=6, count_tokens=count_words)
+
+        for previous, current in zip(chunks, chunks[1:]):
+            last_line = previous.splitlines()[-1]
+            assert current.startswith(last_line)
+
+    def test_overlap_trims_paragraphs_larger_than_overlap(self):
+        paragraphs = [" ".join(f"p{p}w{w}" for w in range(12)) for p in range(10)]
+        text = "\n\n".join(paragraphs)
+
+        chunks = chunk_text(text, 30, overlap_tokens=5, count_tokens=count_words)
+
+        assert len(chunks) > 1
+        assert all(count_words(chunk) <= 30 for chunk in chunks)
+        for previous, current in zip(chunks, chunks[1:]):
+            carried = previous.split()[-5:]
+            assert current.split()[:5] == carried
+
+    def test_oversized_word_is_split(self):
+        chunks = chunk_text("x" * 100, 5)
+        assert "".join(chunks) == "x" * 100
+        assert all(estimate_tokens(chunk) <= 5 for chunk in chunks)
+
+    def test_unknown_model_estimates(self):
+        assert get_token_counter("bert-base-uncased") is estimate_tokens
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,109 @@
+"""
+Unit tests for the shared Azure client registry
+"""
+import pytest
+import os
+from unittest.mock import Mock, patch
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code import clients
+
+
+OPENAI_ENV = {
+    'AZURE_OPENAI_ENDPOINT': 'https://example.openai.azure.com/',
+    'AZURE_OPENAI_KEY': 'key-1'
+}
+
+
+class TestClientRegistry:
+    """Test lazy creation and reuse of shared clients"""
+
+    def setup_method(self):
+        clients.reset_clients()
+
+    def teardown_method(self):
+        clients.reset_clients()
+
+    def test_openai_client_reused_across_calls(self):
+        """Test that warm calls reuse the same client"""
+        with patch.dict(os.environ, OPENAI_ENV), \
+                patch('shared_code.clients.AzureOpenAI') as mock_openai:
+            mock_openai.side_effect = lambda **kwargs: Mock()
+
+            first = clients.get_openai_client()
+            second = clients.get_openai_client()
+
+            assert first is second
+            assert mock_openai.call_count == 1
+
+        stats = clients.get_client_stats()
+        assert stats["created"] == 1
+        assert stats["reused"] == 1
+        assert stats["active_clients"] == ["openai"]
+
+    def test_openai_client_rebuilt_on_config_change(self):
+        """Test that a changed key produces a new client"""
+        with patch('shared_code.clients.AzureOpenAI') as mock_openai:
+            mock_openai.side_effect = lambda **kwargs: Mock()
+
+            with patch.dict(os.environ, OPENAI_ENV):
+                first = clients.get_openai_client()
+            with patch.dict(os.environ, {**OPENAI_ENV, 'AZURE_OPENAI_KEY': 'key-2'}):
+                second = clients.get_openai_client()
+
+            assert first is not second
+            assert mock_openai.call_count == 2
+
+        assert clients.get_client_stats()["created"] == 2
+
+    def test_missing_configuration_raises(self):
+        """Test that missing settings raise ValueError without caching"""
+        with patch.dict(os.environ, {}, clear=True):
+            with pytest.raises(ValueError, match="Azure OpenAI configuration missing"):
+                clients.get_openai_client()
+            with pytest.raises(ValueError, match="Cosmos DB configuration missing"):
+                clients.get_cosmos_client()
+            with pytest.raises(ValueError, match="Storage connection string missing"):
+                clients.get_storage_client()
+
+        assert clients.get_client_stats()["created"] == 0
+
+    def test_cosmos_client_uses_pooled_transport(self):
+        """Test that the Cosmos client is built once with a pooled transport"""
+        env = {
+            'COSMOS_ENDPOINT': 'https://example.documents.azure.com:443/',
+            'COSMOS_KEY': 'cosmos-key',
+            'AZURE_CLIENT_POOL_SIZE': '5'
+        }
+        with patch.dict(os.environ, env), \
+                patch('azure.cosmos.CosmosClient') as mock_cosmos, \
+                patch('shared_code.clients._pooled_transport') as mock_transport:
+            clients.get_cosmos_client()
+            clients.get_cosmos_client()
+
+            mock_transport.assert_called_once_with(5)
+            mock_cosmos.assert_called_once_with(
+                env['COSMOS_ENDPOINT'], env['COSMOS_KEY'],
+                transport=mock_transport.return_value
+            )
+
+    def test_blob_container_created_once(self):
+        """Test that create_container runs once per container and process"""
+        from azure.core.exceptions import ResourceExistsError
+        storage = Mock()
+        storage.get_container_client.return_value.create_container.side_effect = ResourceExistsError("exists")
+
+        with patch('shared_code.clients.get_storage_client', return_value=storage):
+            for _ in range(3):
+                clients.get_blob_container_client("documents")
+
+        container = storage.get_container_client.return_value
+        assert container.create_container.call_count == 1
+        assert storage.get_container_client.call_count == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,444 @@
+"""
+Unit tests for FillGrantForm field generation
+"""
+import pytest
+import os
+import threading
+import time
+from unittest.mock import Mock, patch
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import FillGrantForm
+import json
+from FillGrantForm import (
+    generate_field_responses, generate_batched_field_responses, parse_category_response,
+    classify_form_fields, get_demo_grant_fields, iter_grant_form_progress, run_form_job, process_grant_form
+)
+from azure.core.exceptions import ResourceNotFoundError
+from shared_code.job_queue import get_job_queue
+from FillGrantForm.pdf_utils import ParsedPDF
+
+
+def make_completion(content):
+    """Build a mock chat completion with the given message content"""
+    completion = Mock()
+    completion.choices = [Mock()]
+    completion.choices[0].message.content = content
+    return completion
+
+
+def field_name_from_prompt(prompt):
+    """Recover the field name from the generic prompt tail"""
+    return prompt.split("'")[1] if "'" in prompt else "unknown"
+
+
+class TestGenerateFieldResponses:
+    """Test concurrent per-field generation"""
+
+    def setup_method(self):
+        self.profile = {"organization_name": "Test NGO"}
+        self.fields = {
+            "organizational": [{"name": "org_history", "type": "textarea"}],
+            "project": [{"name": "project_alpha", "type": "text"},
+                        {"name": "project_beta", "type": "text"}],
+            "other": [{"name": "misc_gamma", "type": "text"}]
+        }
+
+    def test_responses_keep_field_order(self):
+        """Test that responses follow field order, not completion order"""
+        delays = {"org_history": 0.05, "project_alpha": 0.0, "project_beta": 0.03, "misc_gamma": 0.0}
+
+        def create(**kwargs):
+            name = field_name_from_prompt(kwargs["messages"][1]["content"])
+            time.sleep(delays[name])
+            return make_completion(f"answer for {name}")
+
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+
+        with patch('FillGrantForm.get_openai_client', return_value=client):
+            responses = generate_field_responses(self.fields, self.profile, {}, max_concurrency=4)
+
+        assert list(responses.keys()) == ["org_history", "project_alpha", "project_beta", "misc_gamma"]
+        assert responses["project_beta"] == "answer for project_beta"
+
+    def test_concurrency_is_bounded(self):
+        """Test that no more than max_concurrency calls run at once"""
+        active = {"now": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def create(**kwargs):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.02)
+            with lock:
+                active["now"] -= 1
+            return make_completion("ok")
+
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+
+        with patch('FillGrantForm.get_openai_client', return_value=client):
+            generate_field_responses(self.fields, self.profile, {}, max_concurrency=2)
+
+        assert active["peak"] <= 2
+        assert client.chat.completions.create.call_count == 4
+
+    def test_failed_field_uses_fallback(self):
+        """Test that a failing field falls back without affecting the others"""
+        def create(**kwargs):
+            name = field_name_from_prompt(kwargs["messages"][1]["content"])
+            if name == "project_alpha":
+                raise TimeoutError("Request timed out")
+            return make_completion(f"answer for {name}")
+
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+
+        with patch('FillGrantForm.get_openai_client', return_value=client):
+            responses = generate_field_responses(self.fields, self.profile, {}, field_timeout=5)
+
+        assert responses["project_alpha"] == "[Please provide Project Alpha]"
+        assert responses["misc_gamma"] == "answer for misc_gamma"
+        assert all(call.kwargs["timeout"] == 5 for call in client.chat.completions.create.call_args_list)
+
+    def test_no_client_returns_demo_responses(self):
+        """Test demo responses when OpenAI is not configured"""
+        classified = classify_form_fields(get_demo_grant_fields())
+
+        with patch('FillGrantForm.get_openai_client', return_value=None):
+            responses = generate_field_responses(classified, self.profile, {})
+
+        assert responses["organization_name"] == "Test NGO"
+
+
+class TestBatchedFieldResponses:
+    """Test one-call-per-category batched generation"""
+
+    def setup_method(self):
+        self.profile = {"organization_name": "Test NGO"}
+        self.fields = {
+            "organizational": [{"name": "organization_name", "type": "text"},
+                               {"name": "mission_statement", "type": "textarea"}],
+            "project": [{"name": "project_title", "type": "text"}],
+            "financial": [],
+            "impact": [],
+            "other": []
+        }
+
+    def test_one_call_per_category(self):
+        """Test that each non-empty category is answered by a single completion"""
+        def create(**kwargs):
+            prompt = kwargs["messages"][1]["content"]
+            if "organizational fields" in prompt:
+                return make_completion(json.dumps({"organization_name": "Test NGO", "mission_statement": "We help."}))
+            return make_completion('```json\n{"project_title": "Clean Water Now"}\n```')
+
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+
+        with patch('FillGrantForm.get_openai_client', return_value=client):
+            responses = generate_batched_field_responses(self.fields, self.profile, {})
+
+        assert client.chat.completions.create.call_count == 2
+        assert list(responses.keys()) == ["organization_name", "mission_statement", "project_title"]
+        assert responses["project_title"] == "Clean Water Now"
+
+    def test_malformed_batch_falls_back_per_field_for_that_category_only(self):
+        """Test that a malformed batch only re-runs its own category per field"""
+        prompts = []
+
+        def create(**kwargs):
+            prompt = kwargs["messages"][1]["content"]
+            prompts.append(prompt)
+            if "organizational fields" in prompt:
+                return make_completion("Sorry, here are your answers: organization_name = Test NGO")
+            if "project fields" in prompt:
+                return make_completion(json.dumps({"project_title": "Clean Water Now"}))
+            return make_completion("per-field answer")
+
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+
+        with patch('FillGrantForm.get_openai_client', return_value=client):
+            responses = generate_batched_field_responses(self.fields, self.profile, {})
+
+        # 2 batch calls + 2 per-field retries for the organizational category
+        assert client.chat.completions.create.call_count == 4
+        assert responses["organization_name"] == "per-field answer"
+        assert responses["mission_statement"] == "per-field answer"
+        assert responses["project_title"] == "Clean Water Now"
+
+    def test_parse_category_response_drops_missing_fields(self):
+        """Test that missing or empty values are left for per-field retry"""
+        parsed = parse_category_response('{"a": "x", "b": "", "c": 5}', ["a", "b", "c", "d"])
+        assert parsed == {"a": "x", "c": "5"}
+
+    def test_parse_category_response_rejects_non_object(self):
+        """Test that a JSON array is treated as malformed"""
+        with pytest.raises(ValueError):
+            parse_category_response('["x"]', ["a"])
+
+
+class TestGrantFormProgress:
+    """Test the progress events that drive async jobs"""
+
+    def setup_method(self):
+        self.fields = [{"name": "project_alpha", "type": "text"},
+                       {"name": "project_beta", "type": "text"}]
+
+    def run_progress(self, create):
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+        with patch('FillGrantForm.get_openai_client', return_value=client), \
+                patch('FillGrantForm.parse_pdf_form_fields', return_value=self.fields), \
+                patch('FillGrantForm.analyze_original_pdf', return_value={"total_pages": 1}), \
+                patch('FillGrantForm.build_filled_pdf', return_value=(True, "UERG", "Form_Fields")):
+            return list(iter_grant_form_progress("UERG", {}, {}))
+
+    def test_fields_arrive_in_completion_order_before_pdf(self):
+        """Test that answers arrive as they complete, then analysis, PDF and summary"""
+        delays = {"project_alpha": 0.05, "project_beta": 0.0}
+
+        def create(**kwargs):
+            name = field_name_from_prompt(kwargs["messages"][1]["content"])
+            time.sleep(delays[name])
+            return make_completion(f"answer for {name}")
+
+        events = self.run_progress(create)
+
+        assert [e["event"] for e in events] == ["fields", "field", "field", "pdf_analysis", "filled_pdf", "complete"]
+        assert events[1]["name"] == "project_beta"
+        assert events[2]["completed"] == 2
+        assert list(events[-1]["filled_responses"]) == ["project_alpha", "project_beta"]
+        assert events[-1]["processing_summary"]["fill_rate"] == 100.0
+
+    def test_failure_ends_with_error_event(self):
+        """Test that an unexpected failure is reported as the last event"""
+        with patch('FillGrantForm.parse_pdf_form_fields', side_effect=RuntimeError("boom")):
+            events = list(iter_grant_form_progress("UERG", {}, {}))
+        assert events == [{"event": "error", "error": "Internal server error: boom", "type": "RuntimeError"}]
+
+
+class FakeBlobContainer:
+    """Blob container stand-in keeping uploads, and every status written, in memory"""
+
+    def __init__(self):
+        self.blobs = {}
+        self.statuses = []
+
+    def get_blob_client(self, name):
+        container = self
+        client = Mock()
+
+        def upload(data, overwrite=False, **kwargs):
+            container.blobs[name] = data.encode("utf-8") if isinstance(data, str) else data
+            if name.endswith("/status.json"):
+                container.statuses.append(json.loads(container.blobs[name]))
+
+        def download():
+            if name not in container.blobs:
+                raise ResourceNotFoundError("not found")
+            return Mock(readall=lambda: container.blobs[name])
+
+        client.upload_blob.side_effect = upload
+        client.download_blob.side_effect = download
+        return client
+
+
+class TestFormJobs:
+    """Test async mode with the in-process queue standing in for the worker"""
+
+    def setup_method(self):
+        import base64
+        self.pdf_data = make_text_pdf(["Organization Name:", "Project Title:"])
+        self.pdf_bytes = base64.b64decode(self.pdf_data)
+        self.blobs = FakeBlobContainer()
+
+    def call_main(self, method="POST", body=None, params=None, headers=None):
+        import azure.functions as func
+        req = func.HttpRequest(method=method, url="/api/FillGrantForm", headers=headers or {},
+                               params=params or {}, body=body if body is not None else b"")
+        return FillGrantForm.main(req)
+
+    def test_async_job_reports_each_field(self):
+        """Test that a poll sees answers before the form is complete"""
+        body = json.dumps({"pdf_data": self.pdf_data, "ngo_profile": {"organization_name": "Test NGO"},
+                           "async": True}).encode()
+
+        # Patched for the whole test: the in-process worker runs on another thread
+        with patch.dict(os.environ, {"JOB_QUEUE_MODE": "inprocess"}), \
+                patch('FillGrantForm.get_openai_client', return_value=None), \
+                patch('FillGrantForm.shared_clients.get_blob_container_client', return_value=self.blobs):
+            accepted = self.call_main(body=body)
+            job = json.loads(accepted.get_body())
+            assert accepted.status_code == 202
+            assert job["status"] == "queued"
+            assert job["statusUrl"] == f"/api/FillGrantForm?jobId={job['jobId']}"
+
+            get_job_queue("form-jobs", None).drain(timeout=5)
+            status = self.call_main(method="GET", params={"jobId": job["jobId"]})
+
+        data = json.loads(status.get_body())
+        assert status.status_code == 200
+        assert data["status"] == "completed"
+        assert data["filled_responses"]["organization_name"] == "Test NGO"
+        assert data["filled_pdf"]["encoding"] == "base64"
+        partial = [s for s in self.blobs.statuses if s["status"] == "processing" and s["completed_fields"] == 1]
+        assert partial and len(partial[0]["filled_responses"]) == 1
+
+    def test_raw_upload_is_queued_as_base64(self):
+        """Test that a raw PDF body is stored in the job input"""
+        with patch('FillGrantForm.get_job_queue') as queue, \
+                patch('FillGrantForm.shared_clients.get_blob_container_client', return_value=self.blobs):
+            accepted = self.call_main(body=self.pdf_bytes, params={"async": "true"},
+                                      headers={"Content-Type": "application/pdf"})
+
+        job_id = json.loads(accepted.get_body())["jobId"]
+        stored = json.loads(self.blobs.blobs[f"{job_id}/input.json"])
+        assert stored["pdf_data"] == self.pdf_data
+        queue.return_value.send.assert_called_once_with({"jobId": job_id})
+
+    def test_failed_job_is_recorded_and_raised(self):
+        """Test that a failure is visible to pollers and retried by the queue"""
+        self.blobs.get_blob_client("0" * 32 + "/input.json").upload_blob(
+            json.dumps({"pdf_data": self.pdf_data, "ngo_profile": {}}))
+
+        with patch('FillGrantForm.shared_clients.get_blob_container_client', return_value=self.blobs), \
+                patch('FillGrantForm.parse_pdf_form_fields', side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                run_form_job({"jobId": "0" * 32})
+
+        assert self.blobs.statuses[-1]["status"] == "failed"
+        assert "boom" in self.blobs.statuses[-1]["error"]
+
+    def test_unknown_job(self):
+        """Test that unknown or malformed job ids return 404"""
+        with patch('FillGrantForm.shared_clients.get_blob_container_client', return_value=self.blobs):
+            assert self.call_main(method="GET", params={"jobId": "f" * 32}).status_code == 404
+            assert self.call_main(method="GET", params={"jobId": "../other"}).status_code == 404
+
+    def test_async_rejects_binary_response(self):
+        """Test that async jobs only return JSON"""
+        body = json.dumps({"pdf_data": self.pdf_data, "async": True, "response_format": "pdf"}).encode()
+        assert self.call_main(body=body).status_code == 400
+
+
+def make_text_pdf(lines):
+    """Build a base64 PDF with one line of text per entry"""
+    import base64
+    import io
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for i, line in enumerate(lines):
+        pdf.drawString(72, 720 - 20 * i, line)
+    pdf.save()
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+class TestParsedPDF:
+    """Test the single-parse PDF pipeline"""
+
+    def test_process_grant_form_parses_pdf_once(self):
+        """Test that field inference, filling and analysis share one reader"""
+        pdf_data = make_text_pdf(["Organization Name:", "Project Title:"])
+
+        with patch('FillGrantForm.get_openai_client', return_value=None), \
+                patch('FillGrantForm.pdf_utils.PyPDF2.PdfReader', wraps=FillGrantForm.pdf_utils.PyPDF2.PdfReader) as reader, \
+                patch('FillGrantForm.pdf_utils.base64.b64decode', wraps=FillGrantForm.pdf_utils.base64.b64decode) as decode:
+            result = process_grant_form(pdf_data, {"organization_name": "Test NGO"}, {})
+
+        assert reader.call_count == 1
+        assert [c.args[0] for c in decode.call_args_list].count(pdf_data) == 1
+        assert [f["name"] for f in result["original_fields"]] == ["organization_name", "project_title"]
+        assert result["pdf_analysis"]["total_pages"] == 1
+        assert "Organization Name" in result["pdf_analysis"]["extracted_text_snippets"][0]["text"]
+
+    def test_page_text_is_cached(self):
+        """Test that page text is extracted once"""
+        pdf = ParsedPDF(make_text_pdf(["Project Title:"]))
+        first = pdf.full_text
+        with patch.object(pdf.reader.pages[0], 'extract_text', side_effect=AssertionError("extracted twice")):
+            assert pdf.full_text == first
+
+    def test_invalid_data_raises_on_access(self):
+        """Test that decode errors surface to the caller's fallback handling"""
+        pdf = ParsedPDF("not a pdf")
+        with pytest.raises(Exception):
+            pdf.reader
+
+
+class TestBinaryTransport:
+    """Test raw/multipart PDF uploads and binary/blob responses"""
+
+    def setup_method(self):
+        import base64
+        self.pdf_bytes = base64.b64decode(make_text_pdf(["Organization Name:", "Project Title:"]))
+
+    def call_main(self, body, content_type, params=None, headers=None):
+        import azure.functions as func
+        request_headers = {"Content-Type": content_type}
+        request_headers.update(headers or {})
+        req = func.HttpRequest(method="POST", url="/api/FillGrantForm", headers=request_headers,
+                               params=params or {}, body=body)
+        with patch('FillGrantForm.get_openai_client', return_value=None):
+            return FillGrantForm.main(req)
+
+    def test_raw_pdf_upload_with_binary_response(self):
+        """Test an application/pdf body answered with a PDF body"""
+        response = self.call_main(self.pdf_bytes, "application/pdf",
+                                  params={"ngo_profile": '{"organization_name": "Test NGO"}', "response_format": "pdf"})
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/pdf"
+        assert response.get_body().startswith(b"%PDF")
+        summary = json.loads(response.headers["X-Processing-Summary"])
+        assert summary["total_fields"] == 2
+
+    def test_multipart_upload_with_json_response(self):
+        """Test that multipart uploads keep the default JSON/base64 contract"""
+        boundary = "----grantseeker"
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="pdf_data"; filename="form.pdf"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'
+        ).encode() + self.pdf_bytes + (
+            f'\r\n--{boundary}\r\nContent-Disposition: form-data; name="ngo_profile"\r\n\r\n'
+            f'{{"organization_name": "Test NGO"}}\r\n--{boundary}--\r\n'
+        ).encode()
+
+        response = self.call_main(body, f"multipart/form-data; boundary={boundary}")
+
+        assert response.status_code == 200
+        result = json.loads(response.get_body())
+        assert result["filled_responses"]["organization_name"] == "Test NGO"
+        assert result["filled_pdf"]["encoding"] == "base64"
+
+    def test_blob_response_uploads_pdf(self):
+        """Test that response_format=blob returns a blob reference instead of data"""
+        storage = Mock()
+        blob_client = storage.get_container_client.return_value.get_blob_client.return_value
+        blob_client.url = "https://example.blob.core.windows.net/filled-forms/x.pdf"
+
+        with patch('FillGrantForm.shared_clients.get_storage_client', return_value=storage):
+            response = self.call_main(self.pdf_bytes, "application/pdf", params={"response_format": "blob"})
+
+        result = json.loads(response.get_body())
+        assert result["filled_pdf"]["blob_url"] == blob_client.url
+        assert "data" not in result["filled_pdf"]
+        uploaded = blob_client.upload_blob.call_args.args[0]
+        assert uploaded.startswith(b"%PDF")
+
+    def test_invalid_json_option_is_rejected(self):
+        """Test that a malformed JSON query option returns 400"""
+        response = self.call_main(self.pdf_bytes, "application/pdf", params={"grant_context": "{not json"})
+        assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,246 @@
+"""
+Unit tests for GetMatches candidate selection and matching
+"""
+import pytest
+import json
+import os
+import re
+import threading
+from unittest.mock import Mock, patch
+import sys
+import time
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import azure.functions as func
+from GetMatches import calibrate_shards, document_query_embedding, main, score_candidates_sharded, select_candidate_grants, shard_candidates
+
+
+def make_grant(grant_id, embedding=None, **fields):
+    grant = {
+        "id": grant_id,
+        "originalDescription": f"Grant {grant_id}",
+        "fundingAmount": "$10,000",
+        "deadline": "2030-01-01",
+        "organizationType": "nonprofit",
+        "status": "active",
+        **fields
+    }
+    if embedding is not None:
+        grant["embedding"] = embedding
+    return grant
+
+
+class TestSelectCandidateGrants:
+    """Test embedding-based retrieval of grants for LLM scoring"""
+
+    def test_nearest_grants_selected(self):
+        grants = [make_grant("far", [0, 1]), make_grant("near", [1, 0]), make_grant("mid", [1, 1])]
+
+        candidates, scores = select_candidate_grants(grants, [1, 0], 2)
+
+        assert [g["id"] for g in candidates] == ["near", "mid"]
+        assert scores["near"] == pytest.approx(1.0)
+
+    def test_grants_without_embeddings_fill_remaining_slots(self):
+        grants = [make_grant("legacy"), make_grant("embedded", [1, 0])]
+
+        candidates, _ = select_candidate_grants(grants, [1, 0], 5)
+
+        assert [g["id"] for g in candidates] == ["embedded", "legacy"]
+
+    def test_no_query_embedding_keeps_catalog_order(self):
+        grants = [make_grant(str(i), [1, 0]) for i in range(20)]
+
+        candidates, scores = select_candidate_grants(grants, None, 10)
+
+        assert [g["id"] for g in candidates] == [str(i) for i in range(10)]
+        assert scores == {}
+
+
+class TestShardedScoring:
+    """Test token-budgeted shards scored concurrently and calibrated"""
+
+    def test_shards_respect_grant_and_token_limits(self):
+        grants = [make_grant(f"g{i}") for i in range(7)]
+
+        assert [len(s) for s in shard_candidates(grants, 3, 10_000, len)] == [3, 3, 1]
+        assert all(len(s) == 1 for s in shard_candidates(grants, 3, 10, len))
+
+    def test_calibration_aligns_shards_on_the_anchor(self):
+        shard_matches = [
+            [{"grantId": "a", "matchScore": 80}, {"grantId": "x", "matchScore": 70}],
+            [{"grantId": "a", "matchScore": 90}, {"grantId": "y", "matchScore": 80}],
+            [{"grantId": "a", "matchScore": 85}, {"grantId": "z", "matchScore": 50}],
+        ]
+
+        merged, target = calibrate_shards(shard_matches, "a")
+
+        assert target == 85
+        assert {g: m["matchScore"] for g, m in merged.items()} == {"a": 85, "x": 75, "y": 75, "z": 50}
+
+    def test_many_candidates_are_scored_in_parallel_shards(self):
+        grants = [make_grant(f"g{i}") for i in range(20)]
+        base = {f"g{i}": 80 - 2 * i for i in range(20)}
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def create(**request):
+            prompt = request["messages"][1]["content"]
+            ids = re.findall(r"Grant ID: (\w+)", prompt)
+            # Each shard scores on its own scale; the anchor (g0) reveals the offset
+            bias = {"g1": 0, "g5": 10, "g9": -10, "g13": 5, "g17": 0}.get(ids[1], 0)
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+            completion = Mock()
+            completion.choices = [Mock()]
+            completion.choices[0].message.content = json.dumps(
+                {"matches": [{"grantId": g, "matchScore": base[g] + bias} for g in ids]})
+            return completion
+
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+        with patch.dict(os.environ, {"MATCH_SHARD_MAX_GRANTS": "5", "MATCH_SCORING_CONCURRENCY": "3"}):
+            matches, calls = score_candidates_sharded(client, "profile", grants, use_cache=False)
+
+        assert calls == 5
+        assert {g: m["matchScore"] for g, m in matches.items()} == base
+        assert max(peak) <= 3
+
+
+class TestGetMatchesMain:
+    """Test the GetMatches HTTP handler with mocked Azure services"""
+
+    def make_request(self, **params):
+        req = Mock(spec=func.HttpRequest)
+        req.method = "GET"
+        req.params = params
+        return req
+
+    def make_openai(self, matches, query_embedding):
+        client = Mock()
+        completion = Mock()
+        completion.choices = [Mock()]
+        completion.choices[0].message.content = json.dumps(matches)
+        client.chat.completions.create.return_value = completion
+        embedding = Mock()
+        embedding.data = [Mock(embedding=query_embedding)]
+        client.embeddings.create.return_value = embedding
+        return client
+
+    def make_cosmos(self, grants):
+        container = Mock()
+        container.query_items.return_value = iter(grants)
+        database = Mock()
+        database.get_container_client.return_value = container
+        cosmos = Mock()
+        cosmos.get_database_client.return_value = database
+        return cosmos
+
+    def test_missing_parameters(self):
+        response = main(self.make_request())
+        assert response.status_code == 400
+
+    def test_only_retrieved_candidates_reach_llm(self):
+        grants = [make_grant(f"g{i}", [1, i]) for i in range(30)]
+        openai_client = self.make_openai(
+            [{"grantId": "g0", "matchScore": 90, "reasoning": "fit"}], [1, 0]
+        )
+
+        with patch('GetMatches.get_openai_client', return_value=openai_client), \
+                patch('GetMatches.get_cosmos_client', return_value=self.make_cosmos(grants)):
+            response = main(self.make_request(organizationType="nonprofit", topK="3"))
+
+        assert response.status_code == 200
+        body = json.loads(response.get_body())
+        assert body["candidatesScored"] == 3
+        assert body["matches"][0]["grantId"] == "g0"
+        assert body["matches"][0]["retrievalScore"] == pytest.approx(1.0)
+
+        first_call, second_call = openai_client.chat.completions.create.call_args_list
+        prompt = first_call.kwargs["messages"][1]["content"]
+        assert "Grant ID: g0" in prompt and "Grant ID: g2" in prompt
+        assert "Grant ID: g3\n" not in prompt
+        # Only the grants the reply left out are scored again
+        retry_prompt = second_call.kwargs["messages"][1]["content"]
+        assert "Grant ID: g0" not in retry_prompt and "Grant ID: g1" in retry_prompt
+
+    def test_unscored_grants_get_rule_based_matches(self):
+        grants = [make_grant(f"g{i}", [1, i]) for i in range(3)]
+        openai_client = self.make_openai({"matches": [{"grantId": "g1", "matchScore": "85", "priority": "High"},
+                                                      {"grantId": "unknown", "matchScore": 99},
+                                                      {"grantId": "g2"}]}, [1, 0])
+
+        with patch('GetMatches.get_openai_client', return_value=openai_client), \
+                patch('GetMatches.get_cosmos_client', return_value=self.make_cosmos(grants)):
+            response = main(self.make_request(organizationType="nonprofit", topK="3"))
+
+        matches = json.loads(response.get_body())["matches"]
+        assert matches[0]["grantId"] == "g1"
+        assert matches[0]["matchScore"] == 85 and matches[0]["priority"] == "high"
+        assert {m["grantId"] for m in matches[1:]} == {"g0", "g2"}
+        assert all("no LLM analysis" in m["reasoning"] for m in matches[1:])
+
+    def test_fast_mode_skips_llm_and_filters_ineligible(self):
+        grants = [
+            make_grant("edu", originalDescription="Rural education teacher training"),
+            make_grant("closed", originalDescription="Rural education", deadline="2001-01-01"),
+            make_grant("biz", originalDescription="Rural education startups", organizationType="business"),
+        ]
+
+        with patch('GetMatches.get_openai_client') as mock_openai, \
+                patch('GetMatches.get_cosmos_client', return_value=self.make_cosmos(grants)):
+            response = main(self.make_request(organizationType="nonprofit", researchArea="rural education", mode="fast"))
+
+        mock_openai.assert_not_called()
+        body = json.loads(response.get_body())
+        assert body["mode"] == "fast"
+        assert body["eligibleGrants"] == 1
+        assert [m["grantId"] for m in body["matches"]] == ["edu"]
+        assert body["matches"][0]["matchScore"] == 100
+
+    def test_invalid_mode(self):
+        response = main(self.make_request(organizationType="nonprofit", mode="slow"))
+        assert response.status_code == 400
+
+
+class TestDocumentQueryEmbedding:
+    """Test reuse of the embedding ProcessDocument stored with the document"""
+
+    def test_stored_embedding_is_reused(self):
+        openai_client = Mock()
+        documents = Mock()
+        document = {"id": "doc", "analysis": {"summary": "Rural schools"}, "embedding": [0.1, 0.2],
+                    "embeddingModel": "text-embedding-ada-002"}
+
+        with patch.dict(os.environ, {"AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "text-embedding-ada-002"}):
+            assert document_query_embedding(openai_client, documents, document) == [0.1, 0.2]
+
+        openai_client.embeddings.create.assert_not_called()
+        documents.upsert_item.assert_not_called()
+
+    def test_missing_embedding_is_computed_once_and_stored(self):
+        openai_client = Mock()
+        openai_client.embeddings.create.return_value = Mock(data=[Mock(embedding=[0.3, 0.4])])
+        documents = Mock()
+        document = {"id": "doc", "analysis": {"summary": "Rural schools"}}
+
+        assert document_query_embedding(openai_client, documents, document) == [0.3, 0.4]
+
+        stored = documents.upsert_item.call_args[0][0]
+        assert stored["id"] == "doc" and stored["embedding"] == [0.3, 0.4]
+        assert document_query_embedding(openai_client, documents, stored) == [0.3, 0.4]
+        assert openai_client.embeddings.create.call_count == 1
+
+    def test_fast_mode_does_not_embed(self):
+        assert document_query_embedding(None, Mock(), {"id": "doc", "analysis": {}}) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
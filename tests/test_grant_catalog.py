@@ -0,0 +1,157 @@
+"""
+Unit tests for the warm grant catalog
+"""
+import pytest
+import os
+import threading
+from unittest.mock import Mock
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code.grant_catalog import GrantCatalog, FULL_LOAD_QUERY, INCREMENTAL_QUERY
+
+
+def grant(grant_id, ts, status="active", embedding=None):
+    record = {"id": grant_id, "_ts": ts, "status": status, "originalDescription": grant_id}
+    if embedding is not None:
+        record["embedding"] = embedding
+    return record
+
+
+class FakeContainer:
+    """Container stub that answers full and incremental catalog queries"""
+
+    def __init__(self, records):
+        self.records = {r["id"]: r for r in records}
+        self.queries = []
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=False):
+        self.queries.append(query)
+        if query == FULL_LOAD_QUERY:
+            return iter([r for r in self.records.values() if r["status"] == "active"])
+        since = parameters[0]["value"]
+        return iter([r for r in self.records.values() if r["_ts"] >= since])
+
+
+class BlockingContainer(FakeContainer):
+    """Container whose full load query hangs until released, once block() is called"""
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def block(self):
+        self.started.clear()
+        self.release.clear()
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=False):
+        results = list(super().query_items(query, parameters, enable_cross_partition_query))
+        if query == FULL_LOAD_QUERY:
+            self.started.set()
+            self.release.wait(5)
+        return iter(results)
+
+
+class TestGrantCatalog:
+    """Test full and incremental loading"""
+
+    def test_first_refresh_is_full_load(self):
+        container = FakeContainer([grant("a", 10), grant("b", 20), grant("c", 5, status="closed")])
+        catalog = GrantCatalog(refresh_seconds=0)
+
+        catalog.refresh(container)
+
+        assert container.queries == [FULL_LOAD_QUERY]
+        assert [g["id"] for g in catalog.grants()] == ["a", "b"]
+
+    def test_incremental_refresh_applies_changes(self):
+        container = FakeContainer([grant("a", 10), grant("b", 20)])
+        catalog = GrantCatalog(refresh_seconds=0)
+        catalog.refresh(container)
+
+        container.records["c"] = grant("c", 30)
+        container.records["a"] = grant("a", 31, status="closed")
+        catalog.refresh(container)
+
+        assert container.queries[-1] == INCREMENTAL_QUERY
+        assert sorted(g["id"] for g in catalog.grants()) == ["b", "c"]
+        assert catalog.version == 2
+
+    def test_refresh_is_rate_limited(self):
+        container = FakeContainer([grant("a", 10)])
+        catalog = GrantCatalog(refresh_seconds=3600)
+
+        catalog.refresh(container)
+        catalog.refresh(container)
+
+        assert len(container.queries) == 1
+
+    def test_full_reload_picks_up_deletes(self):
+        container = FakeContainer([grant("a", 10), grant("b", 20)])
+        catalog = GrantCatalog(refresh_seconds=0, full_reload_seconds=0)
+        catalog.refresh(container)
+
+        del container.records["a"]
+        catalog.refresh(container)
+        catalog.wait_for_reload(5)
+
+        assert [g["id"] for g in catalog.grants()] == ["b"]
+
+    def test_full_reload_serves_stale_snapshot_meanwhile(self):
+        container = BlockingContainer([grant("a", 10), grant("b", 20)])
+        catalog = GrantCatalog(refresh_seconds=0, full_reload_seconds=0)
+        catalog.refresh(container)
+
+        del container.records["a"]
+        container.block()
+        catalog.refresh(container)
+        assert container.started.wait(5)
+
+        # The reload is stuck in Cosmos; requests neither wait nor start another one
+        catalog.refresh(container)
+        assert [g["id"] for g in catalog.grants()] == ["a", "b"]
+        assert container.queries.count(FULL_LOAD_QUERY) == 2
+
+        container.release.set()
+        catalog.wait_for_reload(5)
+        assert [g["id"] for g in catalog.grants()] == ["b"]
+        assert catalog.version == 2
+
+    def test_changes_during_reload_are_picked_up_next_refresh(self):
+        container = BlockingContainer([grant("a", 10), grant("b", 20)])
+        catalog = GrantCatalog(refresh_seconds=0, full_reload_seconds=0)
+        catalog.refresh(container)
+
+        container.block()
+        catalog.refresh(container)
+        assert container.started.wait(5)
+        # Written after the reload query had already read its page
+        container.records["b"] = grant("b", 30, status="closed")
+        container.release.set()
+        catalog.wait_for_reload(5)
+        assert [g["id"] for g in catalog.grants()] == ["a", "b"]
+
+        catalog.full_reload_seconds = 3600
+        catalog.refresh(container)
+        assert [g["id"] for g in catalog.grants()] == ["a"]
+
+    def test_vector_index_rebuilt_only_on_change(self):
+        container = FakeContainer([grant("a", 10, embedding=[1, 0]), grant("b", 20, embedding=[0, 1])])
+        catalog = GrantCatalog(refresh_seconds=0)
+        catalog.refresh(container)
+
+        first = catalog.vector_index(2)
+        assert catalog.vector_index(2) is first
+        assert first.search([1, 0], 1)[0][0] == "a"
+
+        container.records["c"] = grant("c", 30, embedding=[1, 1])
+        catalog.refresh(container)
+        assert catalog.vector_index(2) is not first
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,197 @@
+"""
+Unit tests for deterministic grant pre-filtering and scoring
+"""
+import pytest
+import os
+from datetime import date
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from unittest.mock import patch
+from shared_code import grant_scoring
+from shared_code.grant_scoring import (
+    GrantFeatures, parse_deadline, parse_funding_range, normalize_organization_types,
+    rank_grants, build_fast_match, compute_match_features, eligibility_digest
+)
+
+TODAY = date(2025, 6, 1)
+
+
+class TestParsers:
+    """Test parsing of free-text grant fields"""
+
+    @pytest.mark.parametrize("value, expected", [
+        ("2025-03-15", date(2025, 3, 15)),
+        ("March 15, 2025", date(2025, 3, 15)),
+        ("03/15/2025", date(2025, 3, 15)),
+        ("Applications due 2025-03-15 at noon", date(2025, 3, 15)),
+        ("Not specified", None),
+        (None, None),
+    ])
+    def test_parse_deadline(self, value, expected):
+        assert parse_deadline(value) == expected
+
+    @pytest.mark.parametrize("value, expected", [
+        ("$500,000", (500000.0, 500000.0)),
+        ("$10k - $25k", (10000.0, 25000.0)),
+        ("up to $1.5M over 3 years", (0.0, 1500000.0)),
+        (75000, (75000.0, 75000.0)),
+        ("Not specified", (None, None)),
+    ])
+    def test_parse_funding_range(self, value, expected):
+        assert parse_funding_range(value) == expected
+
+    def test_normalize_organization_types(self):
+        assert normalize_organization_types("Non-profit / NGO") == {"nonprofit"}
+        assert normalize_organization_types("Universities and nonprofits") == {"university", "nonprofit"}
+        assert normalize_organization_types("Not specified") == set()
+
+    @pytest.mark.parametrize("value, expected", [
+        ("not-for-profit", {"nonprofit"}),
+        ("Not for profit organizations", {"nonprofit"}),
+        ("Not-for-profits and small businesses", {"nonprofit", "business"}),
+        ("For-profit companies", {"business"}),
+        ("Cities and counties", {"government"}),
+        ("Smelting cooperatives", set()),
+        ("Electricity providers", set()),
+        ("Congo-based groups", set()),
+        ("SMEs", {"business"}),
+    ])
+    def test_organization_types_match_whole_words(self, value, expected):
+        assert normalize_organization_types(value) == expected
+
+    @pytest.mark.parametrize("value, expected", [
+        ("Open to all", set()),
+        ("Open to all applicants", set()),
+        ("Any eligible entity", set()),
+        ("All organization types, including nonprofits", set()),
+        ("No restrictions", set()),
+        ("Community-based organizations", set()),
+        ("Open to all nonprofits", {"nonprofit"}),
+    ])
+    def test_wildcards_and_unknown_types(self, value, expected):
+        assert normalize_organization_types(value) == expected
+
+
+class TestRanking:
+    """Test eligibility filtering and BM25 ranking"""
+
+    def setup_method(self):
+        self.features = GrantFeatures([
+            {"id": "past", "originalDescription": "Rural education teacher training",
+             "deadline": "2025-01-01", "organizationType": "nonprofit", "fundingAmount": "$50,000"},
+            {"id": "edu", "originalDescription": "Rural education and teacher training programs",
+             "deadline": "2025-12-31", "organizationType": "nonprofit", "fundingAmount": "$40,000 - $60,000"},
+            {"id": "health", "originalDescription": "Community health clinics",
+             "deadline": "2025-12-31", "organizationType": "Not specified", "fundingAmount": "$45,000"},
+            {"id": "uni", "originalDescription": "Rural education research",
+             "deadline": "2025-12-31", "organizationType": "university", "fundingAmount": "$50,000"},
+            {"id": "huge", "originalDescription": "Rural education infrastructure",
+             "deadline": "2025-12-31", "organizationType": "any", "fundingAmount": "$5,000,000"},
+        ])
+
+    def test_ineligible_grants_removed(self):
+        ranked = rank_grants(self.features, "rural education", "nonprofit", budget=50000, today=TODAY)
+        ids = [self.features.grants[i]["id"] for i, _ in ranked]
+
+        assert "past" not in ids    # deadline passed
+        assert "uni" not in ids     # wrong organization type
+        assert "huge" not in ids    # funding far above budget
+        assert set(ids) == {"edu", "health"}
+
+    def test_not_for_profit_grant_kept_for_nonprofit(self):
+        features = GrantFeatures([{"id": "nfp", "originalDescription": "Rural education",
+                                   "deadline": "2025-12-31", "organizationType": "Not-for-profit organizations"}])
+
+        assert [i for i, _ in rank_grants(features, "rural education", "nonprofit", today=TODAY)] == [0]
+        assert rank_grants(features, "rural education", "business", today=TODAY) == []
+
+    def test_unrecognized_organization_types_are_kept(self):
+        features = GrantFeatures([{"organizationType": "Open to all applicants"},
+                                  {"organizationType": "Community-based organizations"},
+                                  {"organizationType": "Any eligible entity"},
+                                  {"organizationType": "Universities"},
+                                  {"organizationType": "Cooperatives",
+                                   "matchFeatures": {"version": grant_scoring.MATCH_FEATURES_VERSION,
+                                                     "organizationTypes": ["cooperatives"]}}])
+
+        assert features.eligibility_mask("nonprofit").tolist() == [True, True, True, False, True]
+
+    def test_relevance_order(self):
+        ranked = rank_grants(self.features, "rural education teacher training", "nonprofit", today=TODAY)
+
+        assert self.features.grants[ranked[0][0]]["id"] == "edu"
+        assert ranked[0][1] == 100.0
+        assert ranked[-1][1] == 0.0  # health has no overlap
+
+    def test_fast_match_entry(self):
+        index = [g["id"] for g in self.features.grants].index("edu")
+        match = build_fast_match(self.features, index, 90.0, "rural education", "nonprofit", budget=50000)
+
+        assert match["grantId"] == "edu"
+        assert match["matchScore"] == 90
+        assert match["priority"] == "high"
+        assert "Organization type eligible" in match["strengths"]
+        assert "Requested budget within funding range" in match["strengths"]
+
+
+class TestStoredFeatures:
+    """Test features materialized on grant records"""
+
+    def setup_method(self):
+        self.grants = [
+            {"id": "edu", "originalDescription": "Rural education and teacher training programs",
+             "deadline": "December 31, 2025", "organizationType": "Non-profit", "fundingAmount": "$40k - $60k",
+             "analysis": {"eligibilityRequirements": ["Registered nonprofit", "registered NONPROFIT"]}},
+            {"id": "uni", "originalDescription": "Rural education research",
+             "deadline": "2025-12-31", "organizationType": "university", "fundingAmount": "$50,000"},
+        ]
+
+    def test_compute_match_features(self):
+        features = compute_match_features(self.grants[0])
+
+        assert features["deadline"] == "2025-12-31"
+        assert (features["fundingMin"], features["fundingMax"]) == (40000.0, 60000.0)
+        assert features["organizationTypes"] == ["nonprofit"]
+        assert features["terms"]["rural"] == 1
+        assert features["eligibilityDigest"] == "Registered nonprofit"
+
+    def test_stored_features_skip_parsing(self):
+        parsed = GrantFeatures(self.grants)
+        stored = [dict(g, matchFeatures=compute_match_features(g)) for g in self.grants]
+
+        with patch.object(grant_scoring, "parse_deadline", side_effect=AssertionError("parsed")), \
+                patch.object(grant_scoring, "parse_funding_range", side_effect=AssertionError("parsed")):
+            features = GrantFeatures(stored)
+
+        assert features.computed == 0 and parsed.computed == 2
+        assert rank_grants(features, "rural education", "nonprofit", 50000, TODAY) == \
+            rank_grants(parsed, "rural education", "nonprofit", 50000, TODAY)
+
+    def test_outdated_features_are_recomputed(self):
+        stale = dict(self.grants[1], matchFeatures={"version": 0, "deadline": "2001-01-01"})
+        features = GrantFeatures([stale])
+
+        assert features.computed == 1
+        assert rank_grants(features, "research", "university", today=TODAY)
+
+    def test_version_1_organization_types_are_recomputed(self):
+        grant = {"id": "nfp", "originalDescription": "Rural education", "deadline": "2025-12-31",
+                 "organizationType": "Not-for-profit organizations",
+                 "matchFeatures": {"version": 1, "organizationTypes": ["business"], "terms": {"rural": 1}}}
+        features = GrantFeatures([grant])
+
+        assert features.computed == 1
+        assert rank_grants(features, "rural education", "nonprofit", today=TODAY)
+
+    def test_eligibility_digest_is_bounded(self):
+        digest = eligibility_digest([f"Requirement {i} " + "x" * 300 for i in range(12)])
+
+        assert digest.endswith("(+4 more)")
+        assert len(digest) < 8 * 170
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
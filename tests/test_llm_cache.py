@@ -0,0 +1,174 @@
+"""
+Unit tests for the shared LLM completion cache
+"""
+import pytest
+import os
+import time
+from unittest.mock import Mock, patch
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code import llm_cache
+from shared_code.llm_cache import (
+    MemoryCache, SQLiteCacheStore, LLMCache, make_cache_key, cached_chat_completion, is_json_response
+)
+
+
+def make_client(*contents):
+    """Mock OpenAI client returning the given message contents in order"""
+    client = Mock()
+    completions = []
+    for content in contents:
+        completion = Mock()
+        completion.choices = [Mock()]
+        completion.choices[0].message.content = content
+        completions.append(completion)
+    client.chat.completions.create.side_effect = completions
+    return client
+
+
+MESSAGES = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hello"}]
+
+
+class TestCacheKey:
+    """Test content addressing"""
+
+    def test_key_is_stable(self):
+        assert make_cache_key("gpt", MESSAGES, 0.3, 100) == make_cache_key("gpt", list(MESSAGES), 0.3, 100)
+
+    def test_key_changes_with_any_input(self):
+        base = make_cache_key("gpt", MESSAGES, 0.3, 100)
+        assert base != make_cache_key("gpt-4", MESSAGES, 0.3, 100)
+        assert base != make_cache_key("gpt", MESSAGES, 0.7, 100)
+        assert base != make_cache_key("gpt", MESSAGES, 0.3, 200)
+        assert base != make_cache_key("gpt", [MESSAGES[0], {"role": "user", "content": "bye"}], 0.3, 100)
+        assert base != make_cache_key("gpt", MESSAGES, 0.3, 100, {"response_format": {"type": "json_object"}})
+        assert base == make_cache_key("gpt", MESSAGES, 0.3, 100, {})
+
+
+class TestMemoryCache:
+    """Test LRU eviction and TTL"""
+
+    def test_lru_eviction(self):
+        cache = MemoryCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")  # a is now most recently used
+        cache.set("c", "3")
+
+        assert cache.get("a") == "1"
+        assert cache.get("b") is None
+        assert cache.get("c") == "3"
+
+    def test_ttl_expiry(self):
+        cache = MemoryCache(max_entries=10, ttl_seconds=0.01)
+        cache.set("a", "1")
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestCachedChatCompletion:
+    """Test the cached completion wrapper"""
+
+    def test_second_identical_call_is_a_hit(self):
+        client = make_client('{"a": 1}')
+
+        first = cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100)
+        second = cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100)
+
+        assert first == second == '{"a": 1}'
+        assert client.chat.completions.create.call_count == 1
+        stats = llm_cache.get_llm_cache().stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_bypass_calls_openai(self):
+        client = make_client("one", "two")
+
+        cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100)
+        result = cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100, use_cache=False)
+
+        assert result == "two"
+        assert client.chat.completions.create.call_count == 2
+        assert llm_cache.get_llm_cache().stats()["bypassed"] == 1
+
+    def test_invalid_content_is_not_stored(self):
+        client = make_client("not json", '{"ok": true}')
+
+        cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100, validate=is_json_response)
+        result = cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100, validate=is_json_response)
+
+        assert result == '{"ok": true}'
+        assert client.chat.completions.create.call_count == 2
+
+    def test_transport_options_passed_but_not_keyed(self):
+        client = make_client("answer")
+
+        cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100, timeout=5)
+        cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100, timeout=10)
+
+        assert client.chat.completions.create.call_count == 1
+        assert client.chat.completions.create.call_args.kwargs["timeout"] == 5
+
+    def test_request_options_are_keyed(self):
+        client = make_client('{"a": 1}', '{"a": 2}', '{"a": 3}')
+
+        json_mode = cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100, response_format={"type": "json_object"})
+        plain = cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100)
+        seeded = cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100, seed=7, timeout=5)
+
+        assert (json_mode, plain, seeded) == ('{"a": 1}', '{"a": 2}', '{"a": 3}')
+        assert client.chat.completions.create.call_count == 3
+        assert "response_format" not in client.chat.completions.create.call_args_list[1].kwargs
+
+    def test_invalid_cached_content_is_not_served(self):
+        llm_cache.get_llm_cache().set(make_cache_key("gpt", MESSAGES, 0.3, 100), "legacy plain text")
+        client = make_client('{"ok": true}')
+
+        result = cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100, validate=is_json_response)
+
+        assert result == '{"ok": true}'
+        assert client.chat.completions.create.call_count == 1
+        assert llm_cache.get_llm_cache().stats()["rejected"] == 1
+        # The valid completion replaces the rejected entry
+        assert cached_chat_completion(Mock(), "gpt", MESSAGES, 0.3, 100, validate=is_json_response) == '{"ok": true}'
+
+    def test_disabled_cache_always_calls_openai(self):
+        client = make_client("one", "two")
+
+        with patch.dict(os.environ, {"LLM_CACHE_ENABLED": "false"}):
+            llm_cache.reset_llm_cache()
+            cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100)
+            cached_chat_completion(client, "gpt", MESSAGES, 0.3, 100)
+
+        assert client.chat.completions.create.call_count == 2
+
+
+class TestPersistentTier:
+    """Test the SQLite persistent tier"""
+
+    def test_persistent_hit_after_memory_loss(self, tmp_path):
+        path = str(tmp_path / "cache.db")
+        LLMCache(MemoryCache(), SQLiteCacheStore(path)).set("k", "v")
+
+        # A fresh process has an empty memory tier but the same SQLite file
+        cache = LLMCache(MemoryCache(), SQLiteCacheStore(path))
+        assert cache.get("k") == "v"
+        assert cache.get("k") == "v"
+
+        stats = cache.stats()
+        assert stats["persistent_hits"] == 1
+        assert stats["memory_hits"] == 1
+
+    def test_sqlite_expired_entry_is_a_miss(self, tmp_path):
+        store = SQLiteCacheStore(str(tmp_path / "cache.db"), ttl_seconds=-1)
+        store.set("k", "v")
+        assert store.get("k") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
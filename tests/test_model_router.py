@@ -0,0 +1,102 @@
+"""
+Unit tests for model routing and per-route metrics
+"""
+import pytest
+import os
+from unittest.mock import Mock, patch
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code.llm_cache import cached_chat_completion
+from shared_code.model_router import get_route, get_route_stats
+from FillGrantForm import field_route_name, generate_single_field_response
+
+
+def make_client(content="answer", prompt_tokens=120, completion_tokens=30):
+    client = Mock()
+    completion = Mock()
+    completion.choices = [Mock()]
+    completion.choices[0].message.content = content
+    completion.usage = Mock(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    client.chat.completions.create.return_value = completion
+    return client
+
+
+class TestGetRoute:
+    """Test route resolution from defaults and app settings"""
+
+    def test_tiers_default_to_the_single_deployment(self):
+        with patch.dict(os.environ, {"AZURE_OPENAI_DEPLOYMENT_NAME": "main"}, clear=True):
+            assert get_route("short_field").deployment == "main"
+            assert get_route("grant_analysis").deployment == "main"
+
+    def test_tier_and_route_overrides(self):
+        settings = {
+            "MODEL_DEPLOYMENT_FAST": "mini",
+            "MODEL_DEPLOYMENT_QUALITY": "large",
+            "MODEL_ROUTE_MATCH_SCORING_TIER": "fast",
+            "MODEL_ROUTE_LONG_FIELD_DEPLOYMENT": "writer",
+            "MODEL_ROUTE_SHORT_FIELD_MAX_TOKENS": "64"
+        }
+        with patch.dict(os.environ, settings, clear=True):
+            assert get_route("short_field").deployment == "mini"
+            assert get_route("short_field").max_tokens == 64
+            assert get_route("grant_analysis").deployment == "large"
+            assert get_route("match_scoring").deployment == "mini"
+            assert get_route("long_field").deployment == "writer"
+
+    def test_unknown_route(self):
+        with pytest.raises(ValueError):
+            get_route("poetry")
+
+
+class TestRouteMetrics:
+    """Test per-route latency, token and cache-hit accounting"""
+
+    def test_calls_and_cache_hits_are_recorded(self):
+        client = make_client()
+        messages = [{"role": "user", "content": "hi"}]
+
+        for _ in range(2):
+            cached_chat_completion(client, "mini", messages, 0.0, max_tokens=10, route="short_field")
+
+        stats = get_route_stats()["short_field"]
+        assert stats["calls"] == 1 and stats["cache_hits"] == 1
+        assert stats["prompt_tokens"] == 120 and stats["completion_tokens"] == 30
+        assert stats["deployments"] == ["mini"]
+        assert stats["p95_latency_seconds"] is not None
+
+    def test_errors_are_recorded(self):
+        client = Mock()
+        client.chat.completions.create.side_effect = TimeoutError("slow")
+
+        with pytest.raises(TimeoutError):
+            cached_chat_completion(client, "large", [{"role": "user", "content": "x"}], 0.0, route="long_field")
+
+        assert get_route_stats()["long_field"]["errors"] == 1
+
+
+class TestFieldRouting:
+    """Test that form fields are sent to the short or long route"""
+
+    def test_field_route_name(self):
+        assert field_route_name({"name": "organization_name", "type": "text"}) == "short_field"
+        assert field_route_name({"name": "project_duration", "type": "text"}) == "short_field"
+        assert field_route_name({"name": "project_description", "type": "text"}) == "long_field"
+        assert field_route_name({"name": "anything", "type": "textarea"}) == "long_field"
+
+    def test_short_field_uses_fast_deployment(self):
+        client = make_client("Test NGO")
+        with patch.dict(os.environ, {"MODEL_DEPLOYMENT_FAST": "mini", "MODEL_DEPLOYMENT_QUALITY": "large"}):
+            generate_single_field_response(client, {"name": "organization_name", "type": "text"},
+                                           "organizational", {}, {}, 5.0, use_cache=False)
+
+        request = client.chat.completions.create.call_args.kwargs
+        assert request["model"] == "mini"
+        assert request["max_tokens"] == get_route("short_field").max_tokens
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
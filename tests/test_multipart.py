@@ -0,0 +1,59 @@
+"""
+Unit tests for multipart/form-data parsing
+"""
+import pytest
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code.multipart import parse_multipart_form, get_multipart_boundary
+
+BOUNDARY = "----grantseeker"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def build_body(parts):
+    """Build a multipart body from (name, value, filename) tuples"""
+    body = b""
+    for name, value, filename in parts:
+        disposition = f'form-data; name="{name}"'
+        headers = f"Content-Disposition: {disposition}"
+        if filename:
+            headers = f'Content-Disposition: {disposition}; filename="{filename}"\r\nContent-Type: application/pdf'
+        body += f"--{BOUNDARY}\r\n{headers}\r\n\r\n".encode() + value + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+class TestParseMultipartForm:
+    """Test multipart parsing"""
+
+    def test_files_are_bytes_and_fields_are_text(self):
+        """Test that file parts keep raw bytes and form fields are decoded"""
+        pdf = b"%PDF-1.4\r\n\x00\xff binary\r\n--not-a-boundary"
+        body = build_body([
+            ("pdf_data", pdf, "form.pdf"),
+            ("ngo_profile", b'{"organization_name": "Caf\xc3\xa9 NGO"}', None),
+            ("fill_mode", b"batched", None)
+        ])
+
+        fields = parse_multipart_form(body, CONTENT_TYPE)
+
+        assert fields["pdf_data"] == pdf
+        assert fields["ngo_profile"] == '{"organization_name": "Café NGO"}'
+        assert fields["fill_mode"] == "batched"
+
+    def test_quoted_boundary(self):
+        """Test that a quoted boundary parameter is accepted"""
+        assert get_multipart_boundary(f'multipart/form-data; boundary="{BOUNDARY}"') == BOUNDARY
+        assert get_multipart_boundary("application/json") is None
+
+    def test_malformed_body_raises(self):
+        """Test that a truncated body is rejected"""
+        with pytest.raises(ValueError):
+            parse_multipart_form(f"--{BOUNDARY}\r\nContent-Disposition: form-data".encode(), CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
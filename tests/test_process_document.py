@@ -0,0 +1,318 @@
+"""
+Unit tests for ProcessDocument long-document analysis
+"""
+import pytest
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import Mock, patch
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import azure.functions as func
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+from ProcessDocument import analyze_document, compute_content_hash, main, merge_analyses
+from shared_code.job_queue import get_job_queue
+
+
+def completion_client(reply):
+    """OpenAI client double whose reply is computed from the user prompt"""
+    client = Mock()
+
+    def create(**request):
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = reply(request["messages"][1]["content"])
+        return response
+
+    client.chat.completions.create.side_effect = create
+    return client
+
+
+class TestAnalyzeDocument:
+    """Test chunked map-reduce analysis"""
+
+    def test_whole_document_is_analyzed(self):
+        document = "\n\n".join(f"Section {i}: eligibility rules and deadline 2030-0{i % 9 + 1}-01" for i in range(40))
+        seen = []
+        lock = threading.Lock()
+
+        def reply(prompt):
+            with lock:
+                seen.append(prompt)
+            deadline = prompt.split("deadline ")[-1].strip()
+            return json.dumps({"summary": f"part ending {deadline}", "documentType": "grant opportunity",
+                               "isGrantRelated": True, "confidence": 0.8, "deadlines": [deadline],
+                               "keyEntities": ["City Foundation"], "fundingAmount": "$50,000"})
+
+        result = analyze_document(completion_client(reply), "unknown-model", "notice.txt", document,
+                                  use_cache=False, chunk_tokens=200, overlap_tokens=20, max_concurrency=3)
+
+        assert result["chunkCount"] == len(seen) > 1
+        assert result["failedChunks"] == []
+        assert "Section 39" in "".join(seen)
+        analysis = result["analysis"]
+        assert analysis["documentType"] == "grant opportunity"
+        assert analysis["keyEntities"] == ["City Foundation"]
+        assert analysis["fundingAmount"] == "$50,000"
+        assert len(analysis["deadlines"]) == len(set(analysis["deadlines"])) > 1
+
+    def test_failed_chunk_is_reported(self):
+        def reply(prompt):
+            if "part 2 of" in prompt:
+                raise TimeoutError("model timed out")
+            return json.dumps({"summary": "ok"})
+
+        document = "\n\n".join("word " * 50 for _ in range(6))
+        result = analyze_document(completion_client(reply), "unknown-model", "doc.txt", document,
+                                  use_cache=False, chunk_tokens=100, overlap_tokens=0)
+
+        assert result["failedChunks"] == [2]
+        assert result["analysis"]["summary"] == "ok"
+
+    def test_failed_prerequisite_cancels_pending_chunks(self):
+        calls = []
+        upload = Future()
+        upload.set_exception(ConnectionError("blob storage unavailable"))
+
+        def reply(prompt):
+            calls.append(prompt)
+            return json.dumps({"summary": "ok"})
+
+        document = "\n\n".join("word " * 50 for _ in range(6))
+        with pytest.raises(ConnectionError):
+            analyze_document(completion_client(reply), "unknown-model", "doc.txt", document, use_cache=False,
+                             chunk_tokens=100, overlap_tokens=0, max_concurrency=1, prerequisite=upload)
+
+        # At most the chunk already running when the failure was seen is paid for
+        assert len(calls) <= 1
+
+
+def documents_container(existing=None):
+    """Cosmos client double whose Documents container holds at most one record"""
+    cosmos = Mock()
+    container = cosmos.get_database_client.return_value.get_container_client.return_value
+    if existing is None:
+        container.read_item.side_effect = CosmosResourceNotFoundError(message="not found")
+    else:
+        container.read_item.return_value = existing
+    return cosmos, container
+
+
+class FakeDocuments:
+    """Dict-backed stand-in for the Documents container"""
+
+    def __init__(self):
+        self.items = {}
+
+    def read_item(self, item, partition_key):
+        if item not in self.items:
+            raise CosmosResourceNotFoundError(message="not found")
+        return json.loads(json.dumps(self.items[item]))
+
+    def upsert_item(self, body):
+        self.items[body["id"]] = json.loads(json.dumps(body))
+
+
+class FakeBlobContainer:
+    """Blob container stand-in keeping uploaded content in memory"""
+
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob_client(self, name):
+        blobs = self.blobs
+        client = Mock()
+        client.url = f"https://storage/documents/{name}"
+        client.upload_blob.side_effect = lambda data, overwrite=False: blobs.__setitem__(name, data.encode("utf-8"))
+        client.download_blob.side_effect = lambda: Mock(readall=lambda: blobs[name])
+        return client
+
+
+def call_main(body, openai_client, cosmos, blob_container, method="POST", params=None):
+    req = func.HttpRequest(method=method, url="/api/processdocument", params=params or {},
+                           body=json.dumps(body).encode() if body is not None else b"")
+    with patch('ProcessDocument.get_openai_client', return_value=openai_client), \
+            patch('ProcessDocument.get_cosmos_client', return_value=cosmos), \
+            patch('ProcessDocument.get_blob_container_client', return_value=blob_container):
+        return main(req)
+
+
+class TestProcessDocumentMain:
+    """Test the HTTP handler with mocked Azure services"""
+
+    def test_upload_overlaps_analysis(self):
+        """Test that the blob upload runs while the LLM call is in flight"""
+        upload_started = threading.Event()
+
+        def reply(prompt):
+            # Only returns once the upload has started on the other thread
+            assert upload_started.wait(2)
+            return json.dumps({"summary": "A grant notice", "isGrantRelated": True})
+
+        blob_container = Mock()
+        blob_client = blob_container.get_blob_client.return_value
+        blob_client.url = "https://storage/documents/sha256/abc"
+        blob_client.upload_blob.side_effect = lambda *args, **kwargs: upload_started.set() or time.sleep(0.05)
+        cosmos, container = documents_container()
+
+        response = call_main({"documentContent": "Grant notice text", "fileName": "notice.txt"},
+                             completion_client(reply), cosmos, blob_container)
+
+        assert response.status_code == 200
+        data = json.loads(response.get_body())
+        assert data["blobUrl"] == "https://storage/documents/sha256/abc"
+        assert data["analysis"]["summary"] == "A grant notice"
+        assert data["duplicate"] is False
+        record = container.upsert_item.call_args[0][0]
+        assert record["id"] == data["documentId"] == compute_content_hash("Grant notice text")
+        assert blob_container.get_blob_client.call_args[0][0] == f"sha256/{record['id']}"
+
+    def test_upload_failure_stops_analysis(self):
+        """Test that a failed blob upload fails the request without analyzing every chunk"""
+        upload_failed = threading.Event()
+        calls = []
+
+        def reply(prompt):
+            calls.append(prompt)
+            assert upload_failed.wait(2)
+            time.sleep(0.05)
+            return json.dumps({"summary": "part"})
+
+        def fail_upload(*args, **kwargs):
+            upload_failed.set()
+            raise ConnectionError("blob storage unavailable")
+
+        blob_container = Mock()
+        blob_container.get_blob_client.return_value.upload_blob.side_effect = fail_upload
+        cosmos, container = documents_container()
+        document = "\n\n".join("word " * 800 for _ in range(8))
+
+        with patch.dict(os.environ, {"PROCESS_DOCUMENT_CHUNK_TOKENS": "1000",
+                                     "PROCESS_DOCUMENT_MAX_CONCURRENCY": "1"}):
+            response = call_main({"documentContent": document, "fileName": "big.txt", "useCache": False},
+                                 completion_client(reply), cosmos, blob_container)
+
+        assert response.status_code == 500
+        assert "blob storage unavailable" in json.loads(response.get_body())["details"]
+        assert len(calls) == 1
+        container.upsert_item.assert_not_called()
+
+    def test_document_embedding_is_stored(self):
+        """Test that the match query embedding is computed once, at processing time"""
+        openai_client = completion_client(lambda prompt: json.dumps({"summary": "A grant notice"}))
+        openai_client.embeddings.create.return_value = Mock(data=[Mock(embedding=[0.5, 0.5])])
+        cosmos, container = documents_container()
+
+        response = call_main({"documentContent": "Grant notice text", "fileName": "notice.txt"},
+                             openai_client, cosmos, FakeBlobContainer())
+
+        assert response.status_code == 200
+        record = container.upsert_item.call_args[0][0]
+        assert record["embedding"] == [0.5, 0.5]
+        assert record["embeddingModel"]
+        assert "embedding" not in json.loads(response.get_body())
+        assert "A grant notice" in openai_client.embeddings.create.call_args.kwargs["input"]
+
+    def test_duplicate_returns_stored_analysis(self):
+        """Test that re-uploaded content is answered from the stored record"""
+        content_hash = compute_content_hash("Grant notice text")
+        existing = {"id": content_hash, "fileName": "notice.txt", "fileNames": ["notice.txt"],
+                    "analysis": {"summary": "stored"}, "blobUrl": "https://storage/x", "chunkCount": 1}
+        cosmos, container = documents_container(existing)
+        openai_client = Mock()
+        blob_container = Mock()
+
+        response = call_main({"documentContent": "Grant notice text", "fileName": "notice-v2.txt"},
+                             openai_client, cosmos, blob_container)
+
+        data = json.loads(response.get_body())
+        assert data["duplicate"] is True
+        assert data["analysis"] == {"summary": "stored"}
+        openai_client.chat.completions.create.assert_not_called()
+        blob_container.get_blob_client.assert_not_called()
+        assert container.upsert_item.call_args[0][0]["fileNames"] == ["notice.txt", "notice-v2.txt"]
+
+
+class TestAsyncJobs:
+    """Test async mode with the in-process queue standing in for the worker"""
+
+    def test_async_job_lifecycle(self):
+        documents = FakeDocuments()
+        cosmos = Mock()
+        cosmos.get_database_client.return_value.get_container_client.return_value = documents
+        blob_container = FakeBlobContainer()
+        openai_client = completion_client(lambda prompt: json.dumps({"summary": "Queued grant notice"}))
+        body = {"documentContent": "Long grant notice", "fileName": "notice.txt", "async": True}
+
+        # Patched for the whole test: the in-process worker runs on another thread
+        with patch.dict(os.environ, {"JOB_QUEUE_MODE": "inprocess"}), \
+                patch('ProcessDocument.get_openai_client', return_value=openai_client), \
+                patch('ProcessDocument.get_cosmos_client', return_value=cosmos), \
+                patch('ProcessDocument.get_blob_container_client', return_value=blob_container):
+            accepted = main(func.HttpRequest(method="POST", url="/api/processdocument",
+                                             body=json.dumps(body).encode()))
+            job = json.loads(accepted.get_body())
+            assert accepted.status_code == 202
+            assert job["status"] == "queued"
+            assert job["jobId"] == compute_content_hash("Long grant notice")
+
+            get_job_queue("document-jobs", None).drain(timeout=5)
+            status = main(func.HttpRequest(method="GET", url="/api/processdocument",
+                                           params={"jobId": job["jobId"]}, body=b""))
+
+        data = json.loads(status.get_body())
+        assert status.status_code == 200
+        assert data["status"] == "completed"
+        assert data["analysis"]["summary"] == "Queued grant notice"
+
+    def test_pending_job_is_shared(self):
+        documents = FakeDocuments()
+        content_hash = compute_content_hash("Long grant notice")
+        documents.upsert_item({"id": content_hash, "status": "processing", "fileName": "a.txt",
+                               "updatedAt": "2999-01-01T00:00:00"})
+        cosmos = Mock()
+        cosmos.get_database_client.return_value.get_container_client.return_value = documents
+        blob_container = FakeBlobContainer()
+
+        response = call_main({"documentContent": "Long grant notice", "fileName": "b.txt", "async": True},
+                             Mock(), cosmos, blob_container)
+
+        assert response.status_code == 202
+        assert json.loads(response.get_body())["status"] == "processing"
+        assert blob_container.blobs == {}
+
+    def test_unknown_job(self):
+        cosmos = Mock()
+        cosmos.get_database_client.return_value.get_container_client.return_value = FakeDocuments()
+        response = call_main(None, Mock(), cosmos, Mock(), method="GET", params={"jobId": "missing"})
+        assert response.status_code == 404
+
+
+class TestMergeAnalyses:
+    """Test the reduce step"""
+
+    def test_merge(self):
+        merged = merge_analyses([
+            {"summary": "A", "documentType": "unknown", "isGrantRelated": False, "confidence": 0.4,
+             "keyEntities": {"organizations": ["NSF"]}, "fundingAmount": "$10k", "deadlines": []},
+            {"summary": "B", "documentType": "grant opportunity", "isGrantRelated": True, "confidence": 0.8,
+             "keyEntities": {"organizations": ["NSF", "NIH"]}, "fundingAmount": "$20k", "deadlines": ["May 1"]}
+        ])
+
+        assert merged["summary"] == "A\n\nB"
+        assert merged["documentType"] == "grant opportunity"
+        assert merged["isGrantRelated"] is True
+        assert merged["confidence"] == pytest.approx(0.6)
+        assert merged["keyEntities"] == {"organizations": ["NSF", "NIH"]}
+        assert merged["fundingAmount"] == ["$10k", "$20k"]
+        assert merged["deadlines"] == ["May 1"]
+        assert merged["grantRequirements"] == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
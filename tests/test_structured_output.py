@@ -0,0 +1,133 @@
+"""
+Unit tests for schema-validated structured completions
+"""
+import pytest
+import json
+import os
+from unittest.mock import Mock
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code.structured_output import (
+    StructuredOutputError, close_truncated_json, extract_json, get_structured_output_stats,
+    structured_completion, validate
+)
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "level": {"type": "string", "enum": ["low", "medium", "high"]},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "kind": {"type": "string", "default": "unknown"}
+    },
+    "required": ["summary", "score"]
+}
+
+
+def make_client(*contents):
+    """Mock OpenAI client returning the given message contents in order"""
+    client = Mock()
+    completions = []
+    for content in contents:
+        completion = Mock()
+        completion.choices = [Mock()]
+        completion.choices[0].message.content = content
+        completions.append(completion)
+    client.chat.completions.create.side_effect = completions
+    return client
+
+
+class TestRepair:
+    """Test local repair of malformed completions"""
+
+    def test_code_fence_and_prose(self):
+        value, repaired = extract_json('Sure! Here it is:\n```json\n{"a": [1, 2]}\n```\nLet me know.')
+        assert value == {"a": [1, 2]} and repaired
+
+    def test_trailing_text(self):
+        assert extract_json('{"a": 1} I hope this helps')[0] == {"a": 1}
+
+    def test_truncated_array_keeps_complete_items(self):
+        text = '{"matches": [{"id": "a", "score": 1}, {"id": "b", "score": 2}, {"id": "c", "sc'
+        # The cut-off item keeps its complete fields; schema validation decides whether it is usable
+        assert close_truncated_json(text) == {"matches": [{"id": "a", "score": 1}, {"id": "b", "score": 2}, {"id": "c"}]}
+
+    def test_trailing_comma(self):
+        assert extract_json('[1, 2, ]')[0] == [1, 2]
+
+    def test_no_json(self):
+        with pytest.raises(ValueError):
+            extract_json("I cannot help with that")
+
+
+class TestValidate:
+    """Test schema validation and coercion"""
+
+    def test_coercion_and_defaults(self):
+        value, errors, valid = validate({"summary": "ok", "score": "85", "level": "High", "tags": "one"}, SCHEMA)
+        assert valid and errors == []
+        assert value == {"summary": "ok", "score": 85, "level": "high", "tags": ["one"], "kind": "unknown"}
+
+    def test_invalid_optional_field_is_dropped(self):
+        value, errors, valid = validate({"summary": "ok", "score": 5, "level": "extreme"}, SCHEMA)
+        assert valid and "level" not in value and len(errors) == 1
+
+    def test_invalid_array_items_are_dropped(self):
+        schema = {"type": "array", "items": SCHEMA}
+        value, errors, valid = validate([{"summary": "a", "score": 1}, {"summary": "b", "score": 500}], schema)
+        assert valid and [item["summary"] for item in value] == ["a"]
+
+
+class TestStructuredCompletion:
+    """Test repair-first completion with targeted re-asks"""
+
+    def test_repaired_reply_needs_no_reask(self):
+        client = make_client('```json\n{"summary": "ok", "score": 70}\n```')
+
+        result = structured_completion(client, "model", [{"role": "user", "content": "JSON please"}], SCHEMA, 0.0)
+
+        assert result["score"] == 70
+        assert client.chat.completions.create.call_count == 1
+        assert client.chat.completions.create.call_args.kwargs["response_format"] == {"type": "json_object"}
+        assert get_structured_output_stats()["repaired"] == 1
+
+    def test_reasks_only_missing_fields(self):
+        client = make_client('{"summary": "ok", "score": "very high", "tags": ["x"]}', '{"score": 90}')
+
+        result = structured_completion(client, "model", [{"role": "user", "content": "JSON please"}], SCHEMA, 0.0)
+
+        assert result == {"summary": "ok", "score": 90, "tags": ["x"], "kind": "unknown"}
+        follow_up = client.chat.completions.create.call_args.kwargs["messages"]
+        assert follow_up[-2]["role"] == "assistant"
+        assert "score" in follow_up[-1]["content"] and "summary" not in follow_up[-1]["content"]
+        assert get_structured_output_stats()["reasks"] == 1
+
+    def test_failure_keeps_partial_value(self):
+        client = make_client('{"summary": "ok"}', 'no idea')
+
+        with pytest.raises(StructuredOutputError) as error:
+            structured_completion(client, "model", [{"role": "user", "content": "JSON please"}], SCHEMA, 0.0)
+
+        assert error.value.value == {"summary": "ok", "kind": "unknown"}
+        assert error.value.missing == ["score"]
+
+    def test_deployment_without_json_mode(self):
+        client = Mock()
+        completion = Mock()
+        completion.choices = [Mock()]
+        completion.choices[0].message.content = json.dumps({"summary": "ok", "score": 1})
+        client.chat.completions.create.side_effect = [RuntimeError("Unrecognized request argument: response_format"),
+                                                      completion]
+
+        result = structured_completion(client, "old-model", [{"role": "user", "content": "JSON"}], SCHEMA, 0.0)
+
+        assert result["score"] == 1
+        assert "response_format" not in client.chat.completions.create.call_args.kwargs
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,134 @@
+"""
+Unit tests for the bounded tokenizer pool
+"""
+import pytest
+import os
+import sys
+import threading
+import time
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code.tokenizer_pool import TokenizerPool, get_preload_models
+
+
+class FakeTokenizer:
+    def __init__(self, name, vocab):
+        self.name = name
+        self.vocab = vocab
+
+    def __len__(self):
+        return self.vocab
+
+
+class TestTokenizerPool:
+    """Test LRU eviction, budgets, preload and single loading"""
+
+    def make_pool(self, vocab_sizes, **kwargs):
+        self.loads = []
+
+        def loader(name):
+            self.loads.append(name)
+            if name not in vocab_sizes:
+                raise FileNotFoundError(name)
+            return FakeTokenizer(name, vocab_sizes[name])
+
+        return TokenizerPool(loader, **kwargs)
+
+    def test_lru_model_budget(self):
+        pool = self.make_pool({"a": 1, "b": 1, "c": 1}, max_models=2)
+        pool.get("a")
+        pool.get("b")
+        pool.get("a")
+        pool.get("c")
+
+        assert pool.loaded_models() == ["a", "c"]
+        assert self.loads == ["a", "b", "c"]
+        assert pool.stats()["evictions"] == 1
+
+    def test_weight_budget(self):
+        pool = self.make_pool({"small": 100, "large": 900, "other": 200}, max_models=10, max_weight=1000)
+        pool.get("small")
+        pool.get("large")
+        pool.get("other")
+
+        assert pool.loaded_models() == ["other"]
+        assert pool.total_weight() == 200
+
+    def test_preload_skips_failures(self):
+        pool = self.make_pool({"a": 1})
+        results = pool.preload(["a", "missing"])
+
+        assert results["a"] is None
+        assert "missing" in results["missing"]
+        assert "a" in pool and "missing" not in pool
+
+    def test_concurrent_first_requests_load_once(self):
+        def slow_loader(name):
+            time.sleep(0.05)
+            return FakeTokenizer(name, 1)
+
+        calls = []
+        pool = TokenizerPool(lambda name: calls.append(name) or slow_loader(name))
+        threads = [threading.Thread(target=pool.get, args=("a",)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert calls == ["a"]
+        assert pool.stats()["hits"] == 4
+
+    def test_request_during_publish_does_not_reload(self):
+        calls = []
+        weighing = threading.Event()
+        release = threading.Event()
+
+        def weigh(tokenizer):
+            # Hold the first load between loading and publishing its entry
+            if not weighing.is_set():
+                weighing.set()
+                release.wait(timeout=5)
+            return 1
+
+        pool = TokenizerPool(lambda name: calls.append(name) or FakeTokenizer(name, 1), weigh=weigh)
+        first = threading.Thread(target=pool.get, args=("a",))
+        first.start()
+        assert weighing.wait(timeout=5)
+
+        barrier = threading.Barrier(5)
+
+        def late_get():
+            barrier.wait()
+            pool.get("a")
+
+        late = [threading.Thread(target=late_get) for _ in range(4)]
+        for thread in late:
+            thread.start()
+        barrier.wait()
+        time.sleep(0.05)
+        release.set()
+        for thread in [first] + late:
+            thread.join()
+
+        assert calls == ["a"]
+        assert pool.stats()["loads"] == 1 and pool.stats()["hits"] == 4
+
+    def test_failed_load_can_be_retried(self):
+        pool = self.make_pool({})
+
+        with pytest.raises(FileNotFoundError):
+            pool.get("a")
+        with pytest.raises(FileNotFoundError):
+            pool.get("a")
+
+        assert self.loads == ["a", "a"]
+
+    def test_preload_setting(self, monkeypatch):
+        monkeypatch.setenv("TOKENIZER_PRELOAD_MODELS", "gpt-4o, openai/gpt-oss-120b,,")
+        assert get_preload_models() == ["gpt-4o", "openai/gpt-oss-120b"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
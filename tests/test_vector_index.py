@@ -0,0 +1,59 @@
+"""
+Unit tests for the grant vector index
+"""
+import pytest
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_code.vector_index import BruteForceIndex, create_vector_index, register_index_backend
+
+
+class TestBruteForceIndex:
+    """Test exact cosine top-k search"""
+
+    def setup_method(self):
+        self.index = BruteForceIndex()
+        self.index.build(
+            ["north", "east", "northeast", "south"],
+            [[0, 10], [3, 0], [1, 1], [0, -2]]
+        )
+
+    def test_top_k_ordering(self):
+        hits = self.index.search([0, 1], 3)
+        assert [grant_id for grant_id, _ in hits] == ["north", "northeast", "east"]
+        assert hits[0][1] == pytest.approx(1.0)
+
+    def test_k_larger_than_index(self):
+        assert len(self.index.search([1, 0], 10)) == 4
+
+    def test_dimension_mismatch_raises(self):
+        with pytest.raises(ValueError):
+            self.index.search([1, 0, 0], 2)
+
+    def test_empty_index(self):
+        index = BruteForceIndex()
+        index.build([], [])
+        assert index.search([1.0], 5) == []
+
+
+class TestBackends:
+    """Test pluggable index backends"""
+
+    def test_default_backend_is_numpy(self):
+        assert isinstance(create_vector_index(), BruteForceIndex)
+
+    def test_registered_backend(self):
+        sentinel = object()
+        register_index_backend("test-ann", lambda: sentinel)
+        assert create_vector_index("test-ann") is sentinel
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="Unknown vector index backend"):
+            create_vector_index("missing")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])